@@ -12,6 +12,8 @@ cd "$SCRIPT_DIR"
 # ==============================================================================
 
 RUN_TEST=true         # Run test mode (a small subset only for algorithm analysis)
+RUN_PRODUCTION=false  # Run production mode (streams every read in FASTQ_R1)
+THREADS=1             # Aligner worker processes
 
 # ==============================================================================
 # INPUT/OUTPUT PATHS
@@ -34,6 +36,7 @@ source test_modules/Utility_Functions/bash_utils.sh
 main() {
     echo "Date: $(date)"
     echo "Run Test: $RUN_TEST"
+    echo "Run Production: $RUN_PRODUCTION"
     
     setup_logging false
     create_directories "$OUTPUT_HISAT" "$OUTPUT_BOWTIE" "$OUTPUT_SALMON" "logs"
@@ -42,7 +45,14 @@ main() {
     if [[ "$RUN_TEST" == "true" ]]; then
         activate_conda_env "$CONDA_ENV" "setup_cmsc244.sh"
         run_with_space_time_log --input "test_inputs" --output "Outputs" \
-            python test_modules/run_alignment_tests.py --mode test
+            python test_modules/run_alignment_tests.py --mode test --threads "$THREADS"
+    fi
+    
+    if [[ "$RUN_PRODUCTION" == "true" ]]; then
+        activate_conda_env "$CONDA_ENV" "setup_cmsc244.sh"
+        run_with_space_time_log --input "test_inputs" --output "Outputs" \
+            python test_modules/run_alignment_tests.py --mode production --threads "$THREADS" \
+                --reads "$FASTQ_R1" --reference "$REFERENCE"
     fi
     
     echo "Results: $OUTPUT_HISAT, $OUTPUT_BOWTIE, $OUTPUT_SALMON"
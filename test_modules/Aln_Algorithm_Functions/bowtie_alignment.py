@@ -2,6 +2,7 @@
 # ====================================================================================================
 # Bowtie2 Alignment Algorithm Implementation
 #       Implements seed-and-extend alignment using FM-index with local and global alignment modes.
+#       Seeds are looked up through a seed locator (seed_index.py): FM backward search or a k-mer table.
 #
 #       In partial fulfillment of CMSC244.
 #       Submitted by: Mark Cyril R. Mercado
@@ -16,27 +17,13 @@
 #               aligner_sw.cpp
 # ====================================================================================================
 
-from Utility_Functions.shared_utils import (
-    build_suffix_array, build_BWT, build_count_table, build_occurrence_table,
-    FM_backward_search
-)
+import logging
 
-# ========================================================================================
-# Finding FM-Index Pattern
-# ========================================================================================
+from Utility_Functions.shared_utils import build_fm_index
+from Utility_Functions.seed_index import seed_locator_for
+from Utility_Functions.instrumentation import stage, timed, count_operations
 
-def find_pattern(pattern, suffix_array, count_table, occurrence):
-    """
-    Find all occurrences of pattern in reference.
-    """
-    n = len(suffix_array)
-    low, high = FM_backward_search(pattern, count_table, occurrence, n)  # O(m) - one character lookup per pattern character
-    if low >= high or low < 0:
-        return []
-    positions = []
-    for index in range(low, high):                  # O(k) - extracting k positions from suffix array
-        positions.append(suffix_array[index])
-    return sorted(positions)                        # O(k log k), sorting algorithm; main determinant of the steps
+logger = logging.getLogger(__name__)
 
 # ========================================================================================
 # CIGAR String Compression
@@ -67,11 +54,13 @@ def compress_cigar(ops):
 # Smith-Waterman Local Alignment
 # ========================================================================================
 
+@timed()
 def smith_waterman(query, target, match_score=2, mismatch_penalty=-4, gap_extend=-1):
     """
     Smith-Waterman local alignment algorithm.
     """
     query_len, target_len = len(query), len(target)
+    count_operations("dp_cells", query_len * target_len)
     
     score_matrix = []                                   # O(m * n) initialization of matrix
     for _ in range(query_len + 1):
@@ -136,38 +125,39 @@ def extract_seeds(read, seed_len, seed_interval):
 # Main Function for Bowtie2 Alignment
 # ========================================================================================
 
-def bowtie2_align(read, reference, seed_len=22, seed_interval=15):
+def bowtie2_align(read, reference, seed_len=22, seed_interval=15, fm_index=None):
     """
-    Main Bowtie2 alignment function using local mode.
+    Main Bowtie2 alignment function using local mode. Pass a prebuilt fm_index (build_fm_index, or
+    build_seed_index for a selectable seeding backend) to skip the per-read build.
     """
-    ref_with_term = reference + "$"
-    
-    print("Building FM-index.")
-    suffix_array = build_suffix_array(ref_with_term)            # O(n log n) where n = reference length
-    bwt = build_BWT(ref_with_term, suffix_array)                # O(n)
-    count_table, _ = build_count_table(bwt)                     # O(n)
-    occurrence = build_occurrence_table(bwt)                    # O(n)
-    
-    print("Extracting seeds and finding hits.")
-    seeds = extract_seeds(read, seed_len, seed_interval)        # O(r / i)
-    candidate_positions = []
+    if fm_index is None:
+        logger.warning("No fm_index passed; building the FM-index for this read")
+        fm_index = build_fm_index(reference)                    # O(n log n) where n = reference length
+    seed_locator = seed_locator_for(fm_index)
     
-    for seed, offset in seeds:                                  # O(s) where s = number of seeds
-        positions = find_pattern(seed, suffix_array, count_table, occurrence)  # O(m + k) per seed
-        for position in positions:                              # O(k) hits per seed
-            read_start = position - offset
-            if 0 <= read_start <= len(reference) - len(read):
-                if read_start not in candidate_positions:
-                    candidate_positions.append(read_start)
+    logger.debug("Extracting seeds and finding hits (read length %d)", len(read))
+    with stage("seeding"):
+        seeds = extract_seeds(read, seed_len, seed_interval)        # O(r / i)
+        candidate_positions = []
+        
+        for seed, offset in seeds:                                  # O(s) where s = number of seeds
+            positions = seed_locator.locate(seed)                   # O(m + k) FM, O(1 + k) k-mer table
+            for position in positions:                              # O(k) hits per seed
+                read_start = position - offset
+                if 0 <= read_start <= len(reference) - len(read):
+                    if read_start not in candidate_positions:
+                        candidate_positions.append(read_start)
     
-    print("Extending candidates.")
+    logger.debug("Extending %d candidates", len(candidate_positions))
+    count_operations("candidates_verified", len(candidate_positions))
     alignments = []
     
-    for position in candidate_positions:                        # O(c) where c = candidate positions
-        ref_region = reference[position:position + len(read) + 20]
-        score, cigar, query_start, target_start = smith_waterman(read, ref_region)  # O(r * w) per candidate
-        if score > 0:
-            alignments.append({"position": position + target_start, "cigar": cigar, "score": score})
+    with stage("extension"):                                 # SW matrices are the transient peak
+        for position in candidate_positions:                        # O(c) where c = candidate positions
+            ref_region = reference[position:position + len(read) + 20]
+            score, cigar, query_start, target_start = smith_waterman(read, ref_region)  # O(r * w) per candidate
+            if score > 0:
+                alignments.append({"position": position + target_start, "cigar": cigar, "score": score})
     
     alignments.sort(key=lambda x: x["score"], reverse=True)
     
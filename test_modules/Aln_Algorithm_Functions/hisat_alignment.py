@@ -2,6 +2,7 @@
 # ====================================================================================================
 # HISAT Alignment Algorithm Implementation
 #       Implements splice-aware alignment using FM-index with seed-and-extend strategy.
+#       Exact matches are looked up through a seed locator (seed_index.py): FM backward search or a k-mer table.
 #
 #       In partial fulfillment of CMSC244.
 #       Submitted by: Mark Cyril R. Mercado
@@ -17,27 +18,13 @@
 #
 # ====================================================================================================
 
-from Utility_Functions.shared_utils import (
-    build_suffix_array, build_BWT, build_count_table, build_occurrence_table,
-    FM_backward_search
-)
+import logging
 
-# ========================================================================================
-# Finding the FM-Index Pattern
-# ========================================================================================
-
-def locate_pattern(pattern, suffix_array, count_table, occurence):
-    """
-    Find all positions of pattern in reference."""
-    suffix_len = len(suffix_array)
-    top, bottom = FM_backward_search(pattern, count_table, occurence, suffix_len)     # O(m) char-by-char
-    if top >= bottom or top < 0:
-        return []
-    positions = []
-    for index in range(top, bottom):                                                  # O(k) retrieving k suffix array entries
-        positions.append(suffix_array[index])
-    return sorted(positions)                                                          # O(k log k) - sorting algorithm; highest thus this is the main determinant in this step
+from Utility_Functions.shared_utils import build_fm_index
+from Utility_Functions.seed_index import seed_locator_for
+from Utility_Functions.instrumentation import stage, count_operations
 
+logger = logging.getLogger(__name__)
 
 # ========================================================================================
 # Seed-and-Extend with Mismatches
@@ -54,7 +41,7 @@ def count_mismatches(seq1, seq2):
     return mismatches
 
 
-def seed_and_extend(read, reference, suffix_array, count_table, occurence, max_mismatches):
+def seed_and_extend(read, reference, seed_locator, max_mismatches):
     """
     Seed-and-extend strategy for approximate matching.
     """
@@ -68,7 +55,7 @@ def seed_and_extend(read, reference, suffix_array, count_table, occurence, max_m
     
     for seed_offset in seed_positions:                                              # O(s), s meaning number of seeds
         seed = read[seed_offset:seed_offset + seed_len]
-        hit_positions = locate_pattern(seed, suffix_array, count_table, occurence)  # O(m) per seed
+        hit_positions = seed_locator.locate(seed)                                   # O(m) per seed
         for hit_position in hit_positions:                                          # O(h) hits per seed
             read_start = hit_position - seed_offset
             if read_start < 0 or read_start + read_len > ref_len:
@@ -88,6 +75,7 @@ def seed_and_extend(read, reference, suffix_array, count_table, occurence, max_m
                     "score": read_len - mismatch_count,
                     "spliced": False
                 })
+    count_operations("candidates_verified", len(checked_positions))
     return alignments
 
 # ========================================================================================
@@ -105,11 +93,12 @@ def check_canonical_splice_site(reference, donor_position, acceptor_position):
     return donor == "GT" and acceptor == "AG"
 
 
-def spliced_alignment(read, reference, suffix_array, count_table, occurence):
+def spliced_alignment(read, reference, seed_locator):
     """
     Attempt spliced alignment for reads spanning introns.
     """
     alignments = []
+    anchor_pairs = 0
     read_len = len(read)
     min_anchor = 8
     max_intron = 500000
@@ -119,8 +108,9 @@ def spliced_alignment(read, reference, suffix_array, count_table, occurence):
         left_segment = read[:split_position]
         right_segment = read[split_position:]
         
-        left_positions = locate_pattern(left_segment, suffix_array, count_table, occurence)  # O(m)
-        right_positions = locate_pattern(right_segment, suffix_array, count_table, occurence)  # O(m)
+        left_positions = seed_locator.locate(left_segment)                  # O(m)
+        right_positions = seed_locator.locate(right_segment)                # O(m)
+        anchor_pairs += len(left_positions) * len(right_positions)
         
         for left_pos in left_positions:  # O(L) left anchor hits
             left_end = left_pos + len(left_segment)
@@ -139,26 +129,26 @@ def spliced_alignment(read, reference, suffix_array, count_table, occurence):
                             "intron_start": left_end,
                             "intron_end": right_pos
                         })
+    count_operations("candidates_verified", anchor_pairs)
     return alignments
 
 # ========================================================================================
 # Main HISAT Alignment Function
 # ========================================================================================
 
-def hisat_align(read, reference, max_mismatches=2):
+def hisat_align(read, reference, max_mismatches=2, fm_index=None):
     """
-    Main HISAT alignment function.
+    Main HISAT alignment function. Pass a prebuilt fm_index (build_fm_index, or build_seed_index for a
+    selectable seeding backend) to skip the per-read build.
     """
-    ref_with_term = reference + "$"
-    
-    print("Building FM-index.")
-    suffix_array = build_suffix_array(ref_with_term)  # O(n log n)
-    bwt = build_BWT(ref_with_term, suffix_array)  # O(n)
-    count_table, _ = build_count_table(bwt)  # O(n)
-    occurence = build_occurrence_table(bwt)  # O(n)
+    if fm_index is None:
+        logger.warning("No fm_index passed; building the FM-index for this read")
+        fm_index = build_fm_index(reference)  # O(n log n)
+    seed_locator = seed_locator_for(fm_index)
     
-    print("Searching for exact matches.")
-    exact_positions = locate_pattern(read, suffix_array, count_table, occurence)  # O(r + k)
+    logger.debug("Searching for exact matches (read length %d)", len(read))
+    with stage("exact_search"):
+        exact_positions = seed_locator.locate(read)                                   # O(r + k)
     
     alignments = []
     for position in exact_positions:
@@ -171,12 +161,14 @@ def hisat_align(read, reference, max_mismatches=2):
         })
     
     if len(alignments) == 0:
-        print("Trying approximate matching.")
-        alignments = seed_and_extend(read, reference, suffix_array, count_table, occurence, max_mismatches)  # O(s * h * r)
+        logger.debug("No exact match; trying approximate matching")
+        with stage("seed_extend"):
+            alignments = seed_and_extend(read, reference, seed_locator, max_mismatches)  # O(s * h * r)
     
     if len(alignments) == 0:
-        print("Trying spliced alignment.")
-        alignments = spliced_alignment(read, reference, suffix_array, count_table, occurence)  # O(r * L * R)
+        logger.debug("No approximate match; trying spliced alignment")
+        with stage("spliced"):
+            alignments = spliced_alignment(read, reference, seed_locator)  # O(r * L * R)
     
     alignments.sort(key=lambda x: x["score"], reverse=True)
     return alignments
@@ -17,18 +17,47 @@
 #                      
 # ====================================================================================================
 
+import logging
 import math
+import mmap
+import struct
+import sys
+from array import array
+from bisect import bisect_left
 from Utility_Functions.shared_utils import get_minimizers
+from Utility_Functions.index_budget import posting_widths
+from Utility_Functions.instrumentation import (
+    stage, timed, count_operations, take_operation_counts, add_operation_counts, take_stage_timings, add_stage_timings
+)
+from Utility_Functions.parallel_utils import (
+    get_shared_state, fork_available, create_shared_pool, close_shared_pool, chunk_items, imap_bounded
+)
+
+EQ_CLASSES_HEADER = "#salmon_eq_classes_v2"
+ONLINE_EM_SEED_PRIOR = 0.01     # uniform share mixed into the online abundances that seed the offline EM
+
+logger = logging.getLogger(__name__)
 
 # ========================================================================================
 # Build Salmon Index
 # ========================================================================================
 
+class MinimizerIndex(dict):
+    """
+    Minimizer -> [(transcript_id, position)] dict with the posting count lookup of MappedMinimizerIndex.
+    """
+    
+    def count(self, hash_val):
+        """Number of postings of a minimizer (0 if absent)."""
+        postings = self.get(hash_val)
+        return 0 if postings is None else len(postings)
+
+
 def build_salmon_index(transcripts, kmer_size=31):
     """
     Build quasi-index from transcripts.
     """
-    index = {}                                                              # O(M) space where M = total minimizers
+    index = MinimizerIndex()                                                # O(M) space where M = total minimizers
     transcript_lengths = {}
     
     for transcript_id, sequence in transcripts.items():                     # O(T) transcripts
@@ -41,23 +70,102 @@ def build_salmon_index(transcripts, kmer_size=31):
     
     return index, transcript_lengths
 
+# ========================================================================================
+# Repetitive Minimizer Masking
+#       Minimizers from repetitive gene families carry very long posting lists. As in minimap2,
+#       the top fraction of minimizers by occurrence (optionally with an absolute cap) is masked
+#       so that quasi_map never walks their postings on the fast path.
+# ========================================================================================
+
+def compute_occurrence_cap(index, top_fraction=0.0001, max_occurrences=None):
+    """
+    Get the occurrence count above which a minimizer is considered repetitive.
+    """
+    occurrences = sorted([len(postings) for postings in index.values()], reverse=True)  # O(M log M)
+    if len(occurrences) == 0:
+        return 0
+    
+    num_top = int(len(occurrences) * top_fraction)
+    occurrence_cap = occurrences[min(num_top, len(occurrences) - 1)]
+    if max_occurrences is not None:
+        occurrence_cap = min(occurrence_cap, max_occurrences)
+    return occurrence_cap
+
+
+def mask_repetitive_minimizers(index, top_fraction=0.0001, max_occurrences=None):
+    """
+    Split the index into kept and masked minimizers, with index-time statistics.
+    """
+    occurrence_cap = compute_occurrence_cap(index, top_fraction, max_occurrences)
+    kept_index = MinimizerIndex()
+    masked_index = MinimizerIndex()
+    total_postings = 0
+    max_occurrence = 0
+    
+    for hash_val, postings in index.items():                                # O(M)
+        total_postings += len(postings)
+        max_occurrence = max(max_occurrence, len(postings))
+        if len(postings) > occurrence_cap:
+            masked_index[hash_val] = postings
+        else:
+            kept_index[hash_val] = postings
+    
+    stats = {
+        "distinct_minimizers": len(index),
+        "total_postings": total_postings,
+        "max_occurrence": max_occurrence,
+        "mean_occurrence": total_postings / max(1, len(index)),
+        "occurrence_cap": occurrence_cap,
+        "masked_minimizers": len(masked_index),
+        "masked_postings": sum(len(postings) for postings in masked_index.values())
+    }
+    return kept_index, masked_index, stats
+
 # ========================================================================================
 # Quasi-Mapping
 # ========================================================================================
 
-def quasi_map(read, index, transcript_lengths, kmer_size=31, min_hits=3):
+@timed()
+def quasi_map(read, index, transcript_lengths, kmer_size=31, min_hits=3, masked_index=None, rescue_max_postings=1000):
     """
     Perform the quasi-mapping of the read to transcripts.
     """
     minimizers = get_minimizers(read, kmer_size, 10)                        # O(r): r = read length
     hit_counts = {}
+    masked_hits = []
+    postings_scanned = 0
     
     for read_hash, read_position in minimizers:                             # O(m) minimizers
         if read_hash in index:                                              # O(1) lookup
-            for transcript_id, ref_position in index[read_hash]:            # O(h) hits per minimizer
+            postings = index[read_hash]
+            postings_scanned += len(postings)
+            for transcript_id, ref_position in postings:                    # O(h) hits per minimizer, h <= occurrence cap
+                if transcript_id not in hit_counts:
+                    hit_counts[transcript_id] = []
+                hit_counts[transcript_id].append((read_position, ref_position))
+        elif masked_index is not None:
+            occurrence = masked_index.count(read_hash)                      # O(1), postings are built only if rescued
+            if occurrence:
+                masked_hits.append((occurrence, read_hash, read_position))
+    
+    # Rescue: the read only hit masked minimizers, so use the least repetitive ones. The
+    # min_hits least repetitive are always used, since fewer can never map the read; more are
+    # added while the posting budget lasts. Keeps per-read latency bounded by the budget or
+    # by min_hits posting lists.
+    if len(hit_counts) == 0 and len(masked_hits) > 0:
+        masked_hits.sort()                                                  # O(m log m)
+        rescue_postings = 0
+        for rank, (occurrence, read_hash, read_position) in enumerate(masked_hits):
+            if rank >= min_hits and rescue_postings + occurrence > rescue_max_postings:
+                break
+            rescue_postings += occurrence
+            for transcript_id, ref_position in masked_index[read_hash]:     # O(max(P, min_hits * h)), P = rescue_max_postings
                 if transcript_id not in hit_counts:
                     hit_counts[transcript_id] = []
                 hit_counts[transcript_id].append((read_position, ref_position))
+        postings_scanned += rescue_postings
+    count_operations("minimizers_looked_up", len(minimizers))
+    count_operations("postings_scanned", postings_scanned)
     
     mappings = []
     for transcript_id, hits in hit_counts.items():                          # O(t) mapped transcripts
@@ -76,13 +184,212 @@ def quasi_map(read, index, transcript_lengths, kmer_size=31, min_hits=3):
     mappings.sort(key=lambda x: x["coverage"], reverse=True)                # O(t log t), sorting algorithm
     return mappings
 
+# ========================================================================================
+# Equivalence Classes
+#       Reads with the same transcript set are collapsed into one class keyed by the sorted
+#       transcript indices (as in Salmon's CollapsedEMOptimizer): [count, w_1, ..., w_A] with
+#       the alignment weights exp(score / 10) summed over the class's reads. The EM uses the
+#       mean weight per transcript, so the number of classes does not grow with the reads.
+# ========================================================================================
+
+def compute_effective_lengths(transcript_lengths, fragment_length=150):
+    """
+    Compute effective transcript lengths for the M-step.
+    """
+    effective_lengths = {}
+    for transcript_id, length in transcript_lengths.items():                # O(T)
+        effective_lengths[transcript_id] = max(1, length - fragment_length + 1)
+    return effective_lengths
+
+
+def alignment_weight(score):
+    """
+    Conditional probability weight of an alignment score.
+    """
+    return math.exp(score / 10.0)
+
+
+def add_to_equivalence_classes(eq_counts, read_alignments, transcript_id_to_index):
+    """
+    Add one read's alignments to the equivalence-class counts.
+    """
+    mapping = {}
+    for alignment in read_alignments:                                       # O(A) alignments per read
+        if alignment and alignment["transcript_id"] in transcript_id_to_index:
+            mapping[transcript_id_to_index[alignment["transcript_id"]]] = alignment["score"]
+    if not mapping:
+        return False
+    
+    eq_class = tuple(sorted(mapping))                                       # O(A log A)
+    entry = eq_counts.get(eq_class)
+    if entry is None:
+        entry = eq_counts[eq_class] = [0] + [0.0] * len(eq_class)
+    entry[0] += 1
+    for member, transcript_idx in enumerate(eq_class, 1):                   # O(A) weight sums
+        entry[member] += alignment_weight(mapping[transcript_idx])
+    return True
+
+
+def merge_equivalence_classes(eq_counts, other_counts):
+    """
+    Add the counts and weight sums of another equivalence-class table into eq_counts.
+    """
+    for eq_class, other in other_counts.items():                            # O(E * A)
+        entry = eq_counts.get(eq_class)
+        if entry is None:
+            eq_counts[eq_class] = list(other)
+        else:
+            for member in range(len(entry)):
+                entry[member] += other[member]
+    return eq_counts
+
+
+def equivalence_class_reads(eq_counts):
+    """
+    Number of reads in an equivalence-class table.
+    """
+    return sum(entry[0] for entry in eq_counts.values())
+
+
+def write_equivalence_classes(eq_path, eq_counts, num_transcripts):
+    """
+    Write equivalence-class counts as text: one "count<TAB>idx:weight_sum,idx:weight_sum" line per class.
+    Transcript indexes refer to the index the reads were mapped with.
+    """
+    with open(eq_path, 'w') as f:
+        f.write(EQ_CLASSES_HEADER + "\t" + str(num_transcripts) + "\n")
+        for eq_class, entry in eq_counts.items():                           # O(E * A)
+            f.write(str(entry[0]) + "\t" + ",".join(str(idx) + ":" + repr(weight_sum)
+                                                    for idx, weight_sum in zip(eq_class, entry[1:])) + "\n")
+
+
+def read_equivalence_classes(eq_path):
+    """
+    Read a file from write_equivalence_classes; returns (eq_counts, num_transcripts).
+    """
+    eq_counts = {}
+    with open(eq_path) as f:
+        header = f.readline().rstrip("\n").split("\t")
+        if header[0] != EQ_CLASSES_HEADER:
+            raise ValueError("Not an equivalence-class file: " + eq_path)
+        num_transcripts = int(header[1])
+        for line in f:                                                      # O(E * A)
+            count, members = line.rstrip("\n").split("\t")
+            count = int(count)
+            eq_class = []
+            entry = [count]
+            for member in members.split(","):
+                idx, value = member.split(":")
+                eq_class.append(int(idx))
+                entry.append(float(value))
+            merge_equivalence_classes(eq_counts, {tuple(eq_class): entry})
+    return eq_counts, num_transcripts
+
 # ========================================================================================
 # Expectation-Maximization (EM) for Quantification
 # ========================================================================================
 
+def _weighted_classes(eq_counts):
+    """
+    Precompute the mean per-transcript alignment weights of every equivalence class.
+    """
+    weighted = []
+    for eq_class, entry in eq_counts.items():                               # O(E * A)
+        count = entry[0]
+        weights = []
+        for transcript_idx, weight_sum in zip(eq_class, entry[1:]):
+            weights.append((transcript_idx, weight_sum / count))
+        weighted.append((count, weights))
+    return weighted
+
+
+def _expected_counts(weighted_classes, theta):
+    """
+    E-step: distribute each class count over its transcripts.
+    """
+    expected_counts = [0.0] * len(theta)
+    for count, weights in weighted_classes:                                 # O(E) classes
+        total = 0.0
+        for transcript_idx, weight in weights:                              # O(A) transcripts per class
+            total += theta[transcript_idx] * weight
+        if total > 0:
+            for transcript_idx, weight in weights:
+                expected_counts[transcript_idx] += count * theta[transcript_idx] * weight / total
+    return expected_counts
+
+
+def _normalize_abundances(expected_counts, effective_lengths):
+    """
+    M-step: length-normalize expected counts into relative abundances.
+    """
+    theta = []
+    theta_sum = 0.0
+    for transcript_idx in range(len(expected_counts)):                      # O(T)
+        theta.append(expected_counts[transcript_idx] / effective_lengths[transcript_idx])
+        theta_sum += theta[transcript_idx]
+    if theta_sum > 0:
+        theta = [theta_val / theta_sum for theta_val in theta]
+    return theta
+
+
+def _run_em(weighted_classes, theta, length_list, max_iter, tolerance):
+    """
+    Alternate E- and M-steps from theta until the abundances change by less than tolerance.
+    """
+    for iteration in range(max_iter):                               # O(I) iterations until convergence
+        theta_old = theta
+        count_operations("em_iterations")
+        expected_counts = _expected_counts(weighted_classes, theta) # O(E * A) - E-step
+        theta = _normalize_abundances(expected_counts, length_list) # O(T) - M-step
+        
+        max_diff = 0.0
+        for transcript_idx in range(len(theta)):                    # O(T) convergence check
+            diff = abs(theta[transcript_idx] - theta_old[transcript_idx])
+            if diff > max_diff:
+                max_diff = diff
+        if max_diff < tolerance:
+            logger.info("EM converged after %d iterations", iteration + 1)
+            break
+    return theta
+
+
+@timed("em")
+def em_quantify_equivalence_classes(eq_counts, transcript_lengths, effective_lengths=None, initial_theta=None,
+                                    max_iter=1000, tolerance=1e-8):
+    """
+    Run the offline EM over equivalence-class counts.
+    """
+    transcript_list = list(transcript_lengths.keys())
+    num_transcripts = len(transcript_list)                          # T transcripts
+    
+    if num_transcripts == 0:
+        return {}
+    if not eq_counts:
+        return {tid: 0.0 for tid in transcript_list}
+    
+    if effective_lengths is None:
+        effective_lengths = compute_effective_lengths(transcript_lengths)
+    length_list = [effective_lengths[tid] for tid in transcript_list]
+    weighted_classes = _weighted_classes(eq_counts)
+    
+    if initial_theta is None:
+        theta = [1.0 / num_transcripts] * num_transcripts
+    else:
+        theta = initial_theta[:]
+    theta = _run_em(weighted_classes, theta, length_list, max_iter, tolerance)
+    
+    result = {}
+    for transcript_idx in range(num_transcripts):
+        result[transcript_list[transcript_idx]] = theta[transcript_idx] * 1e6
+    return result
+
+
+@timed("em")
 def em_quantify(alignments_per_read, transcript_lengths, max_iter=1000, tolerance=1e-8):
     """
-    Run EM algorithm to estimate transcript abundances.
+    Run EM algorithm to estimate transcript abundances from per-read alignments.
+    Every read keeps its own alignment weights: only reads with the same transcripts and
+    the same scores are collapsed, unlike the mean weights of em_quantify_equivalence_classes.
     """
     transcript_list = list(transcript_lengths.keys())
     num_transcripts = len(transcript_list)                          # T transcripts
@@ -93,61 +400,27 @@ def em_quantify(alignments_per_read, transcript_lengths, max_iter=1000, toleranc
     transcript_id_to_index = {}
     for idx, tid in enumerate(transcript_list):
         transcript_id_to_index[tid] = idx
-    theta = [1.0 / num_transcripts] * num_transcripts
     
-    read_mappings = []
-    for read_alignments in alignments_per_read:
+    read_counts = {}
+    for read_alignments in alignments_per_read:                     # O(R * A) collapse identical reads
         mapping = {}
         for alignment in read_alignments:
             if alignment and alignment["transcript_id"] in transcript_id_to_index:
                 mapping[transcript_id_to_index[alignment["transcript_id"]]] = alignment["score"]
         if mapping:
-            read_mappings.append(mapping)
+            key = tuple(sorted(mapping.items()))
+            read_counts[key] = read_counts.get(key, 0) + 1
     
-    if not read_mappings:
+    if not read_counts:
         return {tid: 0.0 for tid in transcript_list}
     
-    for iteration in range(max_iter):                               # O(I) iterations until convergence
-        theta_old = theta[:]
-        expected_counts = [0.0] * num_transcripts
-        
-        for mapping in read_mappings:                               # O(R) reads - E-step
-            probs = [0.0] * num_transcripts
-            total = 0.0
-            
-            for transcript_idx, score in mapping.items():           # O(A) alignments per read
-                prob = theta[transcript_idx] * math.exp(score / 10.0)
-                probs[transcript_idx] = prob
-                total += prob
-            
-            if total > 0:
-                for transcript_idx in mapping:
-                    expected_counts[transcript_idx] += probs[transcript_idx] / total
-        
-        fragment_length = 150
-        effective_lengths = []                                      # M-step: O(T)
-        for tid in transcript_list:
-            effective_lengths.append(max(1, transcript_lengths[tid] - fragment_length + 1))
-        
-        theta_sum = 0.0
-        for transcript_idx in range(num_transcripts):               # O(T) update theta
-            theta[transcript_idx] = expected_counts[transcript_idx] / effective_lengths[transcript_idx]
-            theta_sum += theta[transcript_idx]
-        
-        if theta_sum > 0:
-            normalized_theta = []
-            for theta_val in theta:
-                normalized_theta.append(theta_val / theta_sum)
-            theta = normalized_theta
-        
-        max_diff = 0.0
-        for transcript_idx in range(num_transcripts):               # O(T) convergence check
-            diff = abs(theta[transcript_idx] - theta_old[transcript_idx])
-            if diff > max_diff:
-                max_diff = diff
-        if max_diff < tolerance:
-            print("EM converged after", iteration + 1, "iterations")
-            break
+    weighted_classes = []
+    for key, count in read_counts.items():
+        weighted_classes.append((count, [(transcript_idx, alignment_weight(score)) for transcript_idx, score in key]))
+    
+    effective_lengths = compute_effective_lengths(transcript_lengths)
+    length_list = [effective_lengths[tid] for tid in transcript_list]
+    theta = _run_em(weighted_classes, [1.0 / num_transcripts] * num_transcripts, length_list, max_iter, tolerance)
     
     result = {}
     for transcript_idx in range(num_transcripts):
@@ -155,21 +428,78 @@ def em_quantify(alignments_per_read, transcript_lengths, max_iter=1000, toleranc
     return result
 
 # ========================================================================================
-# Main Salmon Quantification Function
+# Online (Mini-Batch) EM
+#       Stepwise EM: each mini-batch contributes its expected read fractions with a
+#       decaying step size, eta_t = (t + 1)^(-forgetting), so abundances are available while
+#       mapping is still running. The read fractions start from the uniform prior and the
+#       step stays below 1, so a transcript missing from the first mini-batches keeps a
+#       positive abundance that later batches can grow. The final offline EM starts from
+#       these abundances mixed with ONLINE_EM_SEED_PRIOR of the uniform prior: the EM is
+#       multiplicative, so a zero start would stay zero.
 # ========================================================================================
 
-def salmon_quantify(reads, transcripts, kmer_size=31):
+def create_online_em_state(transcript_lengths, effective_lengths=None, forgetting=0.65):
     """
-    Main Salmon quantification function.
+    Create the state for online EM updates.
+    """
+    if effective_lengths is None:
+        effective_lengths = compute_effective_lengths(transcript_lengths)
+    num_transcripts = len(transcript_lengths)
+    return {
+        "theta": [1.0 / max(1, num_transcripts)] * num_transcripts,
+        "read_fractions": [1.0 / max(1, num_transcripts)] * num_transcripts,
+        "effective_lengths": [effective_lengths[tid] for tid in transcript_lengths],
+        "forgetting": forgetting,
+        "batches": 0,
+        "reads": 0
+    }
+
+
+def online_em_update(state, batch_eq_counts):
     """
-    print("Building Salmon index...")
-    index, transcript_lengths = build_salmon_index(transcripts, kmer_size)  # O(T * L)
+    Update abundances with one mini-batch of equivalence-class counts.
+    """
+    batch_reads = equivalence_class_reads(batch_eq_counts)
+    if batch_reads == 0:
+        return state["theta"]
+    
+    expected_counts = _expected_counts(_weighted_classes(batch_eq_counts), state["theta"])  # O(E_b * A)
+    state["batches"] += 1
+    state["reads"] += batch_reads
+    step = (state["batches"] + 1) ** (-state["forgetting"])                 # < 1: the prior is never overwritten
+    
+    read_fractions = state["read_fractions"]
+    for transcript_idx in range(len(read_fractions)):                       # O(T)
+        batch_fraction = expected_counts[transcript_idx] / batch_reads
+        read_fractions[transcript_idx] = (1.0 - step) * read_fractions[transcript_idx] + step * batch_fraction
     
-    print("Mapping reads.")
-    all_alignments = []
+    state["theta"] = _normalize_abundances(read_fractions, state["effective_lengths"])
+    return state["theta"]
+
+
+def online_em_seed(state, prior_weight=ONLINE_EM_SEED_PRIOR):
+    """
+    Starting abundances for the offline EM: the online theta mixed with the uniform prior (no exact zeros).
+    """
+    theta = state["theta"]
+    uniform = 1.0 / max(1, len(theta))
+    return [(1.0 - prior_weight) * theta_val + prior_weight * uniform for theta_val in theta]
+
+# ========================================================================================
+# Read Mapping into Equivalence Classes
+# ========================================================================================
+
+def map_reads(reads, salmon_index, eq_counts=None):
+    """
+    Quasi-map a chunk of reads and accumulate their equivalence-class counts.
+    """
+    if eq_counts is None:
+        eq_counts = {}
     
-    for read_index, read in enumerate(reads):  # O(R) reads
-        mappings = quasi_map(read, index, transcript_lengths, kmer_size)  # O(m * h) per read
+    for read in reads:                                                      # O(R) reads
+        mappings = quasi_map(read, salmon_index["index"], salmon_index["transcript_lengths"], salmon_index["kmer_size"],
+                             masked_index=salmon_index["masked_index"],
+                             rescue_max_postings=salmon_index["rescue_max_postings"])  # O(m * h) per read, h capped
         
         alignments = []
         for mapping in mappings:
@@ -177,17 +507,423 @@ def salmon_quantify(reads, transcripts, kmer_size=31):
                 "transcript_id": mapping["transcript_id"],
                 "score": mapping["coverage"] * 100
             })
-        all_alignments.append(alignments)
-        
-        if (read_index + 1) % 100 == 0:
-            print("  Processed", read_index + 1, "reads...")
+        add_to_equivalence_classes(eq_counts, alignments, salmon_index["transcript_id_to_index"])
+    return eq_counts
+
+
+def _map_read_chunk(read_chunk):
+    """Worker task: map one chunk against the fork-inherited index; also returns its operation counts and stage timings."""
+    take_operation_counts()                                                 # drop anything inherited or left over
+    take_stage_timings()
+    eq_counts = map_reads(read_chunk, get_shared_state()["salmon_index"])
+    return len(read_chunk), eq_counts, take_operation_counts(), take_stage_timings()
+
+
+def map_reads_parallel(reads, salmon_index, workers=1, chunk_size=1000):
+    """
+    Map reads (FastqRecord objects or sequence strings) in chunks, yielding
+    (chunk size, partial equivalence-class table) per chunk.
+    With workers > 1 the index is shared with a forked pool instead of pickled per task.
+    """
+    sequences = (getattr(read, "sequence", read) for read in reads)       # stream, no copy of the read list
+    chunks = chunk_items(sequences, chunk_size)
+    
+    if workers <= 1 or not fork_available():
+        for read_chunk in chunks:                                           # O(R / c) chunks
+            yield len(read_chunk), map_reads(read_chunk, salmon_index)
+        return
+    
+    pool = create_shared_pool(workers, {"salmon_index": salmon_index})
+    completed = False
+    try:
+        for num_reads, eq_counts, operation_counts, stage_timings in imap_bounded(pool, _map_read_chunk, chunks,
+                                                                                  2 * workers):  # O(R / (c * p)) per worker
+            add_operation_counts(operation_counts)                          # worker counts and stage times join this process's
+            add_stage_timings(stage_timings)                                # (summed over workers)
+            yield num_reads, eq_counts
+        completed = True
+    finally:
+        close_shared_pool(pool, terminate=not completed)                    # an error or an early stop leaves busy workers
+
+# ========================================================================================
+# Serialized Salmon Index
+#       Versioned little-endian binary layout, every section 8-byte aligned:
+#           header      magic, version, k, w, fragment length, T, M, P, occurrence cap,
+#                       posting transcript and position widths (version 2; 4 and 4 in version 1)
+#           sections    offsets of the tables below
+#           names       T+1 u64 offsets into a UTF-8 name blob
+#           lengths     T u64 transcript lengths, T f64 effective lengths
+#           minimizers  M u64 sorted hashes, M u8 masked flags, M+1 u64 posting offsets
+#           postings    P transcript indices, P positions (u32, or u16 for compact postings)
+#       Loading maps the file and binary-searches the hash table in place (no parsing).
+# ========================================================================================
+
+SALMON_INDEX_MAGIC = b"SALMIDX\0"
+SALMON_INDEX_VERSION = 2
+_HEADER_FORMAT = "<8sIIIIQQQQII"
+_HEADER_FORMAT_V1 = "<8sIIIIQQQQ"
+_WIDTH_TYPECODES = {2: "H", 4: "I"}
+_NUM_SECTIONS = 9
+
+
+def _pad8(blob):
+    """Pad a byte string to a multiple of 8 bytes."""
+    return blob + b"\0" * (-len(blob) % 8)
+
+
+class MappedMinimizerIndex:
+    """
+    Read-only minimizer -> [(transcript_id, position)] view over a serialized index.
+    Behaves like the dict built by build_salmon_index for the lookups quasi_map does.
+    """
+    
+    def __init__(self, hashes, masked_flags, posting_offsets, posting_transcripts, posting_positions,
+                 transcript_names, masked):
+        self.hashes = hashes
+        self.masked_flags = masked_flags
+        self.posting_offsets = posting_offsets
+        self.posting_transcripts = posting_transcripts
+        self.posting_positions = posting_positions
+        self.transcript_names = transcript_names
+        self.masked = int(masked)
+        self.size = None
+    
+    def _find(self, hash_val):
+        slot = bisect_left(self.hashes, hash_val)                           # O(log M) binary search
+        if slot < len(self.hashes) and self.hashes[slot] == hash_val and self.masked_flags[slot] == self.masked:
+            return slot
+        return -1
+    
+    def __contains__(self, hash_val):
+        return self._find(hash_val) >= 0
+    
+    def __getitem__(self, hash_val):
+        slot = self._find(hash_val)
+        if slot < 0:
+            raise KeyError(hash_val)
+        postings = []
+        for posting in range(self.posting_offsets[slot], self.posting_offsets[slot + 1]):  # O(h) postings
+            postings.append((self.transcript_names[self.posting_transcripts[posting]], self.posting_positions[posting]))
+        return postings
+    
+    def count(self, hash_val):
+        """Number of postings of a minimizer (0 if absent), without building them."""
+        slot = self._find(hash_val)
+        if slot < 0:
+            return 0
+        return self.posting_offsets[slot + 1] - self.posting_offsets[slot]
+    
+    def get(self, hash_val, default=None):
+        if hash_val in self:
+            return self[hash_val]
+        return default
+    
+    def __len__(self):
+        if self.size is None:
+            self.size = sum(1 for flag in self.masked_flags if flag == self.masked)  # O(M), computed once
+        return self.size
+    
+    def keys(self):
+        for slot in range(len(self.hashes)):
+            if self.masked_flags[slot] == self.masked:
+                yield self.hashes[slot]
+    
+    def values(self):
+        for hash_val in self.keys():
+            yield self[hash_val]
+    
+    def items(self):
+        for hash_val in self.keys():
+            yield hash_val, self[hash_val]
+
+
+def save_salmon_index(index_path, salmon_index, compact_postings=False):
+    """
+    Write the Salmon index to a versioned binary file.
+    compact_postings stores posting transcript indices and positions as u16 where they fit (index_budget).
+    """
+    transcript_names = list(salmon_index["transcript_lengths"].keys())
+    encoded_names = [name.encode("utf-8") for name in transcript_names]     # O(T)
+    name_blob = b"".join(encoded_names)
+    name_offsets = [0]
+    for encoded in encoded_names:
+        name_offsets.append(name_offsets[-1] + len(encoded))
+    
+    entries = []
+    for masked, index in ((0, salmon_index["index"]), (1, salmon_index["masked_index"])):
+        for hash_val in index.keys():
+            entries.append((hash_val, masked, index[hash_val]))
+    entries.sort(key=lambda entry: entry[0])                                # O(M log M)
+    
+    transcript_id_to_index = salmon_index["transcript_id_to_index"]
+    hashes = array("Q")
+    masked_flags = array("B")
+    transcript_width, position_width = posting_widths(len(transcript_names),
+                                                      max(salmon_index["transcript_lengths"].values(), default=0),
+                                                      compact_postings)
+    posting_offsets = array("Q", [0])
+    posting_transcripts = array(_WIDTH_TYPECODES[transcript_width])
+    posting_positions = array(_WIDTH_TYPECODES[position_width])
+    for hash_val, masked, postings in entries:                              # O(M + P)
+        hashes.append(hash_val)
+        masked_flags.append(masked)
+        for transcript_id, position in postings:
+            posting_transcripts.append(transcript_id_to_index[transcript_id])
+            posting_positions.append(position)
+        posting_offsets.append(len(posting_transcripts))
+    
+    sections = [
+        array("Q", name_offsets).tobytes(),
+        name_blob,
+        array("Q", [salmon_index["transcript_lengths"][tid] for tid in transcript_names]).tobytes(),
+        array("d", [float(salmon_index["effective_lengths"][tid]) for tid in transcript_names]).tobytes(),
+        hashes.tobytes(),
+        masked_flags.tobytes(),
+        posting_offsets.tobytes(),
+        posting_transcripts.tobytes(),
+        posting_positions.tobytes()
+    ]
+    header = struct.pack(_HEADER_FORMAT, SALMON_INDEX_MAGIC, SALMON_INDEX_VERSION, salmon_index["kmer_size"],
+                         salmon_index["window_size"], salmon_index["fragment_length"], len(transcript_names),
+                         len(hashes), len(posting_transcripts), salmon_index["stats"]["occurrence_cap"],
+                         transcript_width, position_width)
+    
+    offset = len(_pad8(header)) + 8 * _NUM_SECTIONS
+    section_offsets = []
+    for section in sections:
+        section_offsets.append(offset)
+        offset += len(_pad8(section))
+    
+    with open(index_path, "wb") as f:
+        f.write(_pad8(header))
+        f.write(array("Q", section_offsets).tobytes())
+        for section in sections:
+            f.write(_pad8(section))
+    return index_path
+
+
+def load_salmon_index(index_path, rescue_max_postings=1000):
+    """
+    Load a serialized Salmon index by memory-mapping it.
+    """
+    if sys.byteorder != "little":
+        raise ValueError("Serialized Salmon index requires a little-endian host")
+    
+    with open(index_path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    buffer = memoryview(mapped)
+    
+    magic, version = struct.unpack_from("<8sI", buffer, 0)
+    if magic != SALMON_INDEX_MAGIC:
+        raise ValueError("Not a Salmon index file: " + index_path)
+    if version == 1:                                                        # fixed 32-bit postings
+        header_format = _HEADER_FORMAT_V1
+        transcript_width = position_width = 4
+        (_, _, kmer_size, window_size, fragment_length, num_transcripts,
+         num_minimizers, num_postings, occurrence_cap) = struct.unpack_from(header_format, buffer, 0)
+    elif version == SALMON_INDEX_VERSION:
+        header_format = _HEADER_FORMAT
+        (_, _, kmer_size, window_size, fragment_length, num_transcripts, num_minimizers, num_postings,
+         occurrence_cap, transcript_width, position_width) = struct.unpack_from(header_format, buffer, 0)
+    else:
+        raise ValueError("Unsupported Salmon index version " + str(version) + " in " + index_path)
+    header_size = struct.calcsize(header_format)
+    
+    table_start = header_size + (-header_size % 8)
+    section_offsets = buffer[table_start:table_start + 8 * _NUM_SECTIONS].cast("Q").tolist()
+    
+    def section(number, fmt, count):
+        start = section_offsets[number]
+        return buffer[start:start + count * struct.calcsize(fmt)].cast(fmt)
+    
+    name_offsets = section(0, "Q", num_transcripts + 1)
+    name_blob = section(1, "B", name_offsets[num_transcripts])
+    transcript_names = []
+    for idx in range(num_transcripts):                                      # O(T) name table only
+        transcript_names.append(bytes(name_blob[name_offsets[idx]:name_offsets[idx + 1]]).decode("utf-8"))
+    lengths = section(2, "Q", num_transcripts)
+    effective = section(3, "d", num_transcripts)
+    
+    hashes = section(4, "Q", num_minimizers)
+    masked_flags = section(5, "B", num_minimizers)
+    posting_offsets = section(6, "Q", num_minimizers + 1)
+    posting_transcripts = section(7, _WIDTH_TYPECODES[transcript_width], num_postings)
+    posting_positions = section(8, _WIDTH_TYPECODES[position_width], num_postings)
+    
+    transcript_lengths = {}
+    effective_lengths = {}
+    transcript_id_to_index = {}
+    for idx, tid in enumerate(transcript_names):
+        transcript_lengths[tid] = lengths[idx]
+        effective_lengths[tid] = effective[idx]
+        transcript_id_to_index[tid] = idx
+    
+    views = (hashes, masked_flags, posting_offsets, posting_transcripts, posting_positions, transcript_names)
+    index = MappedMinimizerIndex(*views, masked=False)
+    masked_index = MappedMinimizerIndex(*views, masked=True)
+    
+    return {
+        "index": index,
+        "masked_index": masked_index,
+        "transcript_lengths": transcript_lengths,
+        "effective_lengths": effective_lengths,
+        "transcript_id_to_index": transcript_id_to_index,
+        "kmer_size": kmer_size,
+        "window_size": window_size,
+        "fragment_length": fragment_length,
+        "rescue_max_postings": rescue_max_postings,
+        "stats": {
+            "distinct_minimizers": num_minimizers,
+            "total_postings": num_postings,
+            "occurrence_cap": occurrence_cap,
+            "masked_minimizers": len(masked_index)
+        },
+        "mmap": mapped
+    }
+
+# ========================================================================================
+# Main Salmon Quantification Function
+#       Two stages, as in the real tool: `salmon index` builds and writes the index,
+#       `salmon quant` loads it and quantifies. salmon_quantify runs both in memory.
+# ========================================================================================
+
+def create_salmon_index(transcripts, kmer_size=31, mask_top_fraction=0.0001, max_occurrences=None, rescue_max_postings=1000,
+                        fragment_length=150):
+    """
+    Build the in-memory Salmon index with masking and precomputed effective lengths.
+    """
+    logger.info("Building Salmon index for %d transcripts", len(transcripts))
+    with stage("index_build"):
+        index, transcript_lengths = build_salmon_index(transcripts, kmer_size)  # O(T * L)
+        index, masked_index, stats = mask_repetitive_minimizers(index, mask_top_fraction, max_occurrences)  # O(M log M)
+    logger.info("  Minimizers: %d | postings: %d | max occurrence: %d | occurrence cap: %d | masked: %d",
+                stats["distinct_minimizers"], stats["total_postings"], stats["max_occurrence"],
+                stats["occurrence_cap"], stats["masked_minimizers"])
+    
+    transcript_id_to_index = {}
+    for idx, tid in enumerate(transcript_lengths):
+        transcript_id_to_index[tid] = idx
+    
+    return {
+        "index": index,
+        "masked_index": masked_index,
+        "transcript_lengths": transcript_lengths,
+        "effective_lengths": compute_effective_lengths(transcript_lengths, fragment_length),
+        "transcript_id_to_index": transcript_id_to_index,
+        "kmer_size": kmer_size,
+        "window_size": 10,
+        "fragment_length": fragment_length,
+        "rescue_max_postings": rescue_max_postings,
+        "stats": stats
+    }
+
+
+def quantify_with_index(reads, salmon_index, online_batch_size=None, workers=1, chunk_size=1000):
+    """
+    Quantify reads against a built or loaded Salmon index.
+    Reads are consumed as a stream; only equivalence-class counts are kept.
+    Mapping chunks (chunk_size reads) are independent of the online EM mini-batches: chunks are
+    accumulated until a mini-batch has at least online_batch_size reads, so a mini-batch is
+    rounded up to whole chunks.
+    """
+    transcript_lengths = salmon_index["transcript_lengths"]
+    effective_lengths = salmon_index["effective_lengths"]
+    
+    online_state = None
+    if online_batch_size:
+        online_state = create_online_em_state(transcript_lengths, effective_lengths)
+    
+    logger.info("Mapping reads")
+    eq_counts = {}                                                          # O(E) classes, independent of R
+    batch_counts = {}
+    batch_reads = 0
+    reads_mapped = 0
+    
+    with stage("mapping"):
+        for num_reads, partial_counts in map_reads_parallel(reads, salmon_index, workers, chunk_size):
+            merge_equivalence_classes(eq_counts, partial_counts)                # O(E_c) per chunk
+            if online_state is not None:
+                merge_equivalence_classes(batch_counts, partial_counts)
+                batch_reads += num_reads
+                if batch_reads >= online_batch_size:
+                    online_em_update(online_state, batch_counts)                # O(E_b * A) per mini-batch
+                    batch_counts, batch_reads = {}, 0
+            
+            reads_mapped += num_reads
+            logger.info("  Processed %d reads", reads_mapped)
+    
+    initial_theta = None
+    if online_state is not None:
+        if batch_reads:
+            online_em_update(online_state, batch_counts)                        # last, partial mini-batch
+        initial_theta = online_em_seed(online_state)
     
-    print("Running EM quantification.")
-    return em_quantify(all_alignments, transcript_lengths)  # O(I * R * A)
+    logger.info("Running EM quantification")
+    return em_quantify_equivalence_classes(eq_counts, transcript_lengths, effective_lengths,
+                                           initial_theta=initial_theta)  # O(I * E * A)
+
+
+def run_salmon_index(transcripts, index_path, kmer_size=31, mask_top_fraction=0.0001, max_occurrences=None,
+                     compact_postings=False):
+    """
+    Index stage: build the Salmon index and write it to index_path (16-bit postings if compact_postings).
+    """
+    salmon_index = create_salmon_index(transcripts, kmer_size, mask_top_fraction, max_occurrences)
+    save_salmon_index(index_path, salmon_index, compact_postings)
+    return salmon_index["stats"]
+
+
+def run_salmon_quant(reads, index_path, rescue_max_postings=1000, online_batch_size=None, workers=1, chunk_size=1000):
+    """
+    Quant stage: load a serialized Salmon index and quantify reads.
+    """
+    with stage("index_load"):
+        salmon_index = load_salmon_index(index_path, rescue_max_postings)
+    return quantify_with_index(reads, salmon_index, online_batch_size, workers, chunk_size)
+
+
+def run_salmon_map(reads, index_path, eq_path, rescue_max_postings=1000, workers=1, chunk_size=1000):
+    """
+    Map stage only (for one shard): write equivalence-class counts to eq_path instead of running the EM.
+    """
+    salmon_index = load_salmon_index(index_path, rescue_max_postings)
+    eq_counts = {}
+    reads_mapped = 0
+    for num_reads, partial_counts in map_reads_parallel(reads, salmon_index, workers, chunk_size):
+        merge_equivalence_classes(eq_counts, partial_counts)
+        reads_mapped += num_reads
+    write_equivalence_classes(eq_path, eq_counts, len(salmon_index["transcript_lengths"]))
+    return reads_mapped
+
+
+def run_salmon_merge_quant(eq_paths, index_path):
+    """
+    Sum the equivalence-class counts of every shard, then run a single EM pass.
+    """
+    salmon_index = load_salmon_index(index_path)
+    transcript_lengths = salmon_index["transcript_lengths"]
+    eq_counts = {}
+    for eq_path in eq_paths:                                                # O(S * E) over S shards
+        shard_counts, num_transcripts = read_equivalence_classes(eq_path)
+        if num_transcripts != len(transcript_lengths):
+            raise ValueError(eq_path + " was mapped with a different index (" + str(num_transcripts) + " transcripts)")
+        merge_equivalence_classes(eq_counts, shard_counts)
+    return em_quantify_equivalence_classes(eq_counts, transcript_lengths, salmon_index["effective_lengths"])
+
+
+@timed()
+def salmon_quantify(reads, transcripts, kmer_size=31, mask_top_fraction=0.0001, max_occurrences=None, rescue_max_postings=1000,
+                    online_batch_size=None, workers=1, chunk_size=1000):
+    """
+    Main Salmon quantification function.
+    """
+    salmon_index = create_salmon_index(transcripts, kmer_size, mask_top_fraction, max_occurrences, rescue_max_postings)  # O(T * L)
+    return quantify_with_index(reads, salmon_index, online_batch_size, workers, chunk_size)
 
 # ========================================================================================
-# OVERALL: Index   O(T*L)           - minimizer extraction across all transcripts
-#          Mapping O(R*m*h)         - minimizer lookups per read times hits per minimizer
-#          Quant   O(I*R*A)         - EM iterations over reads and their multi-mappings
-#          Space   O(M + T + R*A)   - index, abundances, and read assignment storage
+# OVERALL: Index   O(T*L + M log M) - minimizer extraction across all transcripts, plus occurrence masking
+#          Load    O(T)             - mmap plus the transcript name table; lookups are O(log M) in place
+#          Mapping O(R*m*h / p)     - minimizer lookups per read times hits per minimizer (h bounded by the cap), p workers
+#          Quant   O(I*E*A)         - EM iterations over equivalence classes and their transcripts
+#          Space   O(M + T + E*A)   - index (shared copy-on-write or mmap), abundances, and equivalence-class counts (E <= R)
 # ========================================================================================
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Tests: Salmon Equivalence Classes and EM
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import random
+
+import pytest
+
+from Aln_Algorithm_Functions.salmon_saf_alignment import (
+    add_to_equivalence_classes, merge_equivalence_classes, equivalence_class_reads, write_equivalence_classes,
+    read_equivalence_classes, em_quantify, em_quantify_equivalence_classes, create_online_em_state,
+    online_em_update, online_em_seed, alignment_weight, create_salmon_index, quantify_with_index, map_reads_parallel,
+    quasi_map, map_reads, save_salmon_index, load_salmon_index
+)
+from Utility_Functions.parallel_utils import get_shared_state, fork_available
+from Utility_Functions.instrumentation import take_stage_timings, take_operation_counts
+
+
+def random_dna(rng, length):
+    return "".join(rng.choice("ACGT") for _ in range(length))
+
+
+def reads_from(rng, sequence, count, read_length=100):
+    starts = [rng.randrange(0, len(sequence) - read_length) for _ in range(count)]
+    return [sequence[start:start + read_length] for start in starts]
+
+
+@pytest.fixture(scope="module")
+def salmon_case():
+    """Three transcripts; the reads of T2 only arrive after the first mini-batches."""
+    rng = random.Random(27)
+    transcripts = {"T" + str(i): random_dna(rng, 1000) for i in range(3)}
+    reads = reads_from(rng, transcripts["T0"], 150) + reads_from(rng, transcripts["T1"], 150)
+    rng.shuffle(reads)
+    reads += reads_from(rng, transcripts["T2"], 10)
+    return create_salmon_index(transcripts, kmer_size=15), reads
+
+def repeat_family(copies, seed=26):
+    """Transcripts sharing one core sequence between unique flanks, and reads from the core only."""
+    rng = random.Random(seed)
+    core = random_dna(rng, 300)
+    transcripts = {"F" + str(i): random_dna(rng, 150) + core + random_dna(rng, 150) for i in range(copies)}
+    transcripts["U"] = random_dna(rng, 1000)
+    return transcripts, reads_from(rng, core, 20)
+
+
+def mapped_ids(mappings):
+    return sorted(mapping["transcript_id"] for mapping in mappings)
+
+# ========================================================================================
+# Minimizer Index
+# ========================================================================================
+
+def test_posting_counts_match_in_memory_and_mapped(tmp_path):
+    transcripts, reads = repeat_family(60)
+    salmon_index = create_salmon_index(transcripts, kmer_size=15, max_occurrences=20)
+    path = str(tmp_path / "family.idx")
+    save_salmon_index(path, salmon_index)
+    loaded = load_salmon_index(path)
+    assert salmon_index["stats"]["masked_minimizers"] > 0
+    for name in ("index", "masked_index"):
+        for hash_val, postings in salmon_index[name].items():
+            assert salmon_index[name].count(hash_val) == loaded[name].count(hash_val) == len(postings)
+    assert loaded["masked_index"].count(next(iter(salmon_index["index"]))) == 0
+    for read in reads:
+        expected = quasi_map(read, salmon_index["index"], salmon_index["transcript_lengths"], 15,
+                             masked_index=salmon_index["masked_index"])
+        assert expected
+        assert quasi_map(read, loaded["index"], loaded["transcript_lengths"], 15,
+                         masked_index=loaded["masked_index"]) == expected
+
+@pytest.mark.parametrize("copies", [60, 400])
+def test_rescue_maps_reads_of_large_repeat_families(copies):
+    transcripts, reads = repeat_family(copies)
+    salmon_index = create_salmon_index(transcripts, kmer_size=15, max_occurrences=20)
+    family = sorted("F" + str(i) for i in range(copies))
+    for read in reads:
+        mappings = quasi_map(read, salmon_index["index"], salmon_index["transcript_lengths"], 15,
+                             masked_index=salmon_index["masked_index"], rescue_max_postings=1000)
+        assert mapped_ids(mappings) == family
+    eq_counts = map_reads(reads, salmon_index)
+    assert list(eq_counts) == [tuple(range(copies))]
+    assert equivalence_class_reads(eq_counts) == len(reads)
+
+# ========================================================================================
+# Equivalence Classes
+# ========================================================================================
+
+def test_classes_are_keyed_by_transcript_set():
+    eq_counts = {}
+    index = {"A": 0, "B": 1}
+    add_to_equivalence_classes(eq_counts, [{"transcript_id": "B", "score": 80.0},
+                                           {"transcript_id": "A", "score": 90.0}], index)
+    add_to_equivalence_classes(eq_counts, [{"transcript_id": "A", "score": 70.0},
+                                           {"transcript_id": "B", "score": 75.5}], index)
+    assert list(eq_counts) == [(0, 1)]
+    entry = eq_counts[(0, 1)]
+    assert entry[0] == 2
+    assert entry[1] == pytest.approx(alignment_weight(90.0) + alignment_weight(70.0))
+    assert entry[2] == pytest.approx(alignment_weight(80.0) + alignment_weight(75.5))
+
+
+def test_unknown_transcripts_are_ignored():
+    eq_counts = {}
+    assert not add_to_equivalence_classes(eq_counts, [{"transcript_id": "Z", "score": 1.0}], {"A": 0})
+    assert eq_counts == {}
+
+
+def test_merge_adds_counts_and_weights():
+    first = {(0,): [2, 4.0], (0, 1): [1, 1.0, 2.0]}
+    second = {(0, 1): [3, 3.0, 1.0], (1,): [1, 5.0]}
+    merged = merge_equivalence_classes(first, second)
+    assert merged == {(0,): [2, 4.0], (0, 1): [4, 4.0, 3.0], (1,): [1, 5.0]}
+    assert equivalence_class_reads(merged) == 7
+    assert second[(1,)] == [1, 5.0]                                         # copied, not aliased
+
+
+def test_class_file_round_trip(tmp_path):
+    eq_counts = {(0,): [3, 12.5], (0, 2): [2, 1.25, 7.0]}
+    path = str(tmp_path / "shard.eq")
+    write_equivalence_classes(path, eq_counts, 3)
+    assert read_equivalence_classes(path) == (eq_counts, 3)
+
+
+def test_class_file_header_is_checked(tmp_path):
+    path = tmp_path / "other.eq"
+    path.write_text("#salmon_eq_classes_v1\t2\n2\t0:10.0,1:20.0\n")
+    with pytest.raises(ValueError):
+        read_equivalence_classes(str(path))
+
+# ========================================================================================
+# EM
+# ========================================================================================
+
+def test_em_splits_shared_reads_by_unique_evidence():
+    lengths = {"A": 1150, "B": 1150}
+    reads = [[{"transcript_id": "A", "score": 50.0}]] * 30 + [[{"transcript_id": "B", "score": 50.0}]] * 10
+    reads += [[{"transcript_id": "A", "score": 50.0}, {"transcript_id": "B", "score": 50.0}]] * 40
+    tpm = em_quantify(reads, lengths)
+    assert tpm["A"] / tpm["B"] == pytest.approx(3.0, rel=1e-4)
+
+
+def test_per_read_em_keeps_each_read_weight():
+    """em_quantify weighs every read by its own scores; the class EM uses the mean weight per class."""
+    lengths = {"A": 1150, "B": 1150}
+    reads = [[{"transcript_id": "A", "score": 60.0}, {"transcript_id": "B", "score": 20.0}]] * 5
+    reads += [[{"transcript_id": "A", "score": 20.0}, {"transcript_id": "B", "score": 60.0}]] * 5
+    reads += [[{"transcript_id": "A", "score": 50.0}]] * 2
+    
+    theta = [0.5, 0.5]
+    for _ in range(1000):                                                   # per-read EM, as em_quantify always ran
+        expected = [0.0, 0.0]
+        for read in reads:
+            probs = [theta["AB".index(alignment["transcript_id"])] * alignment_weight(alignment["score"])
+                     for alignment in read]
+            for alignment, prob in zip(read, probs):
+                expected["AB".index(alignment["transcript_id"])] += prob / sum(probs)
+        theta = [count / sum(expected) for count in expected]
+    
+    tpm = em_quantify(reads, lengths)
+    assert tpm["A"] == pytest.approx(theta[0] * 1e6, rel=1e-5)
+    assert tpm["B"] == pytest.approx(theta[1] * 1e6, rel=1e-5)
+    
+    eq_counts = {}
+    for read in reads:
+        add_to_equivalence_classes(eq_counts, read, {"A": 0, "B": 1})
+    assert em_quantify_equivalence_classes(eq_counts, lengths)["B"] != pytest.approx(tpm["B"], rel=1e-3)
+
+
+def test_online_update_keeps_absent_transcripts_positive():
+    state = create_online_em_state({"A": 1150, "B": 1150})
+    online_em_update(state, {(0,): [100, 100 * alignment_weight(50.0)]})
+    absent = state["theta"][1]
+    assert absent > 0
+    online_em_update(state, {(1,): [100, 100 * alignment_weight(50.0)]})
+    assert state["theta"][1] > absent
+    assert min(online_em_seed(state)) > 0
+
+
+def test_offline_em_cannot_leave_zero_start():
+    eq_counts = {(1,): [10, 10 * alignment_weight(50.0)]}
+    lengths = {"A": 1150, "B": 1150}
+    assert em_quantify_equivalence_classes(eq_counts, lengths, initial_theta=[1.0, 0.0])["B"] == 0.0
+    assert em_quantify_equivalence_classes(eq_counts, lengths, initial_theta=[0.99, 0.01])["B"] > 0
+
+
+def test_online_quant_matches_offline_for_late_transcript(salmon_case):
+    salmon_index, reads = salmon_case
+    offline = quantify_with_index(reads, salmon_index)
+    online = quantify_with_index(reads, salmon_index, online_batch_size=100)
+    assert offline["T2"] > 0
+    for tid in offline:
+        assert online[tid] == pytest.approx(offline[tid], rel=1e-3, abs=1.0)
+
+
+def test_online_batches_span_several_chunks(salmon_case):
+    salmon_index, reads = salmon_case
+    offline = quantify_with_index(reads, salmon_index)
+    online = quantify_with_index(reads, salmon_index, online_batch_size=100, chunk_size=30)
+    for tid in offline:
+        assert online[tid] == pytest.approx(offline[tid], rel=1e-3, abs=1.0)
+
+
+@pytest.mark.skipif(not fork_available(), reason="fork start method not available")
+def test_parallel_quant_matches_serial(salmon_case):
+    salmon_index, reads = salmon_case
+    serial = quantify_with_index(reads, salmon_index, chunk_size=50)
+    parallel = quantify_with_index(reads, salmon_index, workers=2, chunk_size=50)
+    assert get_shared_state() == {}
+    for tid in serial:
+        assert parallel[tid] == pytest.approx(serial[tid], rel=1e-9)
+
+
+@pytest.mark.skipif(not fork_available(), reason="fork start method not available")
+def test_worker_stage_timings_reach_the_parent(salmon_case):
+    salmon_index, reads = salmon_case
+    take_stage_timings()
+    take_operation_counts()
+    list(map_reads_parallel(reads, salmon_index, workers=2, chunk_size=50))
+    timings = take_stage_timings()
+    parallel_counts = take_operation_counts()
+    list(map_reads_parallel(reads, salmon_index, chunk_size=50))
+    assert timings["quasi_map"][2] == take_stage_timings()["quasi_map"][2] == len(reads)
+    assert parallel_counts == take_operation_counts()
+
+
+def test_classes_stay_few_for_many_reads(salmon_case):
+    salmon_index, reads = salmon_case
+    eq_counts = map_reads(reads, salmon_index)
+    assert equivalence_class_reads(eq_counts) > 250
+    assert len(eq_counts) <= 7                                              # non-empty subsets of 3 transcripts
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Streaming Alignment Writer (SAM / BAM)
+#       Buffered SAM output and a binary BAM encoder whose BGZF blocks are compressed on a worker
+#       thread, so downstream samtools steps can skip the SAM -> BAM conversion.
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+#   Reference:
+#       SAM/BAM format specification: https://samtools.github.io/hts-specs/SAMv1.pdf
+#
+# ====================================================================================================
+
+import queue
+import struct
+import threading
+import zlib
+
+SAM_WRITE_BUFFER = 1 << 22          # bytes buffered before a SAM write syscall
+BGZF_MAX_BLOCK_DATA = 65280         # uncompressed bytes per BGZF block (as in htslib)
+BGZF_QUEUE_SIZE = 64                # blocks waiting for the compression thread
+BGZF_EOF_BLOCK = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+CIGAR_OPS = "MIDNSHP=X"
+SEQ_CODES = {base: code for code, base in enumerate("=ACMGRSVTWYHKDBN")}
+
+# ========================================================================================
+# SAM Records
+# ========================================================================================
+
+def format_sam_record(aln, ref_name):
+    """
+    Format an alignment dict as a SAM line (same fields as write_sam_alignment).
+    """
+    unmapped = aln.get('unmapped', False)
+    return "\t".join([
+        aln.get('read_id', 'unknown'),
+        str(4 if unmapped else aln.get('flag', 0)),
+        "*" if unmapped else aln.get('ref_name', ref_name),
+        "0" if unmapped else str(aln.get('position', 0) + 1),
+        str(aln.get('mapq', 255)),
+        "*" if unmapped else aln.get('cigar', '*'),
+        "*",
+        "0",
+        "0",
+        aln.get('sequence', '*'),
+        aln.get('quality', '*')
+    ]) + "\n"
+
+
+def format_sam_header(references, program_id="test_aligner"):
+    """
+    Build the SAM header text with one @SQ line per reference.
+    """
+    lines = ["@HD\tVN:1.6\tSO:unsorted\n"]
+    for name, length in references:
+        lines.append("@SQ\tSN:" + name + "\tLN:" + str(length) + "\n")
+    lines.append("@PG\tID:" + program_id + "\tPN:" + program_id + "\tVN:1.0\n")
+    return "".join(lines)
+
+# ========================================================================================
+# BAM Records
+# ========================================================================================
+
+def reg2bin(beg, end):
+    """UCSC binning scheme bin for the 0-based, end-exclusive region [beg, end)."""
+    end -= 1
+    if beg >> 14 == end >> 14:
+        return ((1 << 15) - 1) // 7 + (beg >> 14)
+    if beg >> 17 == end >> 17:
+        return ((1 << 12) - 1) // 7 + (beg >> 17)
+    if beg >> 20 == end >> 20:
+        return ((1 << 9) - 1) // 7 + (beg >> 20)
+    if beg >> 23 == end >> 23:
+        return ((1 << 6) - 1) // 7 + (beg >> 23)
+    if beg >> 26 == end >> 26:
+        return ((1 << 3) - 1) // 7 + (beg >> 26)
+    return 0
+
+
+def parse_cigar(cigar):
+    """Split a CIGAR string into (length, op) pairs."""
+    ops = []
+    if cigar == '*' or not cigar:
+        return ops
+    length = 0
+    for c in cigar:                                                         # O(|cigar|)
+        if c.isdigit():
+            length = length * 10 + ord(c) - 48
+        else:
+            ops.append((length, c))
+            length = 0
+    return ops
+
+
+def encode_bam_record(aln, ref_id):
+    """
+    Encode an alignment dict as a binary BAM record (block_size prefix included).
+    """
+    unmapped = aln.get('unmapped', False)
+    name_fields = aln.get('read_id', 'unknown').split()
+    read_name = (name_fields[0] if name_fields else "*").encode('ascii')[:254] + b"\0"
+    sequence = aln.get('sequence', '*')
+    quality = aln.get('quality', '*')
+    if sequence == '*':
+        sequence = ""
+    
+    cigar_ops = [] if unmapped else parse_cigar(aln.get('cigar', '*'))
+    if unmapped:
+        ref_id, position, flag, end = -1, -1, 4, 0
+    else:
+        position = aln.get('position', 0)
+        flag = aln.get('flag', 0)
+        end = position
+        for length, op in cigar_ops:
+            if op in "MDN=X":                                               # reference-consuming operations
+                end += length
+        end = max(end, position + 1)
+    
+    cigar_bytes = struct.pack("<" + str(len(cigar_ops)) + "I",
+                              *[length << 4 | CIGAR_OPS.index(op) for length, op in cigar_ops])
+    
+    packed = bytearray((len(sequence) + 1) // 2)
+    for i, base in enumerate(sequence):                                     # O(r) two bases per byte
+        code = SEQ_CODES.get(base.upper(), 15)
+        packed[i >> 1] |= code << 4 if i % 2 == 0 else code
+    
+    if quality == '*' or len(quality) != len(sequence):
+        qual_bytes = b"\xff" * len(sequence)
+    else:
+        qual_bytes = bytes(ord(c) - 33 for c in quality)
+    
+    core = struct.pack("<iiBBHHHIiii", ref_id, position, len(read_name), max(0, min(255, aln.get('mapq', 255))),
+                       reg2bin(position, end), len(cigar_ops), flag, len(sequence), -1, -1, 0)
+    body = core + read_name + cigar_bytes + bytes(packed) + qual_bytes
+    return struct.pack("<i", len(body)) + body
+
+
+def encode_bam_header(header_text, references):
+    """Encode the BAM magic, header text and reference dictionary."""
+    text = header_text.encode('ascii')
+    parts = [b"BAM\1", struct.pack("<i", len(text)), text, struct.pack("<i", len(references))]
+    for name, length in references:
+        encoded = name.encode('ascii') + b"\0"
+        parts.append(struct.pack("<i", len(encoded)) + encoded + struct.pack("<i", length))
+    return b"".join(parts)
+
+# ========================================================================================
+# BGZF Output
+# ========================================================================================
+
+def compress_bgzf_block(data, compresslevel=6):
+    """Compress up to 64 KB of data into one BGZF block."""
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    deflated = compressor.compress(data) + compressor.flush()
+    header = b"\x1f\x8b\x08\x04\0\0\0\0\0\xff\x06\0BC\x02\0" + struct.pack("<H", len(deflated) + 25)
+    return header + deflated + struct.pack("<II", zlib.crc32(data) & 0xffffffff, len(data))
+
+
+class BgzfWriter:
+    """
+    BGZF file writer; blocks are compressed and written by a worker thread (zlib releases the GIL).
+    """
+    
+    def __init__(self, output_file, compresslevel=6):
+        self.file_handle = open(output_file, 'wb')
+        self.compresslevel = compresslevel
+        self.buffer = bytearray()
+        self.blocks = queue.Queue(maxsize=BGZF_QUEUE_SIZE)
+        self.error = None
+        self.worker = threading.Thread(target=self._compress_blocks, daemon=True)
+        self.worker.start()
+    
+    def _compress_blocks(self):
+        while True:
+            data = self.blocks.get()
+            if data is None:
+                break
+            if self.error is None:
+                try:
+                    self.file_handle.write(compress_bgzf_block(data, self.compresslevel))
+                except Exception as error:
+                    self.error = error
+    
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= BGZF_MAX_BLOCK_DATA:
+            self.blocks.put(bytes(self.buffer[:BGZF_MAX_BLOCK_DATA]))
+            del self.buffer[:BGZF_MAX_BLOCK_DATA]
+        if self.error is not None:
+            raise self.error
+    
+    def close(self):
+        if self.buffer:
+            self.blocks.put(bytes(self.buffer))
+            self.buffer = bytearray()
+        self.blocks.put(None)
+        self.worker.join()
+        try:
+            if self.error is not None:
+                raise self.error
+            self.file_handle.write(BGZF_EOF_BLOCK)
+        finally:
+            self.file_handle.close()
+
+# ========================================================================================
+# Alignment Writer
+# ========================================================================================
+
+class AlignmentWriter:
+    """
+    Streaming SAM/BAM writer: one open handle, large buffers, batches written as they finish.
+    
+    Args:
+        output_file:    Output path; a .bam extension selects BAM unless output_format is given
+        references:     List of (name, length) pairs, one @SQ line each
+        output_format:  "sam" or "bam" (default: from the extension)
+    """
+    
+    def __init__(self, output_file, references, output_format=None, buffer_size=SAM_WRITE_BUFFER, program_id="test_aligner"):
+        if isinstance(references, dict):
+            references = list(references.items())
+        if output_format is None:
+            output_format = "bam" if output_file.endswith('.bam') else "sam"
+        
+        self.output_file = output_file
+        self.references = references
+        self.ref_ids = {name: ref_id for ref_id, (name, _) in enumerate(references)}
+        self.default_ref = references[0][0] if references else "*"
+        self.output_format = output_format
+        self.buffer_size = buffer_size
+        self.pending = []
+        self.pending_size = 0
+        self.records_written = 0
+        
+        header_text = format_sam_header(references, program_id)
+        if output_format == "bam":
+            self.file_handle = BgzfWriter(output_file)
+            self.file_handle.write(encode_bam_header(header_text, references))
+        else:
+            self.file_handle = open(output_file, 'w', buffering=buffer_size)
+            self.file_handle.write(header_text)
+    
+    def write(self, aln, ref_name=None):
+        """Queue one alignment; the buffer is flushed when it exceeds buffer_size."""
+        if ref_name is None:
+            ref_name = aln.get('ref_name', self.default_ref)
+        if self.output_format == "bam":
+            record = encode_bam_record(aln, self.ref_ids.get(ref_name, -1))
+        else:
+            record = format_sam_record(aln, ref_name)
+        self.pending.append(record)
+        self.pending_size += len(record)
+        self.records_written += 1
+        if self.pending_size >= self.buffer_size:
+            self.flush()
+    
+    def write_batch(self, alignments, ref_name=None):
+        """Write a finished batch of alignments."""
+        for aln in alignments:
+            self.write(aln, ref_name)
+    
+    def flush(self):
+        if not self.pending:
+            return
+        if self.output_format == "bam":
+            self.file_handle.write(b"".join(self.pending))
+        else:
+            self.file_handle.write("".join(self.pending))
+        self.pending = []
+        self.pending_size = 0
+    
+    def close(self):
+        self.flush()
+        self.file_handle.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Indexed FASTA Access
+#       Builds samtools-compatible .fai indexes and fetches (name, start, end) slices by seek plus
+#       mmap, so only the sequences an index build or extension step needs are materialised.
+#
+#       .fai columns: NAME, LENGTH, OFFSET (of first base), LINEBASES, LINEWIDTH
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import logging
+import mmap
+import os
+
+logger = logging.getLogger(__name__)
+
+# ========================================================================================
+# Build the .fai Index
+# ========================================================================================
+
+def scan_fasta_index(fasta_path):
+    """
+    Scan a plain FASTA file once into an ordered dict of name -> (length, offset, linebases, linewidth).
+    As in samtools, every line of a sequence but the last must have the same length, and the last
+    may only be shorter. Blank lines may only follow the last line of a sequence.
+    """
+    if fasta_path.endswith('.gz'):
+        raise ValueError("Indexed access needs an uncompressed FASTA: " + fasta_path)
+    
+    entries = []
+    current = None
+    offset = 0
+    
+    with open(fasta_path, 'rb') as f:
+        for line in f:                                                      # O(N) single pass over the file
+            line_len = len(line)
+            if line.startswith(b'>'):
+                if current is not None:
+                    entries.append(current)
+                name = line[1:].split()[0].decode('utf-8') if line[1:].split() else ""
+                current = {'name': name, 'length': 0, 'offset': offset + line_len,
+                           'linebases': 0, 'linewidth': 0, 'last_short': False, 'blank': False}
+            elif current is not None:
+                bases = len(line.rstrip(b'\r\n'))
+                if bases == 0:
+                    current['blank'] = True
+                else:
+                    if current['blank']:
+                        raise ValueError("Blank line inside " + current['name'] + " of " + fasta_path)
+                    if current['last_short']:
+                        raise ValueError("Inconsistent line length in " + current['name'] + " of " + fasta_path)
+                    if current['linebases'] == 0:
+                        current['linebases'] = bases
+                        current['linewidth'] = line_len
+                    elif bases < current['linebases']:
+                        current['last_short'] = True                        # only the last line may be shorter
+                    elif bases > current['linebases']:
+                        raise ValueError("Inconsistent line length in " + current['name'] + " of " + fasta_path)
+                    elif line_len != current['linewidth']:
+                        raise ValueError("Inconsistent line width in " + current['name'] + " of " + fasta_path)
+                    current['length'] += bases
+            offset += line_len
+        if current is not None:
+            entries.append(current)
+    
+    return {entry['name']: (entry['length'], entry['offset'], entry['linebases'], entry['linewidth'])
+            for entry in entries}
+
+
+def write_fasta_index(index, fai_path):
+    """Write an index from scan_fasta_index as a .fai file."""
+    with open(fai_path, 'w') as f:
+        for name, fields in index.items():
+            f.write("\t".join([name] + [str(field) for field in fields]) + "\n")
+
+
+def build_fasta_index(fasta_path, fai_path=None):
+    """
+    Scan a plain FASTA file once and write its samtools-style .fai index.
+    """
+    if fai_path is None:
+        fai_path = fasta_path + ".fai"
+    write_fasta_index(scan_fasta_index(fasta_path), fai_path)
+    return fai_path
+
+
+def read_fasta_index(fai_path):
+    """
+    Read a .fai index into an ordered dict of name -> (length, offset, linebases, linewidth).
+    """
+    index = {}
+    with open(fai_path) as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 5:
+                continue
+            index[fields[0]] = (int(fields[1]), int(fields[2]), int(fields[3]), int(fields[4]))
+    return index
+
+# ========================================================================================
+# Lazy FASTA Accessor
+# ========================================================================================
+
+class IndexedFasta:
+    """
+    Lazy, read-only FASTA: dict-like access by name, slices via fetch(name, start, end).
+    Nothing is read from disk until a sequence is requested. A missing or stale .fai is rebuilt;
+    if it cannot be written (read-only reference directory) the index is kept in memory only.
+    """
+    
+    def __init__(self, fasta_path, fai_path=None):
+        if fai_path is None:
+            fai_path = fasta_path + ".fai"
+        if os.path.exists(fai_path) and os.path.getmtime(fai_path) >= os.path.getmtime(fasta_path):
+            self.index = read_fasta_index(fai_path)
+        else:
+            self.index = scan_fasta_index(fasta_path)                       # O(N) once
+            try:
+                write_fasta_index(self.index, fai_path)
+            except OSError as error:
+                logger.warning("Could not write %s (%s); keeping the FASTA index in memory", fai_path, error)
+        self.fasta_path = fasta_path
+        self.file_handle = open(fasta_path, 'rb')
+        self.mapped = None
+        if os.path.getsize(fasta_path) > 0:
+            self.mapped = mmap.mmap(self.file_handle.fileno(), 0, access=mmap.ACCESS_READ)
+    
+    def fetch(self, name, start=0, end=None):
+        """
+        Fetch the upper-cased 0-based, end-exclusive slice [start, end) of a sequence.
+        """
+        length, offset, linebases, linewidth = self.index[name]
+        if end is None or end > length:
+            end = length
+        start = max(0, start)
+        if start >= end or self.mapped is None:
+            return ""
+        
+        # Byte range covering the requested bases, newline bytes included
+        first_byte = offset + (start // linebases) * linewidth + start % linebases
+        last_byte = offset + ((end - 1) // linebases) * linewidth + (end - 1) % linebases + 1
+        raw = self.mapped[first_byte:last_byte]                             # O(end - start) bytes touched
+        return raw.replace(b'\n', b'').replace(b'\r', b'').decode('ascii').upper()
+    
+    def length(self, name):
+        """Sequence length from the index (no disk access)."""
+        return self.index[name][0]
+    
+    def __getitem__(self, name):
+        return self.fetch(name)
+    
+    def __contains__(self, name):
+        return name in self.index
+    
+    def __iter__(self):
+        return iter(self.index)
+    
+    def __len__(self):
+        return len(self.index)
+    
+    def keys(self):
+        return self.index.keys()
+    
+    def items(self):
+        for name in self.index:
+            yield name, self.fetch(name)
+    
+    def close(self):
+        if self.mapped is not None:
+            self.mapped.close()
+        self.file_handle.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+# ========================================================================================
+# Helpers for Callers that Accept Either Representation
+# ========================================================================================
+
+def open_fasta(fasta_path):
+    """
+    Open a FASTA lazily through its .fai index; gzipped files fall back to a full read.
+    """
+    if fasta_path.endswith('.gz'):
+        from Utility_Functions.fastq_utils import read_fasta
+        return read_fasta(fasta_path)
+    return IndexedFasta(fasta_path)
+
+
+def fetch_sequence(sequences, name, start=0, end=None):
+    """Fetch a slice from an IndexedFasta or a plain dict of sequences."""
+    if hasattr(sequences, 'fetch'):
+        return sequences.fetch(name, start, end)
+    return sequences[name][start:end]
+
+
+def sequence_length(sequences, name):
+    """Sequence length from an IndexedFasta (no disk access) or a plain dict."""
+    if hasattr(sequences, 'length'):
+        return sequences.length(name)
+    return len(sequences[name])
@@ -9,46 +9,139 @@
 # ====================================================================================================
 
 import gzip
+import os
+from Utility_Functions.gzip_utils import open_gzip_text
+from Utility_Functions.alignment_writer import AlignmentWriter
 
 # ========================================================================================
 # Read FASTQ Files
+#       Records are parsed from large text blocks (read + splitlines) in groups of four lines
+#       and handed out in fixed-size batches, so memory is bounded by the batch size rather
+#       than by the library size.
 # ========================================================================================
 
-def read_fastq(filepath, max_reads=None):
+FASTQ_BLOCK_SIZE = 1 << 20      # characters per bulk read
+FASTQ_BATCH_SIZE = 10000        # records per yielded batch
+FASTQ_GZIP_BACKEND = "threaded" # "threaded" (background decompression) or "gzip" (inline gzip.open)
+
+
+class FastqRecord:
+    """Compact FASTQ record (no per-instance __dict__)."""
+    
+    __slots__ = ("id", "sequence", "quality")
+    
+    def __init__(self, read_id, sequence, quality):
+        self.id = read_id
+        self.sequence = sequence
+        self.quality = quality
+    
+    def __repr__(self):
+        return "FastqRecord(" + repr(self.id) + ", " + repr(self.sequence) + ", " + repr(self.quality) + ")"
+
+
+def open_text_file(filepath, backend="gzip", decompress_threads=1):
+    """Open a plain or gzipped file in text mode."""
+    if filepath.endswith('.gz'):
+        if backend == "threaded":
+            return open_gzip_text(filepath, threads=decompress_threads)
+        return gzip.open(filepath, 'rt')
+    return open(filepath, 'r')
+
+
+def parse_fastq_lines(lines, first_record, filepath):
     """
-    Read sequences from a FASTQ file (supports .gz compression).
+    Build records from complete 4-line groups, validating the '@' and '+' lines.
     """
-    reads = []
-    is_gzipped = filepath.endswith('.gz')
-    
-    if is_gzipped:
-        file_handle = gzip.open(filepath, 'rt')
-    else:
-        file_handle = open(filepath, 'r')
+    records = []
+    record_number = first_record
+    for header, sequence, separator, quality in zip(lines[0::4], lines[1::4], lines[2::4], lines[3::4]):  # O(n) records
+        record_number += 1
+        if not header.startswith('@'):
+            raise ValueError(filepath + ": record " + str(record_number) + " header does not start with '@'")
+        if not separator.startswith('+'):
+            raise ValueError(filepath + ": record " + str(record_number) + " separator line does not start with '+'")
+        if len(sequence) != len(quality):
+            raise ValueError(filepath + ": record " + str(record_number) + " sequence and quality lengths differ")
+        records.append(FastqRecord(header[1:], sequence, quality))
+    return records
+
+
+def iter_fastq_batches(filepath, batch_size=FASTQ_BATCH_SIZE, max_reads=None, backend=FASTQ_GZIP_BACKEND, decompress_threads=1):
+    """
+    Stream a FASTQ file (supports .gz compression) as lists of at most batch_size records.
+    With the threaded backend, decompression runs ahead of parsing on a background thread.
+    """
+    file_handle = open_text_file(filepath, backend, decompress_threads)
     
     try:
-        line_num = 0
-        current_read = {}
+        pending_text = ""
+        pending_lines = []
+        records_read = 0
+        batch = []
         
-        for line in file_handle:
-            line = line.strip()
-            position = line_num % 4
+        while True:
+            block = file_handle.read(FASTQ_BLOCK_SIZE)
+            text = pending_text + block
+            lines = text.splitlines()                                       # bulk split, strips line endings
+            if block and lines and not text.endswith('\n'):
+                pending_text = lines.pop()                                  # incomplete last line
+            else:
+                pending_text = ""
+            
+            lines = pending_lines + lines
+            if not block:
+                while lines and not lines[-1]:                              # trailing blank lines at EOF
+                    lines.pop()
+            complete = len(lines) - len(lines) % 4
+            pending_lines = lines[complete:]
             
-            if position == 0:
-                current_read = {'id': line[1:]}
-            elif position == 1:
-                current_read['sequence'] = line
-            elif position == 2:
-                pass
-            elif position == 3:
-                current_read['quality'] = line
-                reads.append(current_read)
-                if max_reads is not None and len(reads) >= max_reads:
-                    break
-            line_num += 1
+            for record in parse_fastq_lines(lines[:complete], records_read, filepath):
+                batch.append(record)
+                records_read += 1
+                if max_reads is not None and records_read >= max_reads:
+                    yield batch
+                    return
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            
+            if not block:
+                break
+        
+        if pending_lines:
+            raise ValueError(filepath + ": truncated record after record " + str(records_read))
+        if batch:
+            yield batch
     finally:
         file_handle.close()
-    
+
+
+def iter_read_batches(filepath, batch_size=FASTQ_BATCH_SIZE, max_reads=None, decompress_threads=1):
+    """
+    Yield batches of FastqRecord from a FASTQ file or a packed read store directory (read_store.py).
+    """
+    if os.path.isdir(filepath):
+        from Utility_Functions.read_store import ReadStore, is_read_store
+        if not is_read_store(filepath):
+            raise ValueError("Not a FASTQ file or read store: " + filepath)
+        return ReadStore(filepath).iter_batches(batch_size, max_reads)
+    return iter_fastq_batches(filepath, batch_size, max_reads, decompress_threads=decompress_threads)
+
+
+def iter_fastq(filepath, max_reads=None, batch_size=FASTQ_BATCH_SIZE, decompress_threads=1):
+    """Stream FASTQ records one at a time (batched underneath); read stores are accepted too."""
+    for batch in iter_read_batches(filepath, batch_size, max_reads, decompress_threads):
+        for record in batch:
+            yield record
+
+
+def read_fastq(filepath, max_reads=None, decompress_threads=1):
+    """
+    Read sequences from a FASTQ file (supports .gz compression).
+    """
+    reads = []
+    for batch in iter_read_batches(filepath, max_reads=max_reads, decompress_threads=decompress_threads):
+        reads.extend(batch)
     return reads
 
 
@@ -64,11 +157,7 @@ def read_fasta(filepath):
     current_id = None
     current_seq = []
     
-    is_gzipped = filepath.endswith('.gz')
-    if is_gzipped:
-        file_handle = gzip.open(filepath, 'rt')
-    else:
-        file_handle = open(filepath, 'r')
+    file_handle = open_text_file(filepath)
     
     try:
         for line in file_handle:
@@ -126,23 +215,8 @@ def write_sam_alignment(output_file, read_id, flag, ref_name, position, mapq, ci
 
 
 def write_alignments_to_sam(output_file, alignments, ref_name, ref_length):
-    ""
-    "Write all alignments to SAM file."""
-    write_sam_header(output_file, ref_name, ref_length)
-    
-    for aln in alignments:
-        flag = 0
-        if aln.get('unmapped', False):
-            flag = 4
-        
-        write_sam_alignment(
-            output_file,
-            aln.get('read_id', 'unknown'),
-            flag,
-            ref_name if not aln.get('unmapped', False) else "*",
-            aln.get('position', 0),
-            aln.get('mapq', 255),
-            aln.get('cigar', '*'),
-            aln.get('sequence', '*'),
-            aln.get('quality', '*')
-        )
+    """
+    Write all alignments to a SAM (or .bam) file through one buffered writer.
+    """
+    with AlignmentWriter(output_file, [(ref_name, ref_length)]) as writer:
+        writer.write_batch(alignments, ref_name)
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Gzip Decompression Utilities for FASTQ Inputs
+#       Background-thread decompression into a bounded buffer queue, so FASTQ parsing overlaps with
+#       zlib. BGZF inputs (independent gzip members with known sizes) are decompressed in parallel.
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import gzip
+import io
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+GZIP_READ_SIZE = 1 << 18        # compressed bytes read per step
+GZIP_QUEUE_SIZE = 16            # decompressed chunks buffered ahead of the parser
+BGZF_BLOCKS_PER_TASK = 64       # BGZF blocks (<= 64 KB each) decompressed per worker task
+
+# ========================================================================================
+# BGZF Detection
+#       A BGZF block is a gzip member with FEXTRA set and a 'BC' subfield holding the
+#       block size, so member boundaries are known without decompressing.
+# ========================================================================================
+
+def read_bgzf_block(file_handle):
+    """
+    Read one raw BGZF block, or return None at end of file.
+    """
+    header = file_handle.read(18)
+    if len(header) == 0:
+        return None
+    if len(header) < 18 or header[0:4] != b"\x1f\x8b\x08\x04" or header[12:14] != b"BC":
+        raise ValueError("Not a BGZF block")
+    block_size = struct.unpack("<H", header[16:18])[0] + 1
+    body = file_handle.read(block_size - 18)
+    if len(body) != block_size - 18:
+        raise ValueError("Truncated BGZF block")
+    return header + body
+
+
+def is_bgzf(filepath):
+    """Check if a gzip file uses BGZF blocks."""
+    with open(filepath, "rb") as f:
+        header = f.read(18)
+    return len(header) == 18 and header[0:4] == b"\x1f\x8b\x08\x04" and header[12:14] == b"BC"
+
+
+def _decompress_members(blocks):
+    """Decompress a list of complete gzip members (runs on a worker thread; zlib releases the GIL)."""
+    return b"".join(zlib.decompress(block, 31) for block in blocks)
+
+# ========================================================================================
+# Threaded Gzip Reader
+# ========================================================================================
+
+class ThreadedGzipReader(io.RawIOBase):
+    """
+    Raw binary stream over a gzip file whose decompression runs on a background thread.
+    Decompressed chunks go through a bounded queue (backpressure on the producer).
+    """
+    
+    def __init__(self, filepath, threads=1, queue_size=GZIP_QUEUE_SIZE, read_size=GZIP_READ_SIZE):
+        super().__init__()
+        self.filepath = filepath
+        self.threads = threads
+        self.read_size = read_size
+        self.chunks = queue.Queue(maxsize=queue_size)
+        self.pending = b""
+        self.pending_offset = 0
+        self.finished = False
+        self.stop_event = threading.Event()
+        self.producer = threading.Thread(target=self._produce, daemon=True)
+        self.producer.start()
+    
+    def readable(self):
+        return True
+    
+    def _put(self, item):
+        """Put into the queue unless the reader was closed; returns False once closed."""
+        while not self.stop_event.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def _produce(self):
+        try:
+            if self.threads > 1 and is_bgzf(self.filepath):
+                self._produce_bgzf()
+            else:
+                self._produce_sequential()
+        except Exception as error:
+            self._put(error)
+        finally:
+            self._put(None)
+    
+    def _produce_sequential(self):
+        """
+        Stream-decompress all members of a (multi-member) gzip file. NUL padding between and after
+        members is skipped, as gzip.GzipFile does.
+        """
+        decompressor = zlib.decompressobj(31)
+        member_started = False
+        members_read = 0
+        with open(self.filepath, "rb") as f:
+            while True:
+                raw = f.read(self.read_size)
+                if not raw:
+                    break
+                while raw:                                          # O(B) compressed bytes
+                    if members_read and not member_started:
+                        raw = raw.lstrip(b"\x00")                   # padding may span reads
+                        if not raw:
+                            break
+                    member_started = True
+                    data = decompressor.decompress(raw)
+                    if data and not self._put(data):
+                        return
+                    if decompressor.eof:                            # next member starts in unused_data
+                        raw = decompressor.unused_data
+                        decompressor = zlib.decompressobj(31)
+                        member_started = False
+                        members_read += 1
+                    else:
+                        raw = b""
+        if member_started and not decompressor.eof:
+            raise EOFError("Compressed file ended before the end-of-stream marker: " + self.filepath)
+    
+    def _produce_bgzf(self):
+        """Decompress groups of BGZF blocks on a thread pool, emitting them in file order."""
+        pending = deque()
+        with open(self.filepath, "rb") as f, ThreadPoolExecutor(max_workers=self.threads) as executor:
+            while True:
+                blocks = []
+                while len(blocks) < BGZF_BLOCKS_PER_TASK:
+                    block = read_bgzf_block(f)
+                    if block is None:
+                        break
+                    blocks.append(block)
+                if blocks:
+                    pending.append(executor.submit(_decompress_members, blocks))
+                if pending and (not blocks or len(pending) >= 2 * self.threads):
+                    if not self._put(pending.popleft().result()):
+                        return
+                if not blocks and not pending:
+                    break
+    
+    def readinto(self, buffer):
+        while self.pending_offset >= len(self.pending) and not self.finished:
+            item = self.chunks.get()
+            if item is None:
+                self.finished = True
+            elif isinstance(item, Exception):
+                self.finished = True
+                raise item
+            else:
+                self.pending = item
+                self.pending_offset = 0
+        size = min(len(buffer), len(self.pending) - self.pending_offset)
+        buffer[:size] = memoryview(self.pending)[self.pending_offset:self.pending_offset + size]
+        self.pending_offset += size
+        return size
+    
+    def close(self):
+        self.stop_event.set()
+        super().close()
+
+
+def open_gzip_text(filepath, threads=1):
+    """
+    Open a gzip file as a text stream backed by ThreadedGzipReader.
+    """
+    raw = ThreadedGzipReader(filepath, threads=threads)
+    return io.TextIOWrapper(io.BufferedReader(raw, buffer_size=1 << 20), encoding="latin-1")
+
+# ========================================================================================
+# Throughput Benchmark
+# ========================================================================================
+
+def _legacy_read_fastq(filepath):
+    """The original gzip.open text-mode, strip()-per-line reader, kept as the benchmark baseline."""
+    reads = []
+    with gzip.open(filepath, "rt") as file_handle:
+        line_num = 0
+        current_read = {}
+        for line in file_handle:
+            line = line.strip()
+            position = line_num % 4
+            if position == 0:
+                current_read = {"id": line[1:]}
+            elif position == 1:
+                current_read["sequence"] = line
+            elif position == 3:
+                current_read["quality"] = line
+                reads.append(current_read)
+            line_num += 1
+    return len(reads)
+
+
+def benchmark_fastq_readers(filepath, repeats=3, threads=None):
+    """
+    Compare FASTQ reader backends on a gzipped file.
+    
+    Returns:
+        List of dicts with backend, median seconds, reads/sec and MB/sec (compressed input)
+    """
+    from Utility_Functions.fastq_utils import iter_fastq_batches
+    
+    if threads is None:
+        threads = max(1, os.cpu_count() or 1)
+    
+    def count_batches(backend, decompress_threads):
+        total = 0
+        for batch in iter_fastq_batches(filepath, backend=backend, decompress_threads=decompress_threads):
+            total += len(batch)
+        return total
+    
+    backends = [
+        ("legacy gzip.open + strip()", lambda: _legacy_read_fastq(filepath)),
+        ("gzip.open + block parser", lambda: count_batches("gzip", 1)),
+        ("threaded gzip (1 thread)", lambda: count_batches("threaded", 1)),
+        ("threaded gzip (" + str(threads) + " threads)", lambda: count_batches("threaded", threads)),
+    ]
+    
+    size_mb = os.path.getsize(filepath) / (1024 * 1024)
+    results = []
+    for name, run in backends:
+        timings = []
+        num_reads = 0
+        for _ in range(repeats):
+            start_time = time.perf_counter()
+            num_reads = run()
+            timings.append(time.perf_counter() - start_time)
+        timings.sort()
+        median = timings[len(timings) // 2]
+        results.append({
+            "backend": name,
+            "seconds": median,
+            "reads_per_sec": num_reads / median if median > 0 else 0.0,
+            "mb_per_sec": size_mb / median if median > 0 else 0.0
+        })
+        print(name + ":", round(median, 4), "s,", int(results[-1]["reads_per_sec"]), "reads/s,",
+              round(results[-1]["mb_per_sec"], 2), "MB/s")
+    return results
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if len(sys.argv) < 2:
+        print("Usage: gzip_utils.py <reads.fq.gz> [repeats]")
+        sys.exit(1)
+    benchmark_fastq_readers(sys.argv[1], repeats=int(sys.argv[2]) if len(sys.argv) > 2 else 3)
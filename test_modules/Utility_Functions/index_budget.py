@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Memory-Budgeted Index Planning
+#       Given a reference and a budget ("the best index that fits in X MB"), estimates the resident
+#       footprint of each index structure before anything is allocated and picks the densities:
+#           FM-index    suffix array sampling rate (SampledSuffixArray) and occurrence checkpoint
+#                       interval (OccurrenceColumn); the densest pair that fits, by predicted cost.
+#                       The k-mer jump-start table keeps its default k if anything fits with it,
+#                       else the largest smaller k (4^k intervals of 8 bytes)
+#           Salmon      posting compression (16-bit transcript ids / positions where they fit)
+#       The build must fit as well as the result. The FM suffix sort either sorts the suffixes themselves
+#       (~n^2 / 2 bytes at once) or, when that does not fit, uses prefix doubling (O(n) memory); the
+#       Salmon index is built in memory (dicts of postings) before it is serialized.
+#       If even the sparsest configuration does not fit, planning raises IndexBudgetError so the run fails
+#       before the index build starts.
+#
+#       Byte sizes are CPython 64-bit object sizes (list slot 8, int 28, array items 4); query costs
+#       are relative to one backward-search step on the full tables, measured on the kernels:
+#           checkpointed occ lookup     OCC_CHECKPOINT_COST + OCC_SCAN_COST * interval
+#           sampled SA lookup           SA_SAMPLED_COST + (rate - 1) / 2 LF steps of LF_STEP_COST
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import logging
+
+from Utility_Functions.shared_utils import build_fm_index, default_kmer_table_k, SA_RANK_BLOCK, SUFFIX_SORTS
+
+logger = logging.getLogger(__name__)
+
+SA_SAMPLE_RATES = [1, 2, 4, 8, 16, 32, 64]
+OCC_INTERVALS = [1, 16, 32, 64, 128, 256]
+FM_ALPHABET_SIZE = 5            # A, C, G, T, $ (N adds a sixth column when present)
+
+# CPython object sizes in bytes
+PY_LIST_SLOT = 8
+PY_INT = 32                      # 28-byte object in a 32-byte pymalloc block
+PY_STR_HEADER = 49
+PY_TUPLE_2 = 56
+PY_DICT_ENTRY = 100             # hash table slot plus key object, amortized over resizes
+ARRAY_ITEM = 4                  # array('I')
+
+# Relative query costs (1 = one backward-search step on the full occurrence table)
+OCC_CHECKPOINT_COST = 3.5
+OCC_SCAN_COST = 0.0065
+SA_LOOKUP_COST = 0.3
+SA_SAMPLED_COST = 3.8
+LF_STEP_COST = 0.35
+LOCATES_PER_STEP = 0.02         # SA positions located per backward-search step (seeded reads)
+
+# Salmon index
+SALMON_WINDOW = 10
+SALMON_HEADER_BYTES = 128
+
+_budget_mb = None
+
+
+class IndexBudgetError(ValueError):
+    """No configuration of an index fits the memory budget."""
+
+# ========================================================================================
+# Budget Setting
+# ========================================================================================
+
+def set_index_memory_budget(budget_mb):
+    """Budget in MB for every index built afterwards in this process; None removes it."""
+    global _budget_mb
+    _budget_mb = budget_mb
+
+
+def get_index_memory_budget():
+    """The budget set by set_index_memory_budget (None if unlimited)."""
+    return _budget_mb
+
+# ========================================================================================
+# FM-Index Footprint and Cost Model
+# ========================================================================================
+
+def estimate_fm_index_bytes(n, sa_sample_rate=1, occ_interval=1, alphabet_size=FM_ALPHABET_SIZE, kmer_table_k=0,
+                            suffix_sort="direct"):
+    """
+    Resident bytes of build_fm_index for n = len(reference) + 1 at the given densities and k-mer
+    table k, per structure, with the total and the build peak: the suffix sort plus the full suffix
+    array, or the full suffix array next to the finished tables, whichever is larger.
+    """
+    bwt = n + PY_STR_HEADER
+    if sa_sample_rate > 1:
+        suffix_array = n + ARRAY_ITEM * (n // sa_sample_rate + 1) + ARRAY_ITEM * (n // SA_RANK_BLOCK + 1)
+    else:
+        suffix_array = n * (PY_LIST_SLOT + PY_INT)
+    if occ_interval > 1:
+        occurrence = alphabet_size * ARRAY_ITEM * (n // occ_interval + 2)
+    else:
+        occurrence = alphabet_size * PY_LIST_SLOT * (n + 1) + n * PY_INT
+    kmer_table = 2 * ARRAY_ITEM * 4 ** kmer_table_k if kmer_table_k else 0
+    full_suffix_array = n * (PY_LIST_SLOT + PY_INT)
+    if suffix_sort == "doubling":
+        sort_peak = n * (3 * (PY_LIST_SLOT + PY_INT) + PY_LIST_SLOT)     # keys, old and new ranks, sort key slots
+    else:
+        sort_peak = n * n // 2 + n * (PY_STR_HEADER + PY_TUPLE_2 + 2 * PY_LIST_SLOT + PY_INT)
+    total = bwt + suffix_array + occurrence + kmer_table
+    return {
+        'bwt': bwt,
+        'suffix_array': suffix_array,
+        'occurrence': occurrence,
+        'kmer_table': kmer_table,
+        'total': total,
+        'build_peak': full_suffix_array + max(sort_peak, total - (suffix_array if sa_sample_rate <= 1 else 0))
+    }
+
+
+def occurrence_lookup_cost(occ_interval):
+    """Relative cost of one occ[c][i] lookup."""
+    if occ_interval <= 1:
+        return 1.0
+    return OCC_CHECKPOINT_COST + OCC_SCAN_COST * occ_interval
+
+
+def locate_cost(sa_sample_rate, occ_interval):
+    """Relative cost of one suffix_array[row] lookup."""
+    if sa_sample_rate <= 1:
+        return SA_LOOKUP_COST
+    return SA_SAMPLED_COST + (sa_sample_rate - 1) / 2 * LF_STEP_COST * occurrence_lookup_cost(occ_interval)
+
+
+def predicted_slowdown(sa_sample_rate, occ_interval, locates_per_step=LOCATES_PER_STEP):
+    """FM query time relative to the full tables (1.0), for the given mix of steps and locates."""
+    full = 1.0 + locates_per_step * SA_LOOKUP_COST
+    return (occurrence_lookup_cost(occ_interval) + locates_per_step * locate_cost(sa_sample_rate, occ_interval)) / full
+
+
+def plan_fm_index(n, budget_mb):
+    """
+    Densest FM-index configuration (lowest predicted slowdown) whose resident footprint and build peak
+    fit budget_mb, with the largest k-mer table k (up to the default) that leaves room for one.
+    Raises IndexBudgetError, before anything is allocated, if none does.
+    """
+    for kmer_table_k in range(default_kmer_table_k(n), -1, -1):
+        best = plan_fm_densities(n, budget_mb, kmer_table_k)
+        if best is not None:
+            return best
+    smallest = estimate_fm_index_bytes(n, SA_SAMPLE_RATES[-1], OCC_INTERVALS[-1], suffix_sort=SUFFIX_SORTS[-1])
+    raise IndexBudgetError("FM-index of %d bases needs at least %.3g MB resident and %.3g MB while building "
+                           "(SA 1/%d, occ every %d rows, %s suffix sort); budget is %.3g MB"
+                           % (n - 1, smallest['total'] / (1024 * 1024), smallest['build_peak'] / (1024 * 1024),
+                              SA_SAMPLE_RATES[-1], OCC_INTERVALS[-1], SUFFIX_SORTS[-1], budget_mb))
+
+
+def plan_fm_densities(n, budget_mb, kmer_table_k=0):
+    """
+    Lowest predicted slowdown over the SA and occ densities that fit with the given table, each with
+    the first suffix sort (direct, as without a budget, then doubling) whose build peak fits; None if none does.
+    """
+    budget_bytes = budget_mb * 1024 * 1024
+    best = None
+    for sa_sample_rate in SA_SAMPLE_RATES:
+        for occ_interval in OCC_INTERVALS:
+            for suffix_sort in SUFFIX_SORTS:
+                estimate = estimate_fm_index_bytes(n, sa_sample_rate, occ_interval, kmer_table_k=kmer_table_k,
+                                                   suffix_sort=suffix_sort)
+                if estimate['total'] <= budget_bytes and estimate['build_peak'] <= budget_bytes:
+                    break
+            else:
+                continue
+            plan = {
+                'sa_sample_rate': sa_sample_rate,
+                'occ_interval': occ_interval,
+                'kmer_table_k': kmer_table_k,
+                'suffix_sort': suffix_sort,
+                'estimate': estimate,
+                'search_cost': occurrence_lookup_cost(occ_interval),
+                'locate_cost': locate_cost(sa_sample_rate, occ_interval) / SA_LOOKUP_COST,
+                'slowdown': predicted_slowdown(sa_sample_rate, occ_interval),
+                'budget_mb': budget_mb
+            }
+            if best is None or (plan['slowdown'], estimate['total']) < (best['slowdown'], best['estimate']['total']):
+                best = plan
+    return best
+
+
+def describe_fm_plan(plan):
+    """One line: chosen densities, estimated footprint and predicted trade-off."""
+    estimate = plan['estimate']
+    return ("FM-index plan: SA 1/%d, occ every %d rows, %d-mer table -> %.2f MB of %.2f MB budget "
+            "(SA %.2f, occ %.2f, BWT %.2f, k-mer table %.2f MB); predicted %.2fx query time "
+            "(search step x%.1f, SA lookup x%.1f); %s suffix sort, build peak %.2f MB" % (
+                plan['sa_sample_rate'], plan['occ_interval'], plan['kmer_table_k'], estimate['total'] / (1024 * 1024),
+                plan['budget_mb'], estimate['suffix_array'] / (1024 * 1024), estimate['occurrence'] / (1024 * 1024),
+                estimate['bwt'] / (1024 * 1024), estimate['kmer_table'] / (1024 * 1024), plan['slowdown'],
+                plan['search_cost'], plan['locate_cost'], plan['suffix_sort'],
+                estimate['build_peak'] / (1024 * 1024)))
+
+
+def build_fm_index_within_budget(reference):
+    """build_fm_index with the densities planned for the current budget (full tables without one)."""
+    budget_mb = get_index_memory_budget()
+    if budget_mb is None:
+        return build_fm_index(reference)
+    plan = plan_fm_index(len(reference) + 1, budget_mb)
+    logger.info(describe_fm_plan(plan))
+    return build_fm_index(reference, plan['sa_sample_rate'], plan['occ_interval'], plan['kmer_table_k'], plan['suffix_sort'])
+
+# ========================================================================================
+# Salmon Index Footprint
+# ========================================================================================
+
+def estimate_salmon_index_bytes(transcripts, compact_postings=False, window=SALMON_WINDOW):
+    """
+    Bytes of the serialized (memory-mapped) Salmon index for {id: sequence}, with the in-memory
+    build peak. Minimizer density of random sequence is 2 / (w + 1); every posting is assumed distinct.
+    """
+    total_length = sum(len(sequence) for sequence in transcripts.values())
+    max_length = max((len(sequence) for sequence in transcripts.values()), default=0)
+    num_transcripts = len(transcripts)
+    postings = 2 * total_length // (window + 1)
+    minimizers = postings
+    transcript_width, position_width = posting_widths(num_transcripts, max_length, compact_postings)
+    names = sum(len(tid.encode("utf-8")) for tid in transcripts) + 7
+    mapped = (SALMON_HEADER_BYTES + 8 * (num_transcripts + 1) + names + 16 * num_transcripts
+              + minimizers * (8 + 1 + 8) + 8 + postings * (transcript_width + position_width) + 7 * 8)
+    build_peak = (minimizers * (PY_DICT_ENTRY + PY_INT + 56) + postings * (PY_TUPLE_2 + PY_LIST_SLOT + PY_INT)
+                  + total_length)
+    return {
+        'minimizers': minimizers,
+        'postings': postings,
+        'transcript_width': transcript_width,
+        'position_width': position_width,
+        'total': mapped,
+        'build_peak': build_peak
+    }
+
+
+def posting_widths(num_transcripts, max_length, compact_postings):
+    """Bytes per posting transcript index and position: 2 where compact and the values fit in 16 bits."""
+    transcript_width = 2 if compact_postings and num_transcripts <= 0xFFFF else 4
+    position_width = 2 if compact_postings and max_length <= 0xFFFF else 4
+    return transcript_width, position_width
+
+
+def plan_salmon_index(transcripts, budget_mb):
+    """
+    Full-width postings if they fit, else compact ones.
+    Compact postings are read through the same memoryview casts, so lookups cost the same.
+    Raises IndexBudgetError if neither fits, or if the in-memory build (the same for both) does not.
+    """
+    budget_bytes = budget_mb * 1024 * 1024
+    estimate = estimate_salmon_index_bytes(transcripts)
+    if estimate['build_peak'] > budget_bytes:
+        raise IndexBudgetError("Salmon index of %d transcripts needs about %.3g MB while building; budget is %.3g MB"
+                               % (len(transcripts), estimate['build_peak'] / (1024 * 1024), budget_mb))
+    for compact_postings in (False, True):
+        estimate = estimate_salmon_index_bytes(transcripts, compact_postings)
+        if estimate['total'] <= budget_bytes:
+            return {'compact_postings': compact_postings, 'estimate': estimate, 'budget_mb': budget_mb,
+                    'slowdown': 1.0}
+    raise IndexBudgetError("Salmon index of %d transcripts needs at least %.3g MB (compact postings); budget is %.3g MB"
+                           % (len(transcripts), estimate['total'] / (1024 * 1024), budget_mb))
+
+
+def describe_salmon_plan(plan):
+    """One line: posting widths, estimated footprint and the build peak."""
+    estimate = plan['estimate']
+    return ("Salmon index plan: %s postings (%d+%d bytes) -> %.2f MB of %.2f MB budget (~%d postings); "
+            "predicted %.2fx query time; in-memory build peak %.2f MB" % (
+                "compact" if plan['compact_postings'] else "full-width", estimate['transcript_width'],
+                estimate['position_width'], estimate['total'] / (1024 * 1024), plan['budget_mb'],
+                estimate['postings'], plan['slowdown'], estimate['build_peak'] / (1024 * 1024)))
+
+
+def salmon_posting_compression(transcripts):
+    """Whether the current budget needs compact postings (False without a budget)."""
+    budget_mb = get_index_memory_budget()
+    if budget_mb is None:
+        return False
+    plan = plan_salmon_index(transcripts, budget_mb)
+    logger.info(describe_salmon_plan(plan))
+    return plan['compact_postings']
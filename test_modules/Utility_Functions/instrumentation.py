@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Stage Timers and Profiler Hooks
+#       One runtime per run cannot show whether index build, backward search, Smith-Waterman or the
+#       EM is the bottleneck. Stages are marked with `with stage("seeding"):` or `@timed()`; each
+#       entry costs two perf_counter_ns calls and a dict update, and also opens the memory_stage of
+#       the same name (memory_profiler.py). Times are inclusive; self time excludes nested stages,
+#       so self times of one thread add up to at most the wall time (used for the stacked bars).
+#
+#       Operation counters (count_operations) record the work units of the kernels: backward-search
+#       steps, SA positions located, candidates verified, DP cells, minimizer lookups, postings and
+#       EM iterations. Kernels add once per call, never per inner-loop iteration.
+#
+#       The cProfile hook is opt-in (enable_profiling); its .prof files open in pstats or snakeviz.
+#       A sampling profiler such as py-spy needs no hook: attach it to the PID.
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import contextlib
+import functools
+import io
+import logging
+import os
+import threading
+import time
+
+from Utility_Functions.memory_profiler import memory_stage
+
+PROFILE_TOP_FUNCTIONS = 15      # functions logged per cProfile run
+
+logger = logging.getLogger(__name__)
+
+_stage_totals = {}              # name -> [inclusive_ns, self_ns, calls]
+_operation_counts = {}          # name -> work units
+_thread_state = threading.local()
+_profile_dir = None
+
+# ========================================================================================
+# Stage Timers
+# ========================================================================================
+
+class _TimedStage:
+    """One entry into a timed stage (per-thread stack for self time)."""
+    
+    __slots__ = ('name', 'start', 'child_ns', 'memory')
+    
+    def __init__(self, name):
+        self.name = name
+    
+    def __enter__(self):
+        self.memory = memory_stage(self.name)
+        self.memory.__enter__()
+        stack = getattr(_thread_state, 'stack', None)
+        if stack is None:
+            stack = _thread_state.stack = []
+        stack.append(self)
+        self.child_ns = 0
+        self.start = time.perf_counter_ns()
+        return self
+    
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter_ns() - self.start
+        stack = _thread_state.stack
+        stack.pop()
+        if stack:
+            stack[-1].child_ns += elapsed
+        entry = _stage_totals.get(self.name)
+        if entry is None:
+            entry = _stage_totals[self.name] = [0, 0, 0]
+        entry[0] += elapsed
+        entry[1] += elapsed - self.child_ns
+        entry[2] += 1
+        self.memory.__exit__(*exc_info)
+        return False
+
+
+def stage(name):
+    """Context manager timing a stage (and marking it for the memory profiler)."""
+    return _TimedStage(name)
+
+
+def timed(name=None):
+    """Decorator timing every call of a function as stage `name` (default: the function name)."""
+    def decorate(func):
+        stage_name = name or func.__name__
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _TimedStage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+# ========================================================================================
+# Collected Timings
+# ========================================================================================
+
+def take_stage_timings():
+    """Return the timings collected so far in this process and start over. O(S) stages."""
+    timings = {name: tuple(entry) for name, entry in _stage_totals.items()}
+    _stage_totals.clear()
+    return timings
+
+
+def merge_stage_timings(target, other):
+    """Add the timings of other (e.g. from a worker) into target, both from take_stage_timings."""
+    for name, (inclusive_ns, self_ns, calls) in other.items():
+        total = target.get(name, (0, 0, 0))
+        target[name] = (total[0] + inclusive_ns, total[1] + self_ns, total[2] + calls)
+    return target
+
+
+def add_stage_timings(timings):
+    """Add timings (e.g. returned by a worker) to this process's stage totals."""
+    for name, (inclusive_ns, self_ns, calls) in timings.items():
+        entry = _stage_totals.get(name)
+        if entry is None:
+            entry = _stage_totals[name] = [0, 0, 0]
+        entry[0] += inclusive_ns
+        entry[1] += self_ns
+        entry[2] += calls
+
+
+def stage_columns(timings):
+    """Flat CSV columns (add_measurement extra): stage_<name>_sec, _self_sec and _calls per stage."""
+    columns = {}
+    for name, (inclusive_ns, self_ns, calls) in timings.items():
+        columns['stage_' + name + '_sec'] = inclusive_ns / 1e9
+        columns['stage_' + name + '_self_sec'] = self_ns / 1e9
+        columns['stage_' + name + '_calls'] = calls
+    return columns
+
+
+def log_stage_timings(timings, level=logging.INFO):
+    """Log the stages, slowest self time first."""
+    for name, (inclusive_ns, self_ns, calls) in sorted(timings.items(), key=lambda item: item[1][1], reverse=True):
+        logger.log(level, "  stage %-16s %10.4f s self, %10.4f s total, %d calls",
+                   name, self_ns / 1e9, inclusive_ns / 1e9, calls)
+
+# ========================================================================================
+# Operation Counters
+# ========================================================================================
+
+def count_operations(name, amount=1):
+    """Add amount work units to counter name. O(1)."""
+    _operation_counts[name] = _operation_counts.get(name, 0) + amount
+
+
+def take_operation_counts():
+    """Return the operation counts collected so far in this process and start over."""
+    counts = dict(_operation_counts)
+    _operation_counts.clear()
+    return counts
+
+
+def add_operation_counts(counts):
+    """Add counts (e.g. returned by a worker) to this process's counters."""
+    for name, amount in counts.items():
+        count_operations(name, amount)
+
+
+def operation_columns(counts):
+    """Flat CSV columns (add_measurement extra): ops_<name> per counter."""
+    return {'ops_' + name: amount for name, amount in sorted(counts.items())}
+
+# ========================================================================================
+# cProfile Hook
+# ========================================================================================
+
+def enable_profiling(output_dir):
+    """Profile every profile_block with cProfile, writing <output_dir>/<name>.prof; None disables."""
+    global _profile_dir
+    _profile_dir = output_dir
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+
+@contextlib.contextmanager
+def profile_block(name):
+    """Run the block under cProfile if profiling is enabled (this process only, not forked workers)."""
+    if not _profile_dir:
+        yield None
+        return
+    
+    import cProfile
+    import pstats
+    
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profile_path = os.path.join(_profile_dir, name + ".prof")
+        profiler.dump_stats(profile_path)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+        logger.info("cProfile of %s written to %s\n%s", name, profile_path, summary.getvalue())
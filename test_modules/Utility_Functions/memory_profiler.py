@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Peak Memory Profiler
+#       Replaces before/after VmRSS deltas (which read ~0 MB once the allocator reuses freed memory)
+#       with the peak RSS of a block: VmHWM is reset through /proc/self/clear_refs on entry and a
+#       background thread polls VmRSS, attributing every sample to the innermost active stage.
+#       Optionally tracemalloc records the Python-level peak of every stage and the allocation
+#       sites that grew the most, from snapshots taken around the first call of each stage.
+#
+#       Stages are marked in the algorithms with `with memory_stage("seeding"):`, which costs a
+#       single check when no profiler is active. Every thread nests its own stages (the writer
+#       thread's "write" runs beside the aligner's stages); RSS is process-wide, so a sample is
+#       attributed to the innermost stage of every thread.
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import contextlib
+import os
+import threading
+import tracemalloc
+
+MEMORY_SAMPLE_INTERVAL = 0.005  # seconds between VmRSS samples
+MEMORY_TOP_SITES = 5            # allocation sites reported per profile
+MEMORY_TRACE_FRAMES = 1         # traceback depth stored by tracemalloc
+
+_trace_default = False
+_active_profiler = None
+_NULL_STAGE = contextlib.nullcontext()
+_SITE_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+
+# ========================================================================================
+# /proc Readers
+# ========================================================================================
+
+def read_status_mb(field):
+    """Read a kB field of /proc/self/status (VmRSS, VmHWM, ...) in MB; 0 if unavailable."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0
+
+
+def reset_peak_rss():
+    """Reset VmHWM to the current RSS (Linux >= 4.0); returns False if not permitted."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def enable_memory_tracing(enabled=True):
+    """Set whether profilers created without an explicit trace flag also run tracemalloc."""
+    global _trace_default
+    _trace_default = enabled
+
+# ========================================================================================
+# Stages
+# ========================================================================================
+
+def memory_stage(name):
+    """Context manager marking a stage of the active profiler; does nothing if none is active."""
+    if _active_profiler is None:
+        return _NULL_STAGE
+    return _Stage(_active_profiler, name)
+
+
+def sampling_paused():
+    """Context manager stopping the active profiler's polling thread for a block, e.g. a fork."""
+    if _active_profiler is None:
+        return _NULL_STAGE
+    return _active_profiler.sampling_paused()
+
+
+class _Stage:
+    """One entry into a stage; nested stages fold their traced peak into the enclosing ones."""
+    
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+    
+    def __enter__(self):
+        profiler = self.profiler
+        record = profiler.stages.get(self.name)
+        if record is None:
+            record = profiler.stages[self.name] = {'calls': 0, 'peak_rss_delta_mb': 0.0, 'traced_peak_mb': 0.0}
+            self.snapshot = profiler.trace                          # first call of a stage is snapshotted
+        else:
+            self.snapshot = False
+        record['calls'] += 1
+        if profiler.trace:
+            if self.snapshot:
+                self.start_snapshot = tracemalloc.take_snapshot().filter_traces(_SITE_FILTERS)
+            profiler._fold_traced_peak()
+            self.traced_start = tracemalloc.get_traced_memory()[0]
+            self.traced_peak = self.traced_start
+        profiler.thread_stack().append(self)
+        return self
+    
+    def __exit__(self, *exc_info):
+        profiler = self.profiler
+        if profiler.trace:
+            profiler._fold_traced_peak()
+            record = profiler.stages[self.name]
+            record['traced_peak_mb'] = max(record['traced_peak_mb'], (self.traced_peak - self.traced_start) / 1048576)
+            if self.snapshot:
+                snapshot = tracemalloc.take_snapshot().filter_traces(_SITE_FILTERS)
+                growth = snapshot.compare_to(self.start_snapshot, 'lineno')
+                profiler.sites.extend((self.name, stat) for stat in growth if stat.size_diff > 0)
+                tracemalloc.reset_peak()                            # the snapshots are not part of any stage
+        profiler.thread_stack().pop()
+        return False
+
+# ========================================================================================
+# Profiler
+# ========================================================================================
+
+class MemoryProfiler:
+    """
+    Context manager measuring the peak RSS of a block, per-stage RSS peaks and (with trace)
+    per-stage tracemalloc peaks plus the top allocation sites. Only one profiler is active at
+    a time; forked workers inherit the stage markers but their memory is reported separately.
+    """
+    
+    def __init__(self, trace=None, interval=MEMORY_SAMPLE_INTERVAL, top_sites=MEMORY_TOP_SITES):
+        self.trace = _trace_default if trace is None else trace
+        self.interval = interval
+        self.top_sites = top_sites
+        self.stages = {}
+        self.stacks = []                                            # open stages, one stack per thread
+        self._thread_state = threading.local()
+        self.sites = []
+        self.baseline_mb = 0.0
+        self.peak_mb = 0.0
+        self.hwm_reset = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._started_tracing = False
+    
+    def start(self):
+        """Activate the profiler (also usable as a context manager); returns self."""
+        global _active_profiler
+        if _active_profiler is not None:
+            raise RuntimeError("A MemoryProfiler is already active")
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACE_FRAMES)
+            self._started_tracing = True
+        self.baseline_mb = read_status_mb('VmRSS')
+        self.peak_mb = self.baseline_mb
+        self.hwm_reset = reset_peak_rss()
+        _active_profiler = self
+        self._start_sampling()
+        return self
+    
+    def stop(self):
+        """Stop sampling and take the final VmHWM reading."""
+        global _active_profiler
+        if _active_profiler is not self:
+            return
+        self._stop_sampling()
+        if self.hwm_reset:
+            self.peak_mb = max(self.peak_mb, read_status_mb('VmHWM'))    # catches peaks between samples
+        _active_profiler = None
+        if self._started_tracing:
+            tracemalloc.stop()
+    
+    def _start_sampling(self):
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample_loop, daemon=True)
+        self._thread.start()
+    
+    def _stop_sampling(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self._sample()
+    
+    @contextlib.contextmanager
+    def sampling_paused(self):
+        """
+        Stop the polling thread for a block, then restart it. A fork while the thread runs would
+        copy it mid-sample (possibly holding a lock) into the child; VmHWM still covers the pause.
+        """
+        running = self._thread is not None
+        if running:
+            self._stop_sampling()
+        try:
+            yield self
+        finally:
+            if running:
+                self._start_sampling()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
+        return False
+    
+    def thread_stack(self):
+        """Stack of the stages the calling thread has open."""
+        stack = getattr(self._thread_state, 'stack', None)
+        if stack is None:
+            stack = self._thread_state.stack = []
+            self.stacks.append(stack)
+        return stack
+    
+    def _sample(self):
+        """Record one VmRSS sample for the whole block and the innermost stage of every thread."""
+        rss = read_status_mb('VmRSS')
+        self.peak_mb = max(self.peak_mb, rss)
+        for stack in tuple(self.stacks):                            # O(threads)
+            try:
+                name = stack[-1].name
+            except IndexError:                                      # no stage (or it just exited)
+                continue
+            record = self.stages[name]
+            record['peak_rss_delta_mb'] = max(record['peak_rss_delta_mb'], rss - self.baseline_mb)
+    
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+    
+    def _fold_traced_peak(self):
+        """Credit the tracemalloc peak since the last reset to every open stage of every thread, then reset it."""
+        peak = tracemalloc.get_traced_memory()[1]
+        for stack in tuple(self.stacks):
+            for stage in tuple(stack):                              # O(d) nesting depth
+                stage.traced_peak = max(stage.traced_peak, peak)
+        tracemalloc.reset_peak()
+    
+    @property
+    def peak_delta_mb(self):
+        """Peak RSS above the RSS at entry."""
+        return max(0.0, self.peak_mb - self.baseline_mb)
+    
+    def top_allocation_sites(self):
+        """Largest growths by source line as (stage, 'file:line', size_mb, blocks), largest first."""
+        ranked = sorted(self.sites, key=lambda site: site[1].size_diff, reverse=True)[:self.top_sites]
+        result = []
+        for stage_name, stat in ranked:
+            frame = stat.traceback[0]
+            result.append((stage_name, os.path.basename(frame.filename) + ":" + str(frame.lineno),
+                           stat.size_diff / 1048576, stat.count_diff))
+        return result
+    
+    def summary(self):
+        """Flat dict of CSV columns (add_measurement extra): overall and per-stage peaks, top sites."""
+        columns = {
+            'peak_rss_mb': self.peak_mb,
+            'peak_rss_delta_mb': self.peak_delta_mb,
+            'peak_source': 'vmhwm' if self.hwm_reset else 'sampled'
+        }
+        for name, record in self.stages.items():
+            columns[name + '_peak_rss_delta_mb'] = record['peak_rss_delta_mb']
+            if self.trace:
+                columns[name + '_traced_peak_mb'] = record['traced_peak_mb']
+        if self.trace:
+            columns['top_alloc_sites'] = "; ".join(
+                stage_name + " " + site + " " + str(round(size_mb, 4)) + "MB/" + str(blocks)
+                for stage_name, site, size_mb, blocks in self.top_allocation_sites())
+        return columns
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Parallel Utilities for Alignment Algorithms
+#       Process pools whose workers inherit large read-only structures (FM-index, minimizer index)
+#       through fork copy-on-write, so each task only carries a small chunk of reads.
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import multiprocessing
+from collections import deque
+from Utility_Functions.memory_profiler import sampling_paused
+
+# ========================================================================================
+# Shared Read-Only State
+#       Set in the parent right before the pool forks; workers read it as a module global.
+#       Cleared by close_shared_pool.
+# ========================================================================================
+
+_SHARED_STATE = {}
+
+
+def get_shared_state():
+    """Get the state inherited from the parent process."""
+    return _SHARED_STATE
+
+
+def fork_available():
+    """Check if the fork start method is available on this platform."""
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def create_shared_pool(workers, shared_state):
+    """
+    Create a process pool whose workers inherit shared_state through fork.
+    """
+    _SHARED_STATE.clear()
+    _SHARED_STATE.update(shared_state)
+    with sampling_paused():                                         # no profiler thread is running at the fork
+        return multiprocessing.get_context("fork").Pool(workers)
+
+
+def close_shared_pool(pool, terminate=False):
+    """
+    Close and join a pool from create_shared_pool, then drop the shared state so the index
+    and reads of this run are not kept alive into the next measurement.
+    On an error path pass terminate=True: workers still busy with queued tasks are stopped
+    instead of waited for.
+    """
+    try:
+        if terminate:
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+    finally:
+        _SHARED_STATE.clear()
+
+# ========================================================================================
+# Chunked Dispatch
+# ========================================================================================
+
+def chunk_items(items, chunk_size):
+    """Group any iterable into lists of at most chunk_size items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def imap_bounded(pool, func, chunks, max_in_flight):
+    """
+    Apply func to every chunk on the pool, yielding results in input order.
+    At most max_in_flight chunks are queued, so a streaming input is never read ahead.
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(pool.apply_async(func, (chunk,)))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
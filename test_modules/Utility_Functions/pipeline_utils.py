@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Pipelined Reader -> Aligner -> Writer Executor
+#       Three stages joined by bounded queues: a reader thread (decompression + parsing), the
+#       aligner (calling thread or a forked process pool) and a writer thread (output). A full
+#       queue blocks the stage before it, so memory stays constant however large the input is.
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import queue
+import threading
+
+from Utility_Functions.parallel_utils import imap_bounded
+
+PIPELINE_QUEUE_SIZE = 4         # batches buffered between two stages
+_END_OF_STREAM = object()
+
+# ========================================================================================
+# Queue Helpers
+# ========================================================================================
+
+def _put(target_queue, item, stop_event):
+    """Put into the queue unless the pipeline was stopped; returns False once stopped."""
+    while not stop_event.is_set():
+        try:
+            target_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _iter_queue(source_queue, stop_event=None):
+    """Yield items from the queue until the end-of-stream marker (or until stop_event is set)."""
+    while True:
+        try:
+            item = source_queue.get(timeout=0.1)
+        except queue.Empty:
+            if stop_event is not None and stop_event.is_set():
+                return
+            continue
+        if item is _END_OF_STREAM:
+            return
+        yield item
+
+# ========================================================================================
+# Stage Threads
+# ========================================================================================
+
+def _read_stage(source, output_queue, stop_event, errors):
+    """Reader thread: pull batches from the source iterable (parsing happens here)."""
+    try:
+        for batch in source:
+            if not _put(output_queue, batch, stop_event):
+                return
+    except Exception as error:
+        errors.append(error)
+    finally:
+        _put(output_queue, _END_OF_STREAM, stop_event)
+
+
+def _write_stage(input_queue, consume, stop_event, errors):
+    """Writer thread: hand every result to consume; after an error keep draining so no stage blocks."""
+    for result in _iter_queue(input_queue):
+        if errors:
+            continue
+        try:
+            consume(result)
+        except Exception as error:
+            errors.append(error)
+            stop_event.set()
+
+# ========================================================================================
+# Pipeline
+# ========================================================================================
+
+def run_pipeline(source, process, consume, pool=None, max_in_flight=2, queue_size=PIPELINE_QUEUE_SIZE):
+    """
+    Run source -> process -> consume as a pipeline over bounded queues.
+    
+    Args:
+        source:         Iterable of batches, consumed on the reader thread
+        process:        Function batch -> result; must be module-level when a pool is used
+        consume:        Function result -> None, called on the writer thread in input order
+        pool:           Process pool (create_shared_pool) running process; None runs it here
+        max_in_flight:  Batches queued on the pool at once (default: 2)
+        queue_size:     Capacity of each inter-stage queue (default: PIPELINE_QUEUE_SIZE)
+    
+    Create the pool before calling, so workers are forked before the stage threads start.
+    """
+    read_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+    errors = []
+    
+    reader = threading.Thread(target=_read_stage, args=(source, read_queue, stop_event, errors), daemon=True)
+    writer = threading.Thread(target=_write_stage, args=(write_queue, consume, stop_event, errors), daemon=True)
+    reader.start()
+    writer.start()
+    
+    try:
+        if pool is not None:
+            results = imap_bounded(pool, process, _iter_queue(read_queue, stop_event), max_in_flight)
+        else:
+            results = (process(batch) for batch in _iter_queue(read_queue, stop_event))
+        for result in results:                                          # O(B) batches, at most queue_size waiting
+            if stop_event.is_set() or not _put(write_queue, result, stop_event):
+                break
+    except BaseException:
+        stop_event.set()
+        raise
+    finally:
+        write_queue.put(_END_OF_STREAM)                                 # the writer drains, so this cannot block forever
+        writer.join()
+        stop_event.set()
+        reader.join()
+    
+    if errors:
+        raise errors[0]
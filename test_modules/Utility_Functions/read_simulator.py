@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Synthetic RNA-seq Read Simulator
+#       Samples reads with a known origin so speed and accuracy can be benchmarked offline:
+#           - transcript abundances: uniform, log-normal, Zipf, or weights from a TSV
+#           - fragments: Gaussian insert size, single-end or paired-end reads of a fixed length
+#           - sequencing errors: substitution, insertion and deletion rates per base
+#           - strand: unstranded, forward (read 1 sense) or reverse (read 1 antisense, dUTP)
+#           - spliced reads: with a genome FASTA and a GTF, transcripts are assembled from their
+#             exons and each read's genomic position and N-containing CIGAR are recorded
+#
+#       Outputs <prefix>_1.fq[.gz] (and _2), <prefix>_truth.tsv (one row per read and mate) and
+#       <prefix>_abundance.tsv (true TPM and read counts per transcript).
+#
+#       Usage:
+#           python read_simulator.py --transcripts All_Smel_Genes.fasta --num-reads 10000 --output sim/sim
+#           python read_simulator.py --genome genome.fa --annotation genes.gtf --paired --output sim/spliced
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import bisect
+import gzip
+import math
+import os
+import random
+import sys
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Utility_Functions.fastq_utils import read_fasta, open_text_file, FastqRecord
+from Utility_Functions.shared_utils import reverse_complement
+
+SIM_SEED = 244
+SIM_READ_LENGTH = 100
+SIM_INSERT_MEAN = 250
+SIM_INSERT_SD = 30
+SIM_SUBSTITUTION_RATE = 0.002
+SIM_INSERTION_RATE = 0.0001
+SIM_DELETION_RATE = 0.0001
+SIM_ABUNDANCE_SIGMA = 1.5       # log-normal spread of transcript abundances
+SIM_ZIPF_EXPONENT = 1.0
+SIM_QUALITY = "I"               # Phred 40 for every base
+
+TRUTH_COLUMNS = ["read_id", "mate", "transcript", "ref_name", "position", "cigar", "strand", "fragment_start",
+                 "fragment_length", "substitutions", "insertions", "deletions"]
+
+# ========================================================================================
+# Sources: Transcripts and Exon Models
+# ========================================================================================
+
+def transcript_sources(transcripts):
+    """One source per transcript, each its own reference (a single block starting at 0)."""
+    return [{'name': tid, 'sequence': seq.upper(), 'strand': '+', 'blocks': [(tid, 0, len(seq))]}
+            for tid, seq in transcripts.items()]
+
+
+def read_gtf_exons(gtf_path):
+    """{transcript_id: (chromosome, strand, [(start, end)])} from the exon lines of a GTF, 0-based half-open."""
+    models = {}
+    with open_text_file(gtf_path) as f:
+        for line in f:
+            if line.startswith('#'):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 9 or fields[2] != 'exon':
+                continue
+            transcript_id = None
+            for attribute in fields[8].split(';'):
+                key, _, value = attribute.strip().partition(' ')
+                if key == 'transcript_id':
+                    transcript_id = value.strip('"')
+            if transcript_id is None:
+                continue
+            model = models.setdefault(transcript_id, (fields[0], fields[6], []))
+            model[2].append((int(fields[3]) - 1, int(fields[4])))
+    return models
+
+
+def spliced_sources(genome, models):
+    """One source per GTF transcript whose chromosome is in the genome; exons joined in genomic order."""
+    sources = []
+    for tid, (chromosome, strand, exons) in models.items():
+        if chromosome not in genome:
+            continue
+        exons = sorted(exons)
+        blocks = [(chromosome, start, end - start) for start, end in exons]
+        sequence = "".join(genome[chromosome][start:end] for start, end in exons).upper()
+        sources.append({'name': tid, 'sequence': sequence, 'strand': strand, 'blocks': blocks})
+    return sources
+
+
+def genomic_span(blocks, start, length):
+    """
+    Map [start, start + length) of a source (forward orientation) to its reference position and
+    a CIGAR with N for every intron crossed. O(E) exons.
+    """
+    ops = []
+    position = None
+    offset = 0
+    remaining = length
+    for ref_name, block_start, block_length in blocks:
+        if remaining <= 0:
+            break
+        if start >= offset + block_length:
+            offset += block_length
+            continue
+        local = max(0, start - offset)
+        take = min(block_length - local, remaining)
+        if position is None:
+            position = (ref_name, block_start + local)
+        else:
+            ops.append(str(block_start + local - previous_end) + "N")
+        ops.append(str(take) + "M")
+        previous_end = block_start + local + take
+        remaining -= take
+        offset += block_length
+    return position[0], position[1], "".join(ops)
+
+# ========================================================================================
+# Abundances
+# ========================================================================================
+
+def sample_abundances(sources, distribution, rng, sigma=SIM_ABUNDANCE_SIGMA, zipf_exponent=SIM_ZIPF_EXPONENT,
+                      weights_file=None):
+    """Relative abundance (molecules) per source name for the chosen distribution."""
+    names = [source['name'] for source in sources]
+    if distribution == "uniform":
+        return {name: 1.0 for name in names}
+    if distribution == "lognormal":
+        return {name: rng.lognormvariate(0.0, sigma) for name in names}
+    if distribution == "zipf":
+        ranks = list(range(1, len(names) + 1))
+        rng.shuffle(ranks)
+        return {name: 1.0 / rank ** zipf_exponent for name, rank in zip(names, ranks)}
+    if distribution == "file":
+        weights = {}
+        with open_text_file(weights_file) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2 and not line.startswith('#'):
+                    try:
+                        weights[fields[0]] = float(fields[1])
+                    except ValueError:
+                        continue                                    # header line
+        return {name: weights.get(name, 0.0) for name in names}
+    raise ValueError("Unknown abundance distribution: " + str(distribution))
+
+
+def true_tpm(sources, abundances, insert_mean, read_length):
+    """
+    TPM implied by the abundances: fragments are drawn proportional to abundance * effective length,
+    so TPM is the abundance normalized to 1e6 over transcripts that can yield a fragment.
+    """
+    weights = {}
+    for source in sources:
+        if effective_length(len(source['sequence']), insert_mean, read_length) > 0:
+            weights[source['name']] = abundances.get(source['name'], 0.0)
+    total = sum(weights.values())
+    return {name: (weight / total * 1e6 if total > 0 else 0.0) for name, weight in weights.items()}
+
+
+def effective_length(length, insert_mean, read_length):
+    """Fragment start positions of a transcript (fragments shorter than the read are not sampled)."""
+    return max(0, length - max(insert_mean, read_length) + 1)
+
+# ========================================================================================
+# Sequencing Errors
+# ========================================================================================
+
+def sequence_with_errors(template, read_length, rng, substitution_rate, insertion_rate, deletion_rate):
+    """
+    Read read_length bases off template, applying errors per base. Returns the read, the template
+    bases consumed (deletions consume extra, insertions fewer) and the substitution, insertion and
+    deletion counts. O(L).
+    """
+    bases = []
+    consumed = 0
+    substitutions = insertions = deletions = 0
+    while len(bases) < read_length and consumed < len(template):
+        draw = rng.random()
+        if draw < deletion_rate:
+            consumed += 1
+            deletions += 1
+            continue
+        if draw < deletion_rate + insertion_rate:
+            bases.append(rng.choice("ACGT"))
+            insertions += 1
+            continue
+        base = template[consumed]
+        consumed += 1
+        if rng.random() < substitution_rate:
+            base = rng.choice([other for other in "ACGT" if other != base])
+            substitutions += 1
+        bases.append(base)
+    return "".join(bases), consumed, substitutions, insertions, deletions
+
+# ========================================================================================
+# Simulation
+# ========================================================================================
+
+def simulate_reads(sources, num_reads, abundances, read_length=SIM_READ_LENGTH, paired=False, insert_mean=SIM_INSERT_MEAN,
+                   insert_sd=SIM_INSERT_SD, substitution_rate=SIM_SUBSTITUTION_RATE, insertion_rate=SIM_INSERTION_RATE,
+                   deletion_rate=SIM_DELETION_RATE, strandedness="unstranded", seed=SIM_SEED):
+    """
+    Simulate num_reads fragments from sources weighted by abundances (sample_abundances).
+    Yields (mate_records, truth_rows) per fragment, one record and one truth row per mate.
+    Fragment sampling is O(log T) per read (cumulative weights), sequencing O(L).
+    """
+    rng = random.Random(seed)
+    usable = []
+    cumulative = []
+    total = 0.0
+    for source in sources:
+        weight = abundances.get(source['name'], 0.0) * effective_length(len(source['sequence']), insert_mean, read_length)
+        if weight > 0:
+            total += weight
+            usable.append(source)
+            cumulative.append(total)
+    if not usable:
+        raise ValueError("No transcript is long enough for " + str(read_length) + " bp reads")
+    
+    # Slack so reads with deletions still reach read_length
+    slack = max(4, int(math.ceil(read_length * deletion_rate * 10)))
+    width = len(str(num_reads))
+    for read_number in range(num_reads):
+        source = usable[bisect.bisect_left(cumulative, rng.random() * total)]
+        sequence = source['sequence']
+        fragment_length = int(round(rng.gauss(insert_mean, insert_sd))) if insert_sd > 0 else insert_mean
+        fragment_length = min(len(sequence), max(read_length, fragment_length))
+        fragment_start = rng.randint(0, len(sequence) - fragment_length)
+        fragment_end = fragment_start + fragment_length
+        
+        # Read 1 is sense to the transcript for forward libraries, antisense for reverse (dUTP) ones
+        if strandedness == "forward":
+            sense = True
+        elif strandedness == "reverse":
+            sense = False
+        else:
+            sense = rng.random() < 0.5
+        read1_forward = sense == (source['strand'] == '+')
+        
+        read_id = "sim" + str(read_number + 1).zfill(width)
+        mates = [(1, read1_forward)]
+        if paired:
+            mates.append((2, not read1_forward))
+        records, truth = [], []
+        for mate, forward in mates:
+            if forward:                                             # leftmost bases, forward strand
+                template = sequence[fragment_start:min(fragment_end + slack, len(sequence))]
+            else:                                                   # rightmost bases, reverse strand
+                template = reverse_complement(sequence[max(0, fragment_start - slack):fragment_end])
+            read, consumed, substitutions, insertions, deletions = sequence_with_errors(
+                template, read_length, rng, substitution_rate, insertion_rate, deletion_rate)
+            span_start = fragment_start if forward else fragment_end - consumed
+            ref_name, position, cigar = genomic_span(source['blocks'], span_start, consumed)
+            records.append(FastqRecord(read_id, read, SIM_QUALITY * len(read)))
+            truth.append({
+                'read_id': read_id, 'mate': mate, 'transcript': source['name'], 'ref_name': ref_name,
+                'position': position, 'cigar': cigar, 'strand': '+' if forward else '-',
+                'fragment_start': fragment_start, 'fragment_length': fragment_length,
+                'substitutions': substitutions, 'insertions': insertions, 'deletions': deletions
+            })
+        yield records, truth
+
+# ========================================================================================
+# Output Files
+# ========================================================================================
+
+def open_output(path):
+    """Text output, gzip-compressed if the path ends in .gz."""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', compresslevel=1)
+    return open(path, 'w')
+
+
+def write_simulation(fragments, prefix, paired=False, compress=True):
+    """
+    Write the FASTQ file(s) and truth table of simulate_reads output. Returns the paths written.
+    """
+    extension = ".fq.gz" if compress else ".fq"
+    fastq_paths = [prefix + "_1" + extension] + ([prefix + "_2" + extension] if paired else [])
+    truth_path = prefix + "_truth.tsv"
+    directory = os.path.dirname(os.path.abspath(prefix))
+    os.makedirs(directory, exist_ok=True)
+    
+    handles = [open_output(path) for path in fastq_paths]
+    try:
+        with open(truth_path, 'w') as truth_file:
+            truth_file.write("\t".join(TRUTH_COLUMNS) + "\n")
+            for records, truth in fragments:
+                for handle, record in zip(handles, records):
+                    handle.write("@" + record.id + "\n" + record.sequence + "\n+\n" + record.quality + "\n")
+                for row in truth:
+                    truth_file.write("\t".join(str(row[column]) for column in TRUTH_COLUMNS) + "\n")
+    finally:
+        for handle in handles:
+            handle.close()
+    return fastq_paths, truth_path
+
+
+def write_abundance(tpm, read_counts, path):
+    """True TPM and simulated read count per transcript."""
+    with open(path, 'w') as f:
+        f.write("transcript_id\tTPM\tnum_reads\n")
+        for tid, value in sorted(tpm.items(), key=lambda item: item[1], reverse=True):
+            f.write(tid + "\t" + str(round(value, 4)) + "\t" + str(read_counts.get(tid, 0)) + "\n")
+
+
+def read_truth(path, mate=1):
+    """{read_id: truth row} for one mate of a truth table (positions as int)."""
+    truth = {}
+    with open(path) as f:
+        columns = f.readline().rstrip('\n').split('\t')
+        for line in f:
+            row = dict(zip(columns, line.rstrip('\n').split('\t')))
+            if int(row['mate']) == mate:
+                row['position'] = int(row['position'])
+                truth[row['read_id']] = row
+    return truth
+
+
+def read_abundance(path):
+    """{transcript_id: TPM} from write_abundance (or a quant.tsv)."""
+    tpm = {}
+    with open(path) as f:
+        f.readline()
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            tpm[fields[0]] = float(fields[1])
+    return tpm
+
+
+def run_simulation(sources, prefix, num_reads, paired=False, compress=True, abundance="lognormal",
+                   abundance_sigma=SIM_ABUNDANCE_SIGMA, weights_file=None, **options):
+    """
+    Simulate, write every output file and return (fastq_paths, truth_path, abundance_path).
+    options go to simulate_reads.
+    """
+    rng = random.Random(options.get('seed', SIM_SEED) + 1)             # abundances independent of the fragments
+    abundances = sample_abundances(sources, abundance, rng, abundance_sigma, weights_file=weights_file)
+    read_counts = {}
+    
+    def counted(fragments):
+        for records, truth in fragments:
+            read_counts[truth[0]['transcript']] = read_counts.get(truth[0]['transcript'], 0) + 1
+            yield records, truth
+    
+    fastq_paths, truth_path = write_simulation(counted(simulate_reads(sources, num_reads, abundances, paired=paired, **options)),
+                                               prefix, paired, compress)
+    abundance_path = prefix + "_abundance.tsv"
+    tpm = true_tpm(sources, abundances, options.get('insert_mean', SIM_INSERT_MEAN),
+                   options.get('read_length', SIM_READ_LENGTH))
+    write_abundance(tpm, read_counts, abundance_path)
+    return fastq_paths, truth_path, abundance_path
+
+# ========================================================================================
+# Command-Line Entry Point
+# ========================================================================================
+
+def main(argv=None):
+    """Command-line entry point; returns the exit status."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Simulate RNA-seq reads with a ground-truth table")
+    source_group = parser.add_mutually_exclusive_group(required=True)
+    source_group.add_argument("--transcripts", help="Transcript FASTA (reads are placed on the transcripts)")
+    source_group.add_argument("--genome", help="Genome FASTA (needs --annotation; reads are spliced)")
+    parser.add_argument("--annotation", help="GTF with exon lines (transcript_id attribute)")
+    parser.add_argument("--transcript-limit", type=int, default=None, help="Use only the first N transcripts")
+    parser.add_argument("--output", required=True, help="Output prefix")
+    parser.add_argument("--num-reads", type=int, default=10000, help="Fragments (default: %(default)s)")
+    parser.add_argument("--read-length", type=int, default=SIM_READ_LENGTH)
+    parser.add_argument("--paired", action="store_true")
+    parser.add_argument("--insert-mean", type=int, default=SIM_INSERT_MEAN)
+    parser.add_argument("--insert-sd", type=int, default=SIM_INSERT_SD)
+    parser.add_argument("--abundance", choices=["uniform", "lognormal", "zipf", "file"], default="lognormal")
+    parser.add_argument("--abundance-sigma", type=float, default=SIM_ABUNDANCE_SIGMA)
+    parser.add_argument("--weights", default=None, help="TSV of transcript_id and weight (--abundance file)")
+    parser.add_argument("--substitution-rate", type=float, default=SIM_SUBSTITUTION_RATE)
+    parser.add_argument("--insertion-rate", type=float, default=SIM_INSERTION_RATE)
+    parser.add_argument("--deletion-rate", type=float, default=SIM_DELETION_RATE)
+    parser.add_argument("--strandedness", choices=["unstranded", "forward", "reverse"], default="unstranded")
+    parser.add_argument("--seed", type=int, default=SIM_SEED)
+    parser.add_argument("--no-compress", action="store_true", help="Write plain .fq instead of .fq.gz")
+    args = parser.parse_args(argv)
+    
+    if args.genome and not args.annotation:
+        parser.error("--genome needs --annotation")
+    if args.abundance == "file" and not args.weights:
+        parser.error("--abundance file needs --weights")
+    if args.genome:
+        sources = spliced_sources(read_fasta(args.genome), read_gtf_exons(args.annotation))
+    else:
+        sources = transcript_sources(read_fasta(args.transcripts))
+    if args.transcript_limit is not None:
+        sources = sources[:args.transcript_limit]
+    print("Simulating", args.num_reads, "fragments from", len(sources), "transcripts")
+    
+    fastq_paths, truth_path, abundance_path = run_simulation(
+        sources, args.output, args.num_reads, paired=args.paired, compress=not args.no_compress,
+        read_length=args.read_length, insert_mean=args.insert_mean, insert_sd=args.insert_sd,
+        abundance=args.abundance, abundance_sigma=args.abundance_sigma, weights_file=args.weights,
+        substitution_rate=args.substitution_rate, insertion_rate=args.insertion_rate,
+        deletion_rate=args.deletion_rate, strandedness=args.strandedness, seed=args.seed)
+    for path in fastq_paths + [truth_path, abundance_path]:
+        print("  -", path)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Binary Packed Read Store
+#       Columnar on-disk read format for repeated benchmark runs: pays gzip decompression and text
+#       parsing once, then every run memory-maps the columns with numpy (zero-copy).
+#
+#       Layout of a <name>.readstore directory:
+#           meta.json       format, version, read and base counts
+#           bases.bin       2-bit packed bases, 4 per byte (A=0, C=1, G=2, T=3), low bits first
+#           nmask.bin       1 bit per base, set where the base is not A/C/G/T (decoded as N)
+#           quals.bin       quality bytes (Phred+33), one per base
+#           offsets.bin     uint64[n + 1] base offset of every read
+#           ids.bin         concatenated read IDs, ids_offsets.bin uint64[n + 1]
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import json
+import os
+import sys
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Utility_Functions.fastq_utils import FastqRecord, iter_fastq_batches
+
+READ_STORE_FORMAT = "cmsc244-readstore"
+READ_STORE_VERSION = 1
+READ_STORE_BATCH_SIZE = 100000
+
+
+def is_read_store(path):
+    """Check if path is a read store directory."""
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, "meta.json"))
+
+# ========================================================================================
+# Conversion: FASTQ -> Read Store
+# ========================================================================================
+
+def _base_code_table():
+    """Lookup table from ASCII byte to 2-bit code (non-ACGT -> 4, masked later)."""
+    import numpy as np
+    table = np.full(256, 4, dtype=np.uint8)
+    for code, base in enumerate(b"ACGT"):
+        table[base] = code
+        table[base + 32] = code                                     # lower case
+    return table
+
+
+def convert_fastq_to_read_store(fastq_path, store_path, batch_size=READ_STORE_BATCH_SIZE, max_reads=None):
+    """
+    Convert a FASTQ file (plain or .gz) into a read store directory.
+    Streams in batches; bases that do not fill a whole byte are carried to the next batch.
+    """
+    import numpy as np
+    
+    os.makedirs(store_path, exist_ok=True)
+    code_table = _base_code_table()
+    files = {}
+    for name in ("bases", "nmask", "quals", "offsets", "ids", "ids_offsets"):
+        files[name] = open(os.path.join(store_path, name + ".bin"), "wb")
+    
+    num_reads = 0
+    total_bases = 0
+    total_id_bytes = 0
+    carry_codes = np.zeros(0, dtype=np.uint8)
+    carry_mask = np.zeros(0, dtype=bool)
+    
+    try:
+        files["offsets"].write(np.zeros(1, dtype=np.uint64).tobytes())
+        files["ids_offsets"].write(np.zeros(1, dtype=np.uint64).tobytes())
+        
+        for batch in iter_fastq_batches(fastq_path, batch_size, max_reads):     # O(N) bases in total
+            sequences = "".join(record.sequence for record in batch).encode("ascii")
+            qualities = "".join(record.quality for record in batch).encode("ascii")
+            ids = [record.id.encode("utf-8") for record in batch]
+            
+            lengths = np.fromiter((len(record.sequence) for record in batch), dtype=np.uint64, count=len(batch))
+            id_lengths = np.fromiter((len(read_id) for read_id in ids), dtype=np.uint64, count=len(ids))
+            files["offsets"].write((total_bases + np.cumsum(lengths, dtype=np.uint64)).tobytes())
+            files["ids_offsets"].write((total_id_bytes + np.cumsum(id_lengths, dtype=np.uint64)).tobytes())
+            files["quals"].write(qualities)
+            files["ids"].write(b"".join(ids))
+            
+            codes = code_table[np.frombuffer(sequences, dtype=np.uint8)]
+            mask = codes == 4
+            codes[mask] = 0
+            codes = np.concatenate([carry_codes, codes])
+            mask = np.concatenate([carry_mask, mask])
+            
+            whole = len(codes) - len(codes) % 8                         # keep packing byte-aligned for both columns
+            files["bases"].write(_pack_bases(codes[:whole]).tobytes())
+            files["nmask"].write(np.packbits(mask[:whole], bitorder="little").tobytes())
+            carry_codes = codes[whole:]
+            carry_mask = mask[whole:]
+            
+            num_reads += len(batch)
+            total_bases += len(sequences)
+            total_id_bytes += sum(len(read_id) for read_id in ids)
+        
+        if len(carry_codes) > 0:
+            padded = np.concatenate([carry_codes, np.zeros(-len(carry_codes) % 4, dtype=np.uint8)])
+            files["bases"].write(_pack_bases(padded).tobytes())
+            files["nmask"].write(np.packbits(carry_mask, bitorder="little").tobytes())
+    finally:
+        for handle in files.values():
+            handle.close()
+    
+    meta = {
+        "format": READ_STORE_FORMAT,
+        "version": READ_STORE_VERSION,
+        "num_reads": num_reads,
+        "total_bases": total_bases,
+        "source": os.path.basename(fastq_path)
+    }
+    with open(os.path.join(store_path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def _pack_bases(codes):
+    """Pack 2-bit codes (length a multiple of 4) into bytes, first base in the low bits."""
+    quads = codes.reshape(-1, 4)
+    return quads[:, 0] | (quads[:, 1] << 2) | (quads[:, 2] << 4) | (quads[:, 3] << 6)
+
+# ========================================================================================
+# Loading: Memory-Mapped Read Store
+# ========================================================================================
+
+class ReadStore:
+    """
+    Read-only, memory-mapped read store. Columns are numpy.memmap views; reads are decoded on demand.
+    """
+    
+    def __init__(self, store_path):
+        import numpy as np
+        
+        with open(os.path.join(store_path, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != READ_STORE_FORMAT:
+            raise ValueError("Not a read store: " + store_path)
+        if self.meta.get("version") != READ_STORE_VERSION:
+            raise ValueError("Unsupported read store version " + str(self.meta.get("version")) + " in " + store_path)
+        
+        self.store_path = store_path
+        self.num_reads = self.meta["num_reads"]
+        self.bases = self._map("bases", np.uint8)
+        self.nmask = self._map("nmask", np.uint8)
+        self.quals = self._map("quals", np.uint8)
+        self.offsets = self._map("offsets", np.uint64)
+        self.ids = self._map("ids", np.uint8)
+        self.ids_offsets = self._map("ids_offsets", np.uint64)
+        self.letters = np.frombuffer(b"ACGT", dtype=np.uint8)
+        self.shifts = np.array([0, 2, 4, 6], dtype=np.uint8)
+    
+    def _map(self, name, dtype):
+        import numpy as np
+        path = os.path.join(self.store_path, name + ".bin")
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r")
+    
+    def __len__(self):
+        return self.num_reads
+    
+    def decode_bases(self, start, end):
+        """Decode the global base range [start, end) to an ASCII byte string."""
+        import numpy as np
+        if end <= start:
+            return b""
+        first_byte, last_byte = start // 4, (end + 3) // 4
+        codes = ((self.bases[first_byte:last_byte, None] >> self.shifts) & 3).reshape(-1)  # O(end - start)
+        offset = start - first_byte * 4
+        letters = self.letters[codes[offset:offset + end - start]]
+        
+        first_mask, last_mask = start // 8, (end + 7) // 8
+        mask = np.unpackbits(self.nmask[first_mask:last_mask], bitorder="little")
+        mask_offset = start - first_mask * 8
+        letters[mask[mask_offset:mask_offset + end - start].astype(bool)] = ord("N")
+        return letters.tobytes()
+    
+    def get_batch(self, first, last):
+        """Decode reads [first, last) into FastqRecord objects."""
+        base_start = int(self.offsets[first])
+        base_end = int(self.offsets[last])
+        sequences = self.decode_bases(base_start, base_end).decode("ascii")
+        qualities = self.quals[base_start:base_end].tobytes().decode("ascii")
+        id_start = int(self.ids_offsets[first])
+        id_blob = self.ids[id_start:int(self.ids_offsets[last])].tobytes().decode("utf-8")
+        
+        offsets = self.offsets[first:last + 1].tolist()
+        id_offsets = self.ids_offsets[first:last + 1].tolist()
+        records = []
+        for i in range(last - first):                               # O(b) reads in the batch
+            seq_from, seq_to = offsets[i] - base_start, offsets[i + 1] - base_start
+            records.append(FastqRecord(id_blob[id_offsets[i] - id_start:id_offsets[i + 1] - id_start],
+                                       sequences[seq_from:seq_to], qualities[seq_from:seq_to]))
+        return records
+    
+    def __getitem__(self, read_index):
+        if read_index < 0:
+            read_index += self.num_reads
+        if not 0 <= read_index < self.num_reads:
+            raise IndexError(read_index)
+        return self.get_batch(read_index, read_index + 1)[0]
+    
+    def iter_batches(self, batch_size=10000, max_reads=None):
+        """Yield lists of at most batch_size records, like iter_fastq_batches."""
+        limit = self.num_reads if max_reads is None else min(max_reads, self.num_reads)
+        for first in range(0, limit, batch_size):
+            yield self.get_batch(first, min(first + batch_size, limit))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: read_store.py <reads.fq[.gz]> <output.readstore> [max_reads]")
+        sys.exit(1)
+    print(convert_fastq_to_read_store(sys.argv[1], sys.argv[2], max_reads=int(sys.argv[3]) if len(sys.argv) > 3 else None))
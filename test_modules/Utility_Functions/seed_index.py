@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Seed Locators (FM-Index or K-mer Table)
+#       HISAT and Bowtie2 look up their seeds through one interface, locate(pattern) -> sorted
+#       reference positions of the exact matches, with two backends:
+#           fm      backward search on the FM-index (build_fm_index), O(m) steps + O(h) SA lookups
+#           hash    k-mer -> positions table, one O(1) lookup for the first k bases of the pattern;
+#                   longer patterns verify the candidates against the reference (str.startswith)
+#       The k-mer table has two layouts:
+#           dense   4^k + 1 offsets into the position array (counting sort by k-mer code), used for
+#                   k <= DENSE_MAX_K when the offsets are no more than DENSE_SLOTS_PER_BASE per base
+#                   (4^15 offsets alone would be 4 GB)
+#           hash    open addressing with linear probing on the 2-bit packed k-mer (k <= 31),
+#                   Fibonacci hashing, load factor <= HASH_LOAD_FACTOR
+#       K-mers containing characters other than A/C/G/T are not indexed. Both layouts keep the k-mers in
+#       code order, so a pattern shorter than k is a contiguous code range (its prefix range): O(log D)
+#       plus the hits, with the few starts too close to an N or the reference end for a whole k-mer
+#       (boundary starts) checked directly. A pattern with an N is looked up by its first whole A/C/G/T
+#       k-mer, else its longest A/C/G/T run, and verified; only a pattern with no A/C/G/T base at all
+#       falls back to a scan of the reference (str.find).
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import logging
+import math
+import re
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+from Utility_Functions.shared_utils import FM_backward_search, encode_kmer
+from Utility_Functions.instrumentation import stage, timed, count_operations
+from Utility_Functions.index_budget import (
+    build_fm_index_within_budget, get_index_memory_budget, IndexBudgetError, ARRAY_ITEM
+)
+
+logger = logging.getLogger(__name__)
+
+SEED_BACKENDS = ["fm", "hash"]
+SEED_KMER = 15                  # k of the hash backend (Bowtie2 test seeds are 15 bp)
+MAX_KMER = 31                   # 2-bit packed k-mer + 1 fits in 64 bits
+DENSE_MAX_K = 15
+DENSE_SLOTS_PER_BASE = 4        # dense layout only while 4^k <= 4 * reference length
+HASH_LOAD_FACTOR = 0.5
+HASH_KEY_BYTES = 8              # array('Q')
+
+_BASE_CODES = {"A": 0, "C": 1, "G": 2, "T": 3}
+_ACGT_RUN = re.compile("[ACGT]+")
+_FIBONACCI = 11400714819323198485   # 2^64 / golden ratio
+_MASK64 = (1 << 64) - 1
+
+_seed_backend = "fm"
+_seed_kmer = SEED_KMER
+
+# ========================================================================================
+# Backend Setting
+# ========================================================================================
+
+def set_seed_index(backend="fm", kmer_size=None):
+    """Seeding backend ("fm" or "hash") and hash k for every seed index built afterwards in this process."""
+    global _seed_backend, _seed_kmer
+    if backend not in SEED_BACKENDS:
+        raise ValueError("Unknown seed index backend: " + str(backend))
+    if kmer_size is not None and not 1 <= kmer_size <= MAX_KMER:
+        raise ValueError("Seed k-mer size must be between 1 and %d" % MAX_KMER)
+    _seed_backend = backend
+    _seed_kmer = kmer_size or SEED_KMER
+
+
+def get_seed_index():
+    """(backend, kmer_size) set by set_seed_index."""
+    return _seed_backend, _seed_kmer
+
+# ========================================================================================
+# K-mer Encoding
+# ========================================================================================
+
+def reference_kmer_codes(reference, k):
+    """Codes and start positions of every A/C/G/T-only k-mer, by rolling 2-bit encoding. O(n)."""
+    codes = array('Q')
+    starts = array('I')
+    mask = (1 << (2 * k)) - 1
+    code = 0
+    valid = 0
+    for position, base in enumerate(reference):
+        value = _BASE_CODES.get(base)
+        if value is None:                               # N and other symbols break the k-mer
+            valid = 0
+            continue
+        code = ((code << 2) | value) & mask
+        valid += 1
+        if valid >= k:
+            codes.append(code)
+            starts.append(position - k + 1)
+    return codes, starts
+
+
+def boundary_starts(reference, k):
+    """Starts of A/C/G/T bases with fewer than k A/C/G/T bases to the next N or the end (no k-mer starts there)."""
+    starts = array('I')
+    for run in _ACGT_RUN.finditer(reference):                  # O(n) in C, then O(k) per run
+        starts.extend(range(max(run.start(), run.end() - k + 1), run.end()))
+    return starts
+
+
+def choose_layout(n, k):
+    """dense if the 4^k offsets stay within DENSE_SLOTS_PER_BASE per reference base, else hash."""
+    if k <= DENSE_MAX_K and 4 ** k <= DENSE_SLOTS_PER_BASE * n:
+        return "dense"
+    return "hash"
+
+
+def hash_capacity(entries):
+    """Power-of-two slot count keeping the load factor at or below HASH_LOAD_FACTOR."""
+    return 1 << max(3, math.ceil(math.log2(max(1, entries) / HASH_LOAD_FACTOR)))
+
+
+def estimate_hash_seed_index_bytes(n, k, layout=None):
+    """
+    Resident bytes of a KmerSeedLocator over n bases; the hash layout assumes the expected number of
+    distinct k-mers of random sequence, 4^k (1 - e^(-n / 4^k)).
+    """
+    layout = layout or choose_layout(n, k)
+    positions = ARRAY_ITEM * n
+    if layout == "dense":
+        return positions + ARRAY_ITEM * (4 ** k + 1)
+    space = 4 ** k
+    distinct = int(space * -math.expm1(-n / space)) if n < space * 50 else space
+    return (positions + ARRAY_ITEM * (distinct + 1) + HASH_KEY_BYTES * distinct
+            + hash_capacity(distinct) * (HASH_KEY_BYTES + ARRAY_ITEM))
+
+# ========================================================================================
+# Seed Locators
+# ========================================================================================
+
+class FMSeedLocator:
+    """Seed lookups by backward search on an FM-index dict from build_fm_index."""
+    
+    name = "fm"
+    
+    def __init__(self, fm_index):
+        self.suffix_array = fm_index["suffix_array"]
+        self.count_table = fm_index["count_table"]
+        self.occurrence = fm_index["occurrence"]
+        self.kmer_table = fm_index.get("kmer_table")
+    
+    @timed("backward_search")
+    def locate(self, pattern):
+        """All positions of pattern in the reference, sorted."""
+        suffix_array = self.suffix_array
+        top, bottom = FM_backward_search(pattern, self.count_table, self.occurrence, len(suffix_array),
+                                         self.kmer_table)           # O(m - k)
+        if top >= bottom or top < 0:
+            return []
+        count_operations("sa_positions_located", bottom - top)
+        positions = []
+        for index in range(top, bottom):                # O(k) suffix array entries
+            positions.append(suffix_array[index])
+        return sorted(positions)                        # O(k log k)
+
+
+class KmerSeedLocator:
+    """
+    Seed lookups in a k-mer -> positions table over the reference (dense or open addressing).
+    Positions of one k-mer are stored contiguously and ascending, so hits come out sorted; the
+    k-mers themselves are in code order, which answers patterns shorter than k by prefix range.
+    """
+    
+    name = "hash"
+    
+    def __init__(self, reference, k=SEED_KMER, layout=None):
+        if not 1 <= k <= MAX_KMER:
+            raise ValueError("Seed k-mer size must be between 1 and %d" % MAX_KMER)
+        self.reference = reference
+        self.k = k
+        self.layout = layout or choose_layout(len(reference), k)
+        with stage("index_build"):
+            codes, starts = reference_kmer_codes(reference, k)     # O(n)
+            if self.layout == "dense":
+                self._build_dense(codes, starts)
+            else:
+                self._build_hash(codes, starts)
+            self.boundary_starts = boundary_starts(reference, k)
+    
+    def _build_dense(self, codes, starts):
+        """Counting sort by code: offsets[code]..offsets[code + 1] index the positions. O(n + 4^k)."""
+        counts = array('I', bytes(ARRAY_ITEM * (4 ** self.k + 1)))
+        for code in codes:
+            counts[code + 1] += 1
+        self.offsets = array('I', accumulate(counts))
+        cursor = array('I', self.offsets)
+        self.positions = array('I', bytes(ARRAY_ITEM * len(starts)))
+        for code, start in zip(codes, starts):          # ascending starts within each code
+            self.positions[cursor[code]] = start
+            cursor[code] += 1
+    
+    def _build_hash(self, codes, starts):
+        """Group positions by code (stable sort), then insert one slot per distinct code. O(n log n)."""
+        order = sorted(range(len(codes)), key=codes.__getitem__)
+        self.positions = array('I', (starts[index] for index in order))
+        self.group_starts = array('I')
+        self.group_codes = array('Q')                   # ascending: prefix ranges by bisection
+        previous = None
+        for rank, index in enumerate(order):
+            if codes[index] != previous:
+                previous = codes[index]
+                self.group_codes.append(previous)
+                self.group_starts.append(rank)
+        self.group_starts.append(len(order))
+        capacity = hash_capacity(len(self.group_codes))
+        self.shift = 64 - capacity.bit_length() + 1
+        self.slot_mask = capacity - 1
+        self.keys = array('Q', bytes(HASH_KEY_BYTES * capacity))   # code + 1; 0 marks an empty slot
+        self.groups = array('I', bytes(ARRAY_ITEM * capacity))
+        for group, code in enumerate(self.group_codes):
+            slot = self._slot(code)
+            while self.keys[slot]:
+                slot = (slot + 1) & self.slot_mask
+            self.keys[slot] = code + 1
+            self.groups[slot] = group
+    
+    def _slot(self, code):
+        """Home slot of a code (Fibonacci hashing: the top bits of code * 2^64 / phi)."""
+        return ((code * _FIBONACCI) & _MASK64) >> self.shift
+    
+    def kmer_positions(self, code):
+        """Positions of one k-mer code, ascending; O(1) (expected probes < 2 at load factor 0.5)."""
+        if self.layout == "dense":
+            return self.positions[self.offsets[code]:self.offsets[code + 1]]
+        keys, key = self.keys, code + 1
+        slot = self._slot(code)
+        probes = 1
+        while keys[slot] != key:
+            if not keys[slot]:
+                count_operations("seed_hash_probes", probes)
+                return ()
+            slot = (slot + 1) & self.slot_mask
+            probes += 1
+        count_operations("seed_hash_probes", probes)
+        group = self.groups[slot]
+        return self.positions[self.group_starts[group]:self.group_starts[group + 1]]
+    
+    def prefix_positions(self, prefix):
+        """
+        Positions of an A/C/G/T string shorter than k, ascending: the k-mers of its code range plus the
+        matching boundary starts. O(log D + h log h).
+        """
+        shift = 2 * (self.k - len(prefix))
+        code = encode_kmer(prefix)
+        low, high = code << shift, (code + 1) << shift
+        if self.layout == "dense":
+            hits = self.positions[self.offsets[low]:self.offsets[high]]
+        else:
+            first, last = bisect_left(self.group_codes, low), bisect_left(self.group_codes, high)
+            hits = self.positions[self.group_starts[first]:self.group_starts[last]]
+        count_operations("seed_prefix_ranges", 1)
+        reference = self.reference
+        tail = [position for position in self.boundary_starts if reference.startswith(prefix, position)]
+        return sorted(hits.tolist() + tail)                     # O(h log h): ascending per k-mer only
+    
+    def anchor_hits(self, pattern):
+        """
+        (offset, length, ascending positions) of the piece of a pattern the table looks up: its first
+        whole A/C/G/T k-mer, else its longest A/C/G/T run by prefix range; None without any A/C/G/T base.
+        """
+        k = self.k
+        longest = None
+        for run in _ACGT_RUN.finditer(pattern):
+            if run.end() - run.start() >= k:
+                return run.start(), k, self.kmer_positions(encode_kmer(pattern[run.start():run.start() + k]))
+            if longest is None or run.end() - run.start() > longest.end() - longest.start():
+                longest = run
+        if longest is None:
+            return None
+        return longest.start(), longest.end() - longest.start(), self.prefix_positions(longest.group())
+    
+    @timed("seed_lookup")
+    def locate(self, pattern):
+        """All positions of pattern in the reference, sorted."""
+        k = self.k
+        code = encode_kmer(pattern[:k]) if len(pattern) >= k else None
+        if code is not None:
+            offset, length, hits = 0, k, self.kmer_positions(code)
+        else:                                           # shorter than k, or N in the first k bases
+            anchor = self.anchor_hits(pattern)
+            if anchor is None:
+                return self.scan(pattern)
+            offset, length, hits = anchor
+        if length == len(pattern):
+            positions = list(hits)
+        else:
+            count_operations("seed_candidates_verified", len(hits))
+            reference = self.reference
+            positions = [position - offset for position in hits
+                         if position >= offset and reference.startswith(pattern, position - offset)]
+        count_operations("sa_positions_located", len(positions))
+        return positions
+    
+    def scan(self, pattern):
+        """Exact matches of a pattern without any A/C/G/T base, by scanning the reference. O(n)."""
+        count_operations("seed_scan_fallbacks", 1)
+        positions = []
+        position = self.reference.find(pattern)
+        while position >= 0:
+            positions.append(position)
+            position = self.reference.find(pattern, position + 1)
+        return positions
+    
+    def index_bytes(self):
+        """Bytes held by the table arrays (the reference string is shared, not counted)."""
+        arrays = [self.positions, self.boundary_starts]
+        if self.layout == "dense":
+            arrays.append(self.offsets)
+        else:
+            arrays.extend([self.group_starts, self.group_codes, self.keys, self.groups])
+        return sum(len(values) * values.itemsize for values in arrays)
+
+# ========================================================================================
+# Shared Seed Index
+# ========================================================================================
+
+def build_seed_index(reference):
+    """
+    Shared index for HISAT / Bowtie2 with the backend of set_seed_index: the FM-index dict
+    (budgeted) or {"seed_locator": KmerSeedLocator}. Either carries its "seed_locator".
+    """
+    backend, kmer_size = get_seed_index()
+    if backend == "fm":
+        fm_index = build_fm_index_within_budget(reference)
+        fm_index["seed_locator"] = FMSeedLocator(fm_index)
+        return fm_index
+    
+    budget_mb = get_index_memory_budget()
+    layout = choose_layout(len(reference), kmer_size)
+    estimate = estimate_hash_seed_index_bytes(len(reference), kmer_size, layout)
+    if budget_mb is not None and estimate > budget_mb * 1024 * 1024:
+        raise IndexBudgetError("%s k-mer seed index (k=%d) of %d bases needs about %.3g MB; budget is %.3g MB"
+                               % (layout, kmer_size, len(reference), estimate / (1024 * 1024), budget_mb))
+    logger.info("Seed index: %s k-mer table, k=%d, ~%.2f MB", layout, kmer_size, estimate / (1024 * 1024))
+    return {"seed_locator": KmerSeedLocator(reference, kmer_size, layout)}
+
+
+def seed_locator_for(seed_index):
+    """The seed locator of a shared index; a plain build_fm_index dict gets an FMSeedLocator."""
+    locator = seed_index.get("seed_locator")
+    if locator is None:
+        locator = FMSeedLocator(seed_index)
+    return locator
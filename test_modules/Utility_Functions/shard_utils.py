@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Read Sharding and Merging
+#       Splits one library into deterministic shards (record ranges or a hash of the read ID),
+#       described by a JSON manifest, so each shard can be aligned/quantified as an independent
+#       job against the same index file. The merge step recombines the SAM/BAM parts (concatenated
+#       in shard order or merge-sorted by coordinate) and sums the Salmon equivalence classes.
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import gzip
+import heapq
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from itertools import zip_longest
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Utility_Functions.fastq_utils import iter_fastq
+from Utility_Functions.alignment_writer import AlignmentWriter, CIGAR_OPS
+
+SHARD_MANIFEST_VERSION = 1
+SHARD_COMPRESSLEVEL = 1         # shards are intermediate files: favour speed over size
+SEQ_DECODE = "=ACMGRSVTWYHKDBN"
+
+# ========================================================================================
+# Shard Planning
+# ========================================================================================
+
+def read_base_name(read_id):
+    """Read name without the comment and /1, /2 mate suffix, so mates hash to the same shard."""
+    name = read_id.split()[0] if read_id else ""
+    if name.endswith("/1") or name.endswith("/2"):
+        name = name[:-2]
+    return name
+
+
+def hash_shard(read_id, num_shards):
+    """Deterministic shard of a read (crc32, unlike hash(), is stable across runs)."""
+    return zlib.crc32(read_base_name(read_id).encode("utf-8")) % num_shards
+
+
+def count_fastq_records(fastq_path):
+    """Count records in one streaming pass."""
+    total = 0
+    for _ in iter_fastq(fastq_path):                                        # O(N)
+        total += 1
+    return total
+
+
+def _iter_read_tuples(fastq_paths):
+    """Yield one tuple of records per read: (R1,) or (R1, R2), checking that mates agree."""
+    streams = [iter_fastq(path) for path in fastq_paths]
+    for records in zip_longest(*streams):
+        if None in records:
+            raise ValueError("Mate files have different numbers of records: " + ", ".join(fastq_paths))
+        if len(records) > 1 and read_base_name(records[0].id) != read_base_name(records[1].id):
+            raise ValueError("Mates out of sync: " + records[0].id + " / " + records[1].id)
+        yield records
+
+
+def _write_record(file_handle, record):
+    file_handle.write("@" + record.id + "\n" + record.sequence + "\n+\n" + record.quality + "\n")
+
+
+def plan_shards(fastq_paths, output_dir, num_shards, method="range"):
+    """
+    Split FASTQ file(s) into num_shards gzipped shards and write manifest.json.
+    
+    Args:
+        fastq_paths:    [R1] or [R1, R2]; mates always land in the same shard
+        output_dir:     Directory for the shard files and the manifest
+        num_shards:     Number of shards
+        method:         "range" (contiguous record ranges, keeps input order) or "hash" (crc32 of read ID)
+    
+    Returns:
+        The manifest dict
+    """
+    if method not in ("range", "hash"):
+        raise ValueError("Unknown shard method: " + method)
+    if num_shards < 1:
+        raise ValueError("num_shards must be at least 1")
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    
+    total_reads = None
+    if method == "range":
+        total_reads = count_fastq_records(fastq_paths[0])                   # extra O(N) pass to size the ranges
+        boundaries = [total_reads * shard // num_shards for shard in range(num_shards + 1)]
+    
+    shards = []
+    handles = []
+    for shard in range(num_shards):
+        files = []
+        for mate in range(len(fastq_paths)):
+            files.append("shard_" + str(shard).zfill(3) + "_R" + str(mate + 1) + ".fq.gz")
+        shards.append({"shard": shard, "files": files, "num_reads": 0})
+        handles.append([gzip.open(os.path.join(output_dir, name), "wt", compresslevel=SHARD_COMPRESSLEVEL)
+                        for name in files])
+    
+    try:
+        shard = 0
+        for read_number, records in enumerate(_iter_read_tuples(fastq_paths)):   # O(N) single pass over the reads
+            if method == "range":
+                while read_number >= boundaries[shard + 1]:
+                    shard += 1
+            else:
+                shard = hash_shard(records[0].id, num_shards)
+            for handle, record in zip(handles[shard], records):
+                _write_record(handle, record)
+            shards[shard]["num_reads"] += 1
+    finally:
+        for shard_handles in handles:
+            for handle in shard_handles:
+                handle.close()
+    
+    if method == "range":
+        for shard in shards:
+            shard["first_read"] = boundaries[shard["shard"]]
+    
+    manifest = {
+        "version": SHARD_MANIFEST_VERSION,
+        "method": method,
+        "num_shards": num_shards,
+        "inputs": [os.path.abspath(path) for path in fastq_paths],
+        "total_reads": sum(shard["num_reads"] for shard in shards),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "shards": shards
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(manifest_path):
+    """Load a shard manifest, resolving shard files relative to its directory."""
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("version") != SHARD_MANIFEST_VERSION:
+        raise ValueError("Unsupported shard manifest version in " + manifest_path)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    for shard in manifest["shards"]:
+        shard["paths"] = [os.path.join(base_dir, name) for name in shard["files"]]
+    return manifest
+
+# ========================================================================================
+# Reading SAM / BAM Parts
+#       Records come back as the alignment dicts AlignmentWriter accepts.
+# ========================================================================================
+
+def _unmapped_without_position(aln):
+    """Unmapped records carry no position, as produced by run_alignment_test."""
+    if aln['unmapped']:
+        del aln['position']
+    return aln
+
+
+def _iter_sam_records(file_handle):
+    for line in file_handle:
+        fields = line.rstrip("\n").split("\t")
+        flag = int(fields[1])
+        yield _unmapped_without_position({
+            'read_id': fields[0],
+            'flag': flag,
+            'ref_name': fields[2],
+            'position': int(fields[3]) - 1,
+            'mapq': int(fields[4]),
+            'cigar': fields[5],
+            'sequence': fields[9],
+            'quality': fields[10],
+            'unmapped': bool(flag & 4)
+        })
+
+
+def _read_exact(file_handle, size):
+    data = file_handle.read(size)
+    if len(data) != size:
+        raise ValueError("Truncated BAM file")
+    return data
+
+
+def _iter_bam_records(file_handle, ref_names):
+    while True:
+        size_bytes = file_handle.read(4)
+        if not size_bytes:
+            return
+        body = _read_exact(file_handle, struct.unpack("<i", size_bytes)[0])
+        ref_id, position, name_len, mapq, _, num_ops, flag, seq_len = struct.unpack("<iiBBHHHI", body[:20])
+        offset = 32
+        read_name = body[offset:offset + name_len - 1].decode("ascii")
+        offset += name_len
+        ops = struct.unpack("<" + str(num_ops) + "I", body[offset:offset + 4 * num_ops])
+        offset += 4 * num_ops
+        packed = body[offset:offset + (seq_len + 1) // 2]
+        offset += (seq_len + 1) // 2
+        quality = body[offset:offset + seq_len]
+        
+        sequence = "".join(SEQ_DECODE[packed[i >> 1] >> 4 if i % 2 == 0 else packed[i >> 1] & 15]
+                           for i in range(seq_len))                         # O(r)
+        yield _unmapped_without_position({
+            'read_id': read_name,
+            'flag': flag,
+            'ref_name': ref_names[ref_id] if 0 <= ref_id < len(ref_names) else "*",
+            'position': position,
+            'mapq': mapq,
+            'cigar': "".join(str(op >> 4) + CIGAR_OPS[op & 15] for op in ops) or "*",
+            'sequence': sequence or "*",
+            'quality': "*" if seq_len == 0 or quality[0] == 255 else "".join(chr(q + 33) for q in quality),
+            'unmapped': bool(flag & 4)
+        })
+
+
+def open_alignment_part(part_path):
+    """
+    Open a SAM or BAM part; returns (references, record iterator, file handle to close).
+    """
+    with open(part_path, "rb") as f:
+        is_bam = f.read(2) == b"\x1f\x8b"
+    
+    if is_bam:
+        file_handle = gzip.open(part_path, "rb")                            # BGZF is multi-member gzip
+        if _read_exact(file_handle, 4) != b"BAM\1":
+            raise ValueError("Not a BAM file: " + part_path)
+        text_len = struct.unpack("<i", _read_exact(file_handle, 4))[0]
+        _read_exact(file_handle, text_len)
+        references = []
+        for _ in range(struct.unpack("<i", _read_exact(file_handle, 4))[0]):
+            name_len = struct.unpack("<i", _read_exact(file_handle, 4))[0]
+            name = _read_exact(file_handle, name_len)[:-1].decode("ascii")
+            references.append((name, struct.unpack("<i", _read_exact(file_handle, 4))[0]))
+        return references, _iter_bam_records(file_handle, [name for name, _ in references]), file_handle
+    
+    file_handle = open(part_path)
+    references = []
+    position = file_handle.tell()
+    line = file_handle.readline()
+    while line.startswith("@"):                                             # header lines
+        if line.startswith("@SQ"):
+            tags = dict(field.split(":", 1) for field in line.rstrip("\n").split("\t")[1:] if ":" in field)
+            references.append((tags["SN"], int(tags["LN"])))
+        position = file_handle.tell()
+        line = file_handle.readline()
+    file_handle.seek(position)
+    return references, _iter_sam_records(file_handle), file_handle
+
+# ========================================================================================
+# Merging Alignment Parts
+# ========================================================================================
+
+def _coordinate_key(ref_order):
+    def key(aln):
+        if aln['unmapped'] or aln['ref_name'] not in ref_order:
+            return (len(ref_order), 0, aln['read_id'])                      # unmapped reads sort last
+        return (ref_order[aln['ref_name']], aln['position'], aln['read_id'])
+    return key
+
+
+def merge_alignment_parts(part_paths, output_path, output_format=None, sort=False):
+    """
+    Merge per-shard SAM/BAM parts into one file.
+    
+    Args:
+        part_paths:     Parts in shard order
+        output_path:    Merged SAM/BAM file (format from the extension unless output_format is given)
+        sort:           False concatenates in shard order; True merge-sorts by coordinate
+                        (each part is sorted into a temporary run, then the runs are k-way merged)
+    
+    Returns:
+        Number of records written
+    """
+    references = None
+    parts = []
+    runs = []
+    temp_dir = tempfile.mkdtemp(prefix="merge_runs_", dir=os.path.dirname(os.path.abspath(output_path)))
+    
+    try:
+        for part_path in part_paths:
+            part_refs, records, file_handle = open_alignment_part(part_path)
+            if references is None:
+                references = part_refs
+            elif part_refs != references:
+                file_handle.close()
+                raise ValueError("Reference dictionary of " + part_path + " differs from the first part")
+            parts.append((records, file_handle))
+        if references is None:
+            references = []
+        key = _coordinate_key({name: ref_id for ref_id, (name, _) in enumerate(references)})
+        
+        with AlignmentWriter(output_path, references, output_format, program_id="shard_merge") as writer:
+            if not sort:
+                for records, _ in parts:                                    # O(N) records, streamed
+                    for aln in records:
+                        writer.write(aln)
+            else:
+                for run_index, (records, file_handle) in enumerate(parts):  # O(P log P) per part of P records
+                    run_path = os.path.join(temp_dir, "run_" + str(run_index) + ".sam")
+                    with AlignmentWriter(run_path, references, "sam") as run_writer:
+                        run_writer.write_batch(sorted(records, key=key))
+                    file_handle.close()
+                    runs.append(open_alignment_part(run_path))
+                for aln in heapq.merge(*[records for _, records, _ in runs], key=key):  # O(N log S)
+                    writer.write(aln)
+            records_written = writer.records_written
+    finally:
+        for _, file_handle in parts:
+            file_handle.close()
+        for _, _, file_handle in runs:
+            file_handle.close()
+        for name in os.listdir(temp_dir):
+            os.remove(os.path.join(temp_dir, name))
+        os.rmdir(temp_dir)
+    
+    if sort:
+        print("Merge-sorted", records_written, "records from", len(part_paths), "parts")
+    else:
+        print("Concatenated", records_written, "records from", len(part_paths), "parts")
+    return records_written
+
+# ========================================================================================
+# Command Line
+#       plan:              shard_utils.py plan --reads R1 [R2] --shards N [--method hash] --output-dir DIR
+#       merge-alignments:  shard_utils.py merge-alignments --output out.bam [--sort] part1.sam part2.sam ...
+#       merge-quant:       shard_utils.py merge-quant --index salmon_index.bin --output quant.tsv s0.eq s1.eq ...
+# ========================================================================================
+
+def main(argv=None):
+    """Command-line entry point; returns the exit status."""
+    import argparse
+    from Aln_Algorithm_Functions.salmon_saf_alignment import run_salmon_merge_quant
+    
+    parser = argparse.ArgumentParser(description="Shard reads across jobs and merge the results")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    plan_parser = subparsers.add_parser("plan", help="Split FASTQ file(s) into shards with a manifest")
+    plan_parser.add_argument("--reads", nargs="+", required=True, help="R1 [R2]")
+    plan_parser.add_argument("--shards", type=int, required=True)
+    plan_parser.add_argument("--method", choices=["range", "hash"], default="range")
+    plan_parser.add_argument("--output-dir", required=True)
+    
+    merge_parser = subparsers.add_parser("merge-alignments", help="Merge SAM/BAM parts")
+    merge_parser.add_argument("--output", required=True)
+    merge_parser.add_argument("--format", choices=["sam", "bam"], default=None)
+    merge_parser.add_argument("--sort", action="store_true", help="Merge-sort by coordinate instead of concatenating")
+    merge_parser.add_argument("--manifest", default=None, help="Check the merged record count against this manifest")
+    merge_parser.add_argument("parts", nargs="+")
+    
+    quant_parser = subparsers.add_parser("merge-quant", help="Sum shard equivalence classes and run one EM")
+    quant_parser.add_argument("--index", required=True)
+    quant_parser.add_argument("--output", required=True)
+    quant_parser.add_argument("parts", nargs="+")
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == "plan":
+        if len(args.reads) > 2:
+            parser.error("--reads takes R1 and optionally R2")
+        manifest = plan_shards(args.reads, args.output_dir, args.shards, args.method)
+        for shard in manifest["shards"]:
+            print("Shard", shard["shard"], ":", shard["num_reads"], "reads ->", ", ".join(shard["files"]))
+        print("Manifest:", os.path.join(args.output_dir, "manifest.json"))
+    elif args.command == "merge-alignments":
+        records_written = merge_alignment_parts(args.parts, args.output, args.format, args.sort)
+        if args.manifest is not None:
+            expected = read_manifest(args.manifest)["total_reads"]
+            if records_written != expected:
+                print("ERROR: merged", records_written, "records but the manifest lists", expected, "reads")
+                return 1
+    else:
+        tpm = run_salmon_merge_quant(args.parts, args.index)
+        with open(args.output, "w") as f:
+            f.write("transcript_id\tTPM\n")
+            for tid, val in sorted(tpm.items(), key=lambda x: x[1], reverse=True):
+                f.write(tid + "\t" + str(round(val, 4)) + "\n")
+        print("Quantification written to", args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,6 +8,19 @@
 #
 # ====================================================================================================
 
+from array import array
+
+from Utility_Functions.instrumentation import stage, count_operations
+
+SA_RANK_BLOCK = 64              # rows per rank checkpoint of the sampled suffix array marks
+KMER_TABLE_K = 10               # default k of the FM backward search jump-start table (two u32 per k-mer: 8 MB)
+KMER_TABLE_MAX_K = 12           # largest k build_fm_index accepts (128 MB table)
+KMER_TABLE_SLOTS_PER_BASE = 128 # a short reference gets a smaller k: 4^k <= 128 * reference length
+SUFFIX_SORTS = ["direct", "doubling"]   # suffix array construction of build_fm_index
+
+_NOT_ACGT = bytes(c for c in range(256) if c not in b"ACGT")
+_TO_DIGITS = bytes.maketrans(b"ACGT" + _NOT_ACGT, b"0123" + b"x" * len(_NOT_ACGT))  # base-4 digits; "x" is invalid
+
 # ========================================================================================
 # DNA Sequence Utilities
 # ========================================================================================
@@ -37,6 +50,28 @@ def build_suffix_array(text):
     return suffix_array
 
 
+def build_suffix_array_doubling(text):
+    """
+    Build suffix array by prefix doubling: sort by the ranks of the first 2k characters, doubling k.
+    O(n log^2 n) time but O(n) memory, where build_suffix_array holds all suffixes (~n^2 / 2 bytes).
+    """
+    n = len(text)
+    rank = [ord(c) for c in text]
+    suffix_array = list(range(n))
+    k = 1
+    while n > 1:
+        span = max(rank) + 2
+        keys = [rank[i] * span + (rank[i + k] + 1 if i + k < n else 0) for i in range(n)]
+        suffix_array.sort(key=keys.__getitem__)                      # O(n log n) per round
+        rank = [0] * n
+        for row in range(1, n):
+            rank[suffix_array[row]] = rank[suffix_array[row - 1]] + (keys[suffix_array[row]] != keys[suffix_array[row - 1]])
+        if rank[suffix_array[-1]] == n - 1:                         # all ranks distinct: sorted
+            break
+        k *= 2
+    return suffix_array
+
+
 def build_BWT(text, suffix_array):
     """Construct BWT from suffix array."""
     n = len(text)
@@ -90,25 +125,198 @@ def build_occurrence_table(bwt):
     return occ
 
 
-def FM_backward_search(pattern, c_table, occ, bwt_len):
-    """Perform backward search on FM-index."""
+class OccurrenceColumn:
+    """
+    occ[c] of one character with counts kept only every `interval` rows; occ[c][i] adds the
+    characters counted by str.count since the last checkpoint. O(n / interval) space, O(interval) per lookup.
+    """
+    
+    __slots__ = ('bwt', 'char', 'checkpoints', 'interval')
+    
+    def __init__(self, bwt, char, checkpoints, interval):
+        self.bwt = bwt
+        self.char = char
+        self.checkpoints = checkpoints
+        self.interval = interval
+    
+    def __getitem__(self, row):
+        block = row // self.interval
+        return self.checkpoints[block] + self.bwt.count(self.char, block * self.interval, row)
+    
+    def __len__(self):
+        return len(self.bwt) + 1
+
+
+def build_checkpointed_occurrence(bwt, interval):
+    """Occurrence table with one checkpoint per interval rows, {c: OccurrenceColumn}, without the full table."""
+    alphabet = sorted(set(bwt))
+    occ = {}
+    for c in alphabet:                                  # O(sigma * n), each count in C
+        checkpoints = array('I', [0])
+        total = 0
+        for start in range(0, len(bwt), interval):
+            total += bwt.count(c, start, start + interval)
+            checkpoints.append(total)
+        occ[c] = OccurrenceColumn(bwt, c, checkpoints, interval)
+    return occ
+
+
+class SampledSuffixArray:
+    """
+    Suffix array keeping only the entries whose text position is a multiple of sample_rate.
+    sa[row] walks LF (row -> C[c] + occ[c][row]) until a sampled row, then adds the steps walked:
+    about (sample_rate - 1) / 2 steps on average. Only len() and indexing are supported.
+    """
+    
+    def __init__(self, suffix_array, bwt, count_table, occurrence, sample_rate):
+        self.bwt = bwt
+        self.count_table = count_table
+        self.occurrence = occurrence
+        self.sample_rate = sample_rate
+        self.length = len(suffix_array)
+        self.marks = bytearray(self.length)
+        self.values = array('I')
+        self.rank_checkpoints = array('I')
+        for row, position in enumerate(suffix_array):   # O(n)
+            if row % SA_RANK_BLOCK == 0:
+                self.rank_checkpoints.append(len(self.values))
+            if position % sample_rate == 0:
+                self.marks[row] = 1
+                self.values.append(position)
+    
+    def __len__(self):
+        return self.length
+    
+    def __getitem__(self, row):
+        steps = 0
+        marks, bwt, count_table, occurrence = self.marks, self.bwt, self.count_table, self.occurrence
+        while not marks[row]:                           # O(sample_rate) LF steps at most
+            c = bwt[row]
+            row = count_table[c] + occurrence[c][row]
+            steps += 1
+        count_operations("sa_lf_steps", steps)
+        block = row // SA_RANK_BLOCK
+        rank = self.rank_checkpoints[block] + marks.count(1, block * SA_RANK_BLOCK, row)
+        return self.values[rank] + steps
+
+
+class KmerIntervalTable:
+    """
+    SA interval [tops[code], bottoms[code]) of every A/C/G/T k-mer (empty: 0, 0), so backward search
+    can start at the interval of the pattern's last k characters instead of k rank steps from [0, n).
+    """
+    
+    __slots__ = ('k', 'tops', 'bottoms')
+    
+    def __init__(self, text, suffix_array, k):
+        self.k = k
+        self.tops = array('I', bytes(4 * 4 ** k))
+        self.bottoms = array('I', bytes(4 * 4 ** k))
+        for row, position in enumerate(suffix_array):  # O(n * k); rows of one k-mer are contiguous
+            code = encode_kmer(text[position:position + k])
+            if code is None:                            # runs into "$" or contains N
+                continue
+            if not self.bottoms[code]:                  # row 0 is "$", so a set interval never ends at 0
+                self.tops[code] = row
+            self.bottoms[code] = row + 1
+
+
+def default_kmer_table_k(n):
+    """
+    Largest k <= KMER_TABLE_K with 4^k <= KMER_TABLE_SLOTS_PER_BASE * n (0: no table). The table
+    saves k of the m rank steps of every search, so k = 10 from about 8 kb of reference on; below
+    that the table would be much larger than the index it speeds up.
+    """
+    k = 0
+    while k < KMER_TABLE_K and 4 ** (k + 1) <= KMER_TABLE_SLOTS_PER_BASE * n:
+        k += 1
+    return k
+
+
+def FM_backward_search(pattern, c_table, occ, bwt_len, kmer_table=None):
+    """Perform backward search on FM-index, jump-starting from kmer_table (KmerIntervalTable) if given."""
     top = 0
     bottom = bwt_len
+    start = len(pattern)
+    jumped = 0                                          # the table lookup counts as one step
+    
+    if kmer_table is not None and start >= kmer_table.k:
+        code = encode_kmer(pattern[start - kmer_table.k:])  # one lookup instead of k rank steps
+        if code is not None:                            # None: N in the k-mer, search from [0, n)
+            top, bottom = kmer_table.tops[code], kmer_table.bottoms[code]
+            if top >= bottom:
+                count_operations("backward_search_steps", 1)
+                return -1, -1
+            start -= kmer_table.k
+            jumped = 1
     
-    for i in range(len(pattern) - 1, -1, -1):
+    for i in range(start - 1, -1, -1):
         c = pattern[i]
         if c not in c_table:
+            count_operations("backward_search_steps", start - 1 - i + jumped)
             return -1, -1
         top = c_table[c] + (occ[c][top] if top > 0 else 0)
         bottom = c_table[c] + occ[c][bottom]
         if top >= bottom:
+            count_operations("backward_search_steps", start - i + jumped)
             return -1, -1
+    count_operations("backward_search_steps", start + jumped)
     return top, bottom
 
+
+def build_fm_index(reference, sa_sample_rate=1, occ_interval=1, kmer_table_k=None, suffix_sort="direct"):
+    """
+    Build the FM-index of reference + "$" once, so it can be shared by every read (and worker).
+    sa_sample_rate > 1 keeps every k-th text position of the suffix array (SampledSuffixArray);
+    occ_interval > 1 keeps occurrence counts every k rows (OccurrenceColumn). 1 keeps the full tables.
+    kmer_table_k sets the k of the jump-start KmerIntervalTable (None: default_kmer_table_k, 0: none).
+    suffix_sort "direct" sorts the suffixes themselves (fastest, ~n^2 / 2 bytes at once); "doubling"
+    uses build_suffix_array_doubling (O(n) memory).
+    """
+    if suffix_sort not in SUFFIX_SORTS:
+        raise ValueError("Unknown suffix sort: " + str(suffix_sort))
+    if kmer_table_k is not None and not 0 <= kmer_table_k <= KMER_TABLE_MAX_K:
+        raise ValueError("K-mer table k must be between 0 and %d" % KMER_TABLE_MAX_K)
+    ref_with_term = reference + "$"
+    if kmer_table_k is None:
+        kmer_table_k = default_kmer_table_k(len(ref_with_term))
+    with stage("index_build"):                          # the direct suffix sort holds all n suffixes at once
+        if suffix_sort == "doubling":
+            suffix_array = build_suffix_array_doubling(ref_with_term)   # O(n log^2 n)
+        else:
+            suffix_array = build_suffix_array(ref_with_term)    # O(n log n)
+        bwt = build_BWT(ref_with_term, suffix_array)        # O(n)
+        count_table, _ = build_count_table(bwt)             # O(n)
+        if occ_interval > 1:
+            occurrence = build_checkpointed_occurrence(bwt, occ_interval)  # O(sigma * n / k) space
+        else:
+            occurrence = build_occurrence_table(bwt)        # O(n)
+        kmer_table = KmerIntervalTable(ref_with_term, suffix_array, kmer_table_k) if kmer_table_k else None  # O(4^k) space
+        if sa_sample_rate > 1:
+            suffix_array = SampledSuffixArray(suffix_array, bwt, count_table, occurrence, sa_sample_rate)
+    return {
+        "suffix_array": suffix_array,
+        "bwt": bwt,
+        "count_table": count_table,
+        "occurrence": occurrence,
+        "kmer_table": kmer_table,
+        "sa_sample_rate": sa_sample_rate,
+        "occ_interval": occ_interval,
+        "kmer_table_k": kmer_table_k
+    }
+
 # ========================================================================================
 # K-mer Utilities (For Salmon)
 # ========================================================================================
 
+def encode_kmer(kmer):
+    """2-bit code of an A/C/G/T string (A=0, C=1, G=2, T=3); None if it has other characters or is empty."""
+    try:                                                # O(k) in C; any other byte becomes "x", which int() rejects
+        return int(kmer.encode('latin-1').translate(_TO_DIGITS), 4)
+    except (UnicodeEncodeError, ValueError):
+        return None
+
+
 def hash_kmer(kmer):
     """Hash a k-mer using polynomial rolling hash."""
     base_map = {"A": 0, "C": 1, "G": 2, "T": 3}
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Read Subsampling for Scaling Benchmarks
+#       Builds every requested subset size in one pass over the FASTQ. Subsets are nested prefixes
+#       of one random ordering, so a smaller size is always contained in a larger one.
+#
+#       A FASTQ stream has no known record count, so a uniform sample has to read (decompress and
+#       parse) the whole file even for a handful of reads; "head" stops after the largest size but
+#       is position-biased. Inputs with a known count and random access (a ReadStore or a list)
+#       are sampled by drawing indices instead, touching only the sampled records. "auto" samples
+#       those uniformly and takes the head of a stream, so it never reads a whole FASTQ.
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import heapq
+import random
+from itertools import islice
+
+# ========================================================================================
+# Nested Subsets
+# ========================================================================================
+
+def reservoir_sample_ordered(records, sample_size, seed=42):
+    """
+    Bottom-k priority sampling: every record gets a uniform random key and the sample_size
+    smallest keys are kept. Sorted by key, every prefix of the result is a uniform sample.
+    """
+    rng = random.Random(seed)
+    heap = []                                                           # max-heap on key (negated)
+    for record_index, record in enumerate(records):                     # O(N log k) single pass
+        key = rng.random()
+        if len(heap) < sample_size:
+            heapq.heappush(heap, (-key, record_index, record))
+        elif key < -heap[0][0]:
+            heapq.heapreplace(heap, (-key, record_index, record))
+    
+    heap.sort(key=lambda entry: -entry[0])                              # O(k log k) ascending key order
+    return [record for _, _, record in heap]
+
+
+def index_sample_ordered(records, sample_size, seed=42):
+    """
+    Uniform sample of a sized, indexable collection without reading it all: sample_size distinct
+    indices in random order, so every prefix of the result is a uniform sample too.
+    """
+    rng = random.Random(seed)
+    indices = rng.sample(range(len(records)), min(sample_size, len(records)))  # O(k)
+    return [records[index] for index in indices]
+
+
+def head_sample(records, sample_size):
+    """First sample_size records (the original, position-biased behaviour); nothing after them is read."""
+    return list(islice(records, sample_size))
+
+
+def sample_nested_subsets(records, sizes, seed=42, method="reservoir"):
+    """
+    Build all subset sizes from a single pass over records.
+    
+    Args:
+        records:    Iterable of reads (e.g. iter_fastq(...)), or a sized, indexable one (ReadStore)
+        sizes:      Requested subset sizes
+        seed:       Random seed for reproducible reservoir samples
+        method:     "reservoir" (uniform over the whole file; an indexable input is sampled by
+                    index instead of a full pass), "head" (first N reads) or "auto" (by index
+                    if the input is indexable, else head)
+    
+    Returns:
+        Dict of size -> list of reads; each list is a prefix of the largest one
+    """
+    if not sizes:
+        return {}
+    largest = max(sizes)
+    indexable = hasattr(records, '__len__') and hasattr(records, '__getitem__')
+    if method in ("reservoir", "auto") and indexable:
+        ordered = index_sample_ordered(records, largest, seed)
+    elif method == "reservoir":
+        ordered = reservoir_sample_ordered(records, largest, seed)
+    elif method in ("head", "auto"):
+        ordered = head_sample(records, largest)                         # stops after the largest size
+    else:
+        raise ValueError("Unknown sampling method: " + str(method))
+    
+    subsets = {}
+    for size in sizes:
+        subsets[size] = ordered[:size]
+    return subsets
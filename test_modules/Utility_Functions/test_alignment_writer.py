@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Tests: SAM / BAM Alignment Writer
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import gzip
+import struct
+
+from Utility_Functions.alignment_writer import (
+    AlignmentWriter, encode_bam_record, format_sam_record, reg2bin, parse_cigar, BGZF_EOF_BLOCK, BGZF_MAX_BLOCK_DATA
+)
+
+REFERENCES = [("chr1", 5000), ("chr2", 800)]
+MAPPED = {'read_id': "r1 extra", 'position': 99, 'cigar': "3M1I4M2D2M", 'mapq': 42, 'flag': 16,
+          'sequence': "ACGTNACGTA", 'quality': "IIIII#####", 'unmapped': False}
+UNMAPPED = {'read_id': "r2", 'sequence': "ACG", 'quality': "*", 'unmapped': True}
+
+
+def decode_bam_record(data, offset):
+    """(fields, next offset) of one BAM record."""
+    block_size = struct.unpack_from("<i", data, offset)[0]
+    body = data[offset + 4:offset + 4 + block_size]
+    (ref_id, position, name_length, mapq, bin_, n_cigar, flag, seq_length,
+     _, _, _) = struct.unpack_from("<iiBBHHHIiii", body, 0)
+    cursor = 32
+    name = body[cursor:cursor + name_length - 1].decode()
+    cursor += name_length
+    cigar = struct.unpack_from("<" + str(n_cigar) + "I", body, cursor)
+    cursor += 4 * n_cigar
+    packed = body[cursor:cursor + (seq_length + 1) // 2]
+    cursor += (seq_length + 1) // 2
+    sequence = "".join("=ACMGRSVTWYHKDBN"[(packed[i >> 1] >> (4 if i % 2 == 0 else 0)) & 15]
+                       for i in range(seq_length))
+    quality = body[cursor:cursor + seq_length]
+    fields = {'ref_id': ref_id, 'position': position, 'mapq': mapq, 'bin': bin_, 'flag': flag, 'name': name,
+              'cigar': ["%d%s" % (op >> 4, "MIDNSHP=X"[op & 15]) for op in cigar],
+              'sequence': sequence, 'quality': quality}
+    return fields, offset + 4 + block_size
+
+
+def test_parse_cigar():
+    assert parse_cigar("3M1I4M2D2M") == [(3, 'M'), (1, 'I'), (4, 'M'), (2, 'D'), (2, 'M')]
+    assert parse_cigar("*") == []
+
+
+def test_reg2bin_levels():
+    assert reg2bin(0, 1) == 4681
+    assert reg2bin(16383, 16385) == 585                                     # crosses a 16 kb bin
+    assert reg2bin(0, 1 << 29) == 0
+
+
+def test_bam_record_fields():
+    fields, end = decode_bam_record(encode_bam_record(MAPPED, 1), 0)
+    assert end == len(encode_bam_record(MAPPED, 1))
+    assert fields['ref_id'] == 1 and fields['position'] == 99 and fields['mapq'] == 42 and fields['flag'] == 16
+    assert fields['name'] == "r1"
+    assert fields['cigar'] == ["3M", "1I", "4M", "2D", "2M"]
+    assert fields['bin'] == reg2bin(99, 99 + 11)                            # M, D and M consume 11 bases
+    assert fields['sequence'] == "ACGTNACGTA"
+    assert fields['quality'] == bytes([40] * 5 + [2] * 5)
+
+
+def test_unmapped_bam_record():
+    fields, _ = decode_bam_record(encode_bam_record(UNMAPPED, 0), 0)
+    assert fields['ref_id'] == -1 and fields['position'] == -1 and fields['flag'] == 4
+    assert fields['cigar'] == []
+    assert fields['quality'] == b"\xff" * 3
+
+
+def test_empty_read_id_becomes_star():
+    for read_id in ("", "   "):
+        fields, _ = decode_bam_record(encode_bam_record(dict(MAPPED, read_id=read_id), 0), 0)
+        assert fields['name'] == "*"
+
+
+def test_unmapped_sam_record_has_no_position_or_cigar():
+    stale = dict(MAPPED, unmapped=True)
+    fields = format_sam_record(stale, "chr1").rstrip("\n").split("\t")
+    assert fields[1:6] == ["4", "*", "0", "42", "*"]
+
+
+def test_bam_file_layout(tmp_path):
+    path = str(tmp_path / "out.bam")
+    with AlignmentWriter(path, REFERENCES) as writer:
+        writer.write_batch([MAPPED] * 3000 + [UNMAPPED], "chr2")            # more than one BGZF block
+    raw = open(path, 'rb').read()
+    assert raw.endswith(BGZF_EOF_BLOCK)
+    data = gzip.decompress(raw)
+    assert len(data) > BGZF_MAX_BLOCK_DATA
+    assert data[:4] == b"BAM\1"
+    text_length = struct.unpack_from("<i", data, 4)[0]
+    assert b"@SQ\tSN:chr2\tLN:800" in data[8:8 + text_length]
+    offset = 8 + text_length
+    assert struct.unpack_from("<i", data, offset)[0] == 2
+    offset += 4
+    for name, length in REFERENCES:
+        name_length = struct.unpack_from("<i", data, offset)[0]
+        assert data[offset + 4:offset + 4 + name_length] == name.encode() + b"\0"
+        assert struct.unpack_from("<i", data, offset + 4 + name_length)[0] == length
+        offset += 8 + name_length
+    records = []
+    while offset < len(data):
+        fields, offset = decode_bam_record(data, offset)
+        records.append(fields)
+    assert len(records) == 3001 == writer.records_written
+    assert records[0]['ref_id'] == 1 and records[-1]['flag'] == 4
+
+
+def test_sam_output(tmp_path):
+    path = str(tmp_path / "out.sam")
+    with AlignmentWriter(path, REFERENCES) as writer:
+        writer.write_batch([MAPPED, UNMAPPED], "chr1")
+    lines = open(path).read().splitlines()
+    assert lines[0].startswith("@HD")
+    body = [line.split("\t") for line in lines if not line.startswith("@")]
+    assert body[0][:6] == ["r1 extra", "16", "chr1", "100", "42", "3M1I4M2D2M"]
+    assert body[1][1:6] == ["4", "*", "0", "255", "*"]
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Tests: Indexed FASTA Access
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import random
+
+import pytest
+
+from Utility_Functions.fasta_index import IndexedFasta, build_fasta_index, read_fasta_index, scan_fasta_index
+
+
+def write_fasta(path, records, width, newline="\n"):
+    with open(path, 'w', newline="") as f:
+        for name, sequence in records.items():
+            f.write(">" + name + " description" + newline)
+            for start in range(0, len(sequence), width):
+                f.write(sequence[start:start + width] + newline)
+
+
+@pytest.fixture
+def records():
+    rng = random.Random(32)
+    return {name: "".join(rng.choice("ACGT") for _ in range(length))
+            for name, length in [("a", 61), ("b", 40), ("c", 7)]}
+
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n"])
+def test_fetch_matches_slices(tmp_path, records, newline):
+    path = str(tmp_path / "ref.fa")
+    write_fasta(path, records, 10, newline)
+    with IndexedFasta(path) as fasta:
+        assert list(fasta) == ["a", "b", "c"]
+        for name, sequence in records.items():
+            assert fasta.length(name) == len(sequence)
+            for start, end in [(0, None), (0, 1), (9, 11), (24, 28), (len(sequence) - 3, len(sequence) + 5)]:
+                assert fasta.fetch(name, start, end) == sequence[start:end]
+
+
+def test_fai_columns(tmp_path, records):
+    path = str(tmp_path / "ref.fa")
+    write_fasta(path, records, 10)
+    index = read_fasta_index(build_fasta_index(path))
+    header = len(">a description\n")
+    assert index["a"] == (61, header, 10, 11)
+    assert index["b"][1] == header + 61 + 7 + header                        # 7 lines of "a" sequence
+
+
+def test_longer_last_line_is_rejected(tmp_path):
+    path = tmp_path / "bad.fa"
+    path.write_text(">a\n" + "C" * 10 + "\n" + "C" * 10 + "\n" + "A" * 12 + "\n")
+    with pytest.raises(ValueError):
+        scan_fasta_index(str(path))
+
+
+def test_short_line_before_the_last_is_rejected(tmp_path):
+    path = tmp_path / "bad.fa"
+    path.write_text(">a\n" + "C" * 10 + "\n" + "C" * 5 + "\n" + "A" * 10 + "\n")
+    with pytest.raises(ValueError):
+        scan_fasta_index(str(path))
+
+
+def test_blank_line_inside_a_sequence_is_rejected(tmp_path):
+    path = tmp_path / "bad.fa"
+    path.write_text(">a\n" + "C" * 10 + "\n\n" + "A" * 10 + "\n")
+    with pytest.raises(ValueError):
+        scan_fasta_index(str(path))
+
+
+def test_blank_lines_after_a_sequence_are_allowed(tmp_path):
+    path = tmp_path / "ok.fa"
+    path.write_text(">a\n" + "C" * 10 + "\n" + "A" * 4 + "\n\n>b\n" + "G" * 6 + "\n\n")
+    index = scan_fasta_index(str(path))
+    assert index["a"] == (14, 3, 10, 11)
+    assert index["b"] == (6, 23, 6, 7)
+
+
+def test_unwritable_fai_falls_back_to_memory(tmp_path, records):
+    path = str(tmp_path / "ref.fa")
+    write_fasta(path, records, 10)
+    fai_path = str(tmp_path / "missing_dir" / "ref.fa.fai")
+    with IndexedFasta(path, fai_path) as fasta:
+        assert fasta.fetch("a", 24, 28) == records["a"][24:28]
+    assert not (tmp_path / "missing_dir").exists()
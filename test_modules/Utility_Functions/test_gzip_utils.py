@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Tests: Threaded Gzip Reader
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import gzip
+
+import pytest
+
+from Utility_Functions.gzip_utils import open_gzip_text, ThreadedGzipReader, is_bgzf
+from Utility_Functions.alignment_writer import BgzfWriter
+
+FASTQ_TEXT = "".join("@r%d\nACGTACGTAC\n+\nIIIIIIIIII\n" % index for index in range(200))
+
+
+def read_all(filepath, threads=1):
+    with open_gzip_text(str(filepath), threads=threads) as handle:
+        return handle.read()
+
+
+def test_multi_member_file_is_read_whole(tmp_path):
+    path = tmp_path / "reads.fq.gz"
+    half = len(FASTQ_TEXT) // 2
+    path.write_bytes(gzip.compress(FASTQ_TEXT[:half].encode()) + gzip.compress(FASTQ_TEXT[half:].encode()))
+    assert read_all(path) == FASTQ_TEXT
+
+
+def test_nul_padding_between_and_after_members_is_skipped(tmp_path):
+    path = tmp_path / "padded.fq.gz"
+    half = len(FASTQ_TEXT) // 2
+    path.write_bytes(gzip.compress(FASTQ_TEXT[:half].encode()) + b"\x00" * 100
+                     + gzip.compress(FASTQ_TEXT[half:].encode()) + b"\x00" * 512)
+    with gzip.open(path, "rt") as handle:                                   # the stdlib accepts it too
+        assert handle.read() == FASTQ_TEXT
+    assert read_all(path) == FASTQ_TEXT
+
+
+def test_padding_split_across_reads(tmp_path):
+    path = tmp_path / "padded.fq.gz"
+    path.write_bytes(gzip.compress(FASTQ_TEXT.encode()) + b"\x00" * 5000)
+    reader = ThreadedGzipReader(str(path), read_size=64)
+    try:
+        assert reader.read().decode() == FASTQ_TEXT
+    finally:
+        reader.close()
+
+
+def test_truncated_member_raises(tmp_path):
+    path = tmp_path / "truncated.fq.gz"
+    path.write_bytes(gzip.compress(FASTQ_TEXT.encode())[:-20])
+    with pytest.raises(EOFError):
+        read_all(path)
+
+
+def test_bgzf_blocks_decompress_in_order(tmp_path):
+    path = tmp_path / "reads.fq.bgz"
+    text = FASTQ_TEXT * 400                                                 # several 64 KB blocks
+    writer = BgzfWriter(str(path))
+    writer.write(text.encode())
+    writer.close()
+    assert is_bgzf(str(path))
+    assert read_all(path, threads=3) == text
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Tests: Memory-Budgeted Index Planning
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import random
+
+import pytest
+
+from Utility_Functions.index_budget import (
+    plan_fm_index, estimate_fm_index_bytes, plan_salmon_index, estimate_salmon_index_bytes,
+    build_fm_index_within_budget, set_index_memory_budget, IndexBudgetError
+)
+from Utility_Functions.shared_utils import build_fm_index
+
+MB = 1024 * 1024
+
+
+def random_dna(rng, length):
+    return "".join(rng.choice("ACGT") for _ in range(length))
+
+
+def test_direct_sort_when_its_peak_fits():
+    plan = plan_fm_index(2001, 64)
+    assert plan['suffix_sort'] == "direct"
+    assert plan['estimate']['build_peak'] <= 64 * MB
+
+
+def test_doubling_when_the_direct_sort_does_not_fit():
+    n = 20001
+    assert estimate_fm_index_bytes(n)['build_peak'] > 50 * MB              # ~n^2 / 2 bytes of suffixes
+    plan = plan_fm_index(n, 50)
+    assert plan['suffix_sort'] == "doubling"
+    assert plan['estimate']['total'] <= 50 * MB and plan['estimate']['build_peak'] <= 50 * MB
+
+
+def test_build_peak_alone_can_fail_the_plan():
+    n = 20001
+    resident = estimate_fm_index_bytes(n, 64, 256)
+    assert resident['total'] < 0.5 * MB < resident['build_peak']          # the result fits, the build does not
+    with pytest.raises(IndexBudgetError, match="while building"):
+        plan_fm_index(n, 0.5)
+
+
+def test_budgeted_build_matches_the_full_index():
+    reference = random_dna(random.Random(48), 3000)
+    set_index_memory_budget(1)
+    try:
+        budgeted = build_fm_index_within_budget(reference)
+    finally:
+        set_index_memory_budget(None)
+    full = build_fm_index(reference)
+    assert budgeted['bwt'] == full['bwt']
+    for row in range(0, len(reference) + 1, 7):
+        assert budgeted['suffix_array'][row] == full['suffix_array'][row]
+
+
+def test_salmon_build_peak_is_checked():
+    rng = random.Random(48)
+    transcripts = {"T" + str(i): random_dna(rng, 5000) for i in range(20)}
+    estimate = estimate_salmon_index_bytes(transcripts)
+    assert estimate['total'] < estimate['build_peak']
+    between = (estimate['total'] + estimate['build_peak']) / 2 / MB
+    with pytest.raises(IndexBudgetError, match="while building"):
+        plan_salmon_index(transcripts, between)
+    assert not plan_salmon_index(transcripts, estimate['build_peak'] / MB + 1)['compact_postings']
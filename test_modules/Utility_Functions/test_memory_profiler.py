@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Tests: Peak Memory Profiler
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import os
+import threading
+
+import pytest
+
+from Utility_Functions.memory_profiler import MemoryProfiler, memory_stage, sampling_paused
+from Utility_Functions.parallel_utils import fork_available, create_shared_pool, close_shared_pool
+
+
+def test_threads_nest_their_own_stages():
+    entered = threading.Event()
+    release = threading.Event()
+    
+    def writer():
+        with memory_stage("write"):
+            entered.set()
+            release.wait(5)
+    
+    with MemoryProfiler() as profiler:
+        with memory_stage("align"):
+            with memory_stage("seed"):
+                thread = threading.Thread(target=writer)
+                thread.start()
+                assert entered.wait(5)
+            assert [stage.name for stage in profiler.thread_stack()] == ["align"]   # not "write"
+            release.set()
+            thread.join()
+        assert profiler.thread_stack() == []
+    assert all(stack == [] for stack in profiler.stacks)
+    assert {name: record['calls'] for name, record in profiler.stages.items()} == {"align": 1, "seed": 1, "write": 1}
+
+
+def test_sampling_pauses_and_resumes():
+    with MemoryProfiler(interval=0.001) as profiler:
+        with sampling_paused():
+            assert profiler._thread is None
+        assert profiler._thread.is_alive()
+    assert profiler._thread is None
+
+
+@pytest.mark.skipif(not fork_available(), reason="fork start method not available")
+def test_pool_forks_without_the_sampling_thread():
+    threads_at_fork = []
+    recording = []
+    os.register_at_fork(before=lambda: recording and threads_at_fork.append(recording[0]._thread))
+    with MemoryProfiler(interval=0.001) as profiler:
+        recording.append(profiler)
+        pool = create_shared_pool(2, {})
+        recording.clear()
+        assert profiler._thread.is_alive()
+        close_shared_pool(pool)
+    assert threads_at_fork == [None, None]
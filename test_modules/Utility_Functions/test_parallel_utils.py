@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Tests: Fork-Shared Process Pools
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import time
+
+import pytest
+
+from Utility_Functions.parallel_utils import (
+    get_shared_state, fork_available, create_shared_pool, close_shared_pool, chunk_items, imap_bounded
+)
+
+needs_fork = pytest.mark.skipif(not fork_available(), reason="fork start method not available")
+
+
+def offset_chunk(chunk):
+    offset = get_shared_state()["offset"]
+    return [value + offset for value in chunk]
+
+
+def slow_chunk(chunk):
+    time.sleep(5)
+    return chunk
+
+
+def test_chunk_items_keeps_the_remainder():
+    assert list(chunk_items(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+@needs_fork
+def test_workers_read_the_shared_state_in_order():
+    pool = create_shared_pool(2, {"offset": 100})
+    try:
+        results = list(imap_bounded(pool, offset_chunk, chunk_items(range(10), 3), 2))
+    finally:
+        close_shared_pool(pool)
+    assert results == [[100, 101, 102], [103, 104, 105], [106, 107, 108], [109]]
+
+
+@needs_fork
+def test_shared_state_is_cleared_when_the_pool_closes():
+    pool = create_shared_pool(2, {"offset": 1, "index": object()})
+    assert get_shared_state()["offset"] == 1
+    close_shared_pool(pool)
+    assert get_shared_state() == {}
+
+
+@needs_fork
+def test_terminate_does_not_wait_for_busy_workers():
+    pool = create_shared_pool(2, {"offset": 1})
+    pending = [pool.apply_async(slow_chunk, ([value],)) for value in range(4)]
+    start = time.time()
+    close_shared_pool(pool, terminate=True)
+    assert time.time() - start < 2
+    assert get_shared_state() == {}
+    assert not any(result.ready() and result.successful() for result in pending)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Tests: Seed Locators (FM-Index or K-mer Table)
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import random
+
+import pytest
+
+from Utility_Functions.seed_index import KmerSeedLocator, FMSeedLocator, boundary_starts
+from Utility_Functions.shared_utils import build_fm_index
+from Utility_Functions.instrumentation import take_operation_counts
+
+
+def naive_positions(reference, pattern):
+    positions = []
+    position = reference.find(pattern)
+    while position >= 0:
+        positions.append(position)
+        position = reference.find(pattern, position + 1)
+    return positions
+
+
+def query_patterns(rng, reference, count):
+    """Substrings of the reference (lengths 1..24, some at its very end) and random patterns with N."""
+    patterns = [reference[-3:], reference[-11:], reference[:1]]
+    for index in range(count):
+        length = rng.randrange(1, 25)
+        if index % 3:
+            start = rng.randrange(0, len(reference) - length + 1)
+            patterns.append(reference[start:start + length])
+        else:
+            patterns.append("".join(rng.choice("ACGTN") for _ in range(length)))
+    return patterns
+
+
+@pytest.fixture(scope="module")
+def reference():
+    rng = random.Random(49)
+    return "".join(rng.choice("ACGT" * 12 + "N") for _ in range(4000)) + "ACGTACG"
+
+
+@pytest.mark.parametrize("k,layout", [(4, "dense"), (6, "dense"), (8, "hash"), (11, "hash"), (15, "hash")])
+def test_hash_locator_matches_a_naive_scan(reference, k, layout):
+    locator = KmerSeedLocator(reference, k, layout)
+    for pattern in query_patterns(random.Random(k), reference, 300):
+        assert locator.locate(pattern) == naive_positions(reference, pattern), pattern
+
+
+def test_fm_locator_matches_a_naive_scan(reference):
+    locator = FMSeedLocator(build_fm_index(reference))
+    for pattern in query_patterns(random.Random(1), reference, 300):
+        assert locator.locate(pattern) == naive_positions(reference, pattern), pattern
+
+
+def test_short_and_n_patterns_do_not_scan(reference):
+    locator = KmerSeedLocator(reference, 15)
+    take_operation_counts()
+    for pattern in ["ACGTACGT", "A", reference[100:108], reference[200:240].replace(reference[205], "N", 1), "NNNNACGT"]:
+        locator.locate(pattern)
+    counts = take_operation_counts()
+    assert "seed_scan_fallbacks" not in counts
+    assert counts["seed_prefix_ranges"] >= 3
+    assert locator.locate("NNN") == naive_positions(reference, "NNN")
+    assert take_operation_counts()["seed_scan_fallbacks"] == 1
+
+
+def test_boundary_starts():
+    assert list(boundary_starts("ACGTNACNACGTAC", 3)) == [2, 3, 5, 6, 12, 13]
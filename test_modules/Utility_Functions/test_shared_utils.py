@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Tests: Suffix Arrays and FM-Index Search
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import random
+
+import pytest
+
+from Utility_Functions.shared_utils import (
+    build_suffix_array, build_suffix_array_doubling, build_fm_index, FM_backward_search, KmerIntervalTable,
+    encode_kmer, default_kmer_table_k, KMER_TABLE_K, KMER_TABLE_MAX_K
+)
+from Utility_Functions.instrumentation import take_operation_counts
+
+
+def random_dna(rng, length, alphabet="ACGT"):
+    return "".join(rng.choice(alphabet) for _ in range(length))
+
+
+@pytest.mark.parametrize("text", [
+    "$", "A$", "ACGT$", "AAAAAAAAAAAAAAAA$", "ACGTTGCAAG" * 30 + "$", "NNACGNNACGNN$",
+] + [random_dna(random.Random(seed), length, "ACGTN") + "$" for seed, length in [(1, 50), (2, 500), (3, 2000)]])
+def test_doubling_suffix_array_matches_the_direct_sort(text):
+    assert build_suffix_array_doubling(text) == build_suffix_array(text)
+
+
+def test_fm_index_suffix_sorts_agree():
+    reference = random_dna(random.Random(5), 1500)
+    direct = build_fm_index(reference)
+    doubling = build_fm_index(reference, suffix_sort="doubling")
+    assert doubling['suffix_array'] == direct['suffix_array'] and doubling['bwt'] == direct['bwt']
+    with pytest.raises(ValueError):
+        build_fm_index(reference, suffix_sort="radix")
+
+
+# ========================================================================================
+# K-mer Interval Jump-Start
+# ========================================================================================
+
+def search(fm_index, pattern, kmer_table=None):
+    return FM_backward_search(pattern, fm_index["count_table"], fm_index["occurrence"], len(fm_index["bwt"]),
+                              kmer_table)
+
+
+def located(fm_index, pattern, kmer_table=None):
+    top, bottom = search(fm_index, pattern, kmer_table)
+    if top < 0 or top >= bottom:
+        return []
+    return sorted(fm_index["suffix_array"][row] for row in range(top, bottom))
+
+
+def naive_positions(reference, pattern):
+    return [i for i in range(len(reference) - len(pattern) + 1) if reference.startswith(pattern, i)]
+
+
+@pytest.fixture(scope="module")
+def fm_case():
+    reference = random_dna(random.Random(50), 3000, "ACGT" * 10 + "N") + "ACGTAC"
+    return reference, build_fm_index(reference, kmer_table_k=0)
+
+
+def test_kmer_intervals_equal_backward_search(fm_case):
+    reference, fm_index = fm_case
+    table = KmerIntervalTable(reference + "$", fm_index["suffix_array"], 4)
+    for code in range(4 ** 4):
+        kmer = "".join("ACGT"[(code >> shift) & 3] for shift in (6, 4, 2, 0))
+        top, bottom = search(fm_index, kmer)
+        if top < 0 or top >= bottom:
+            assert table.tops[code] == table.bottoms[code] == 0
+        else:
+            assert (table.tops[code], table.bottoms[code]) == (top, bottom)
+
+
+@pytest.mark.parametrize("k", [1, 5, 8])
+@pytest.mark.parametrize("sa_sample_rate,occ_interval", [(1, 1), (4, 32)])
+def test_jump_started_search_matches_a_naive_scan(fm_case, k, sa_sample_rate, occ_interval):
+    reference, _ = fm_case
+    fm_index = build_fm_index(reference, sa_sample_rate, occ_interval, kmer_table_k=k)
+    rng = random.Random(k)
+    patterns = [reference[-6:], reference[:12], "NNNN", "A" * 30]
+    for index in range(200):
+        length = rng.randrange(1, 20)
+        if index % 2:
+            start = rng.randrange(0, len(reference) - length + 1)
+            patterns.append(reference[start:start + length])
+        else:
+            patterns.append(random_dna(rng, length, "ACGTN"))
+    for pattern in patterns:
+        assert located(fm_index, pattern, fm_index["kmer_table"]) == naive_positions(reference, pattern), pattern
+
+
+def test_jump_start_saves_steps(fm_case):
+    reference, fm_index = fm_case
+    table = KmerIntervalTable(reference + "$", fm_index["suffix_array"], 8)
+    pattern = reference[1000:1020]
+    take_operation_counts()
+    plain = search(fm_index, pattern)
+    plain_steps = take_operation_counts()["backward_search_steps"]
+    assert search(fm_index, pattern, table) == plain
+    assert take_operation_counts()["backward_search_steps"] == plain_steps - 8 + 1
+
+
+def test_default_kmer_table_k():
+    assert default_kmer_table_k(10001) == KMER_TABLE_K
+    assert default_kmer_table_k(10 ** 7) == KMER_TABLE_K
+    assert 0 < default_kmer_table_k(500) < KMER_TABLE_K
+    with pytest.raises(ValueError):
+        build_fm_index("ACGT", kmer_table_k=KMER_TABLE_MAX_K + 1)
+
+
+@pytest.mark.parametrize("kmer", ["", "ACGN", "acgt", "0123", "A_CG", " ACG", "ACG ", "+ACG", "AC\nG", "ACG\u0661"])
+def test_encode_kmer_rejects_other_characters(kmer):
+    assert encode_kmer(kmer) is None
+
+
+def test_encode_kmer_codes():
+    assert encode_kmer("A") == 0 and encode_kmer("T") == 3
+    assert encode_kmer("ACGT") == 0b00011011
+    assert encode_kmer("T" * 12) == 4 ** 12 - 1
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Tests: Nested Read Subsets
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import gzip
+
+import pytest
+
+from Utility_Functions.subsample_utils import sample_nested_subsets
+
+
+class CountingReads(list):
+    """List of reads that counts the records read through indexing."""
+    
+    touched = 0
+    
+    def __getitem__(self, index):
+        self.touched += 1
+        return list.__getitem__(self, index)
+
+
+@pytest.mark.parametrize("method", ["reservoir", "head", "auto"])
+def test_subsets_are_nested_prefixes(method):
+    subsets = sample_nested_subsets(iter(range(1000)), [10, 50, 5], seed=3, method=method)
+    assert [len(subsets[size]) for size in (5, 10, 50)] == [5, 10, 50]
+    assert subsets[50][:10] == subsets[10] and subsets[10][:5] == subsets[5]
+    assert len(set(subsets[50])) == 50
+
+
+def test_reservoir_is_reproducible_and_spread_over_the_input():
+    first = sample_nested_subsets(iter(range(10000)), [200], seed=7)[200]
+    assert first == sample_nested_subsets(iter(range(10000)), [200], seed=7)[200]
+    assert max(first) > 5000 and min(first) < 5000
+
+
+def test_indexable_input_is_sampled_without_a_full_pass():
+    reads = CountingReads(range(100000))
+    subsets = sample_nested_subsets(reads, [10, 100], seed=5)
+    assert reads.touched == 100
+    assert subsets[100][:10] == subsets[10]
+    assert len(set(subsets[100])) == 100 and max(subsets[100]) > 50000
+
+
+def test_auto_takes_the_head_of_a_stream():
+    def stream():
+        for index in range(1000):
+            if index >= 50:
+                raise AssertionError("read past the largest size")
+            yield index
+    subsets = sample_nested_subsets(stream(), [10, 50], seed=5, method="auto")
+    assert subsets[50] == list(range(50))
+
+
+def test_auto_samples_indexable_input_uniformly():
+    reads = CountingReads(range(100000))
+    assert sample_nested_subsets(reads, [100], seed=5, method="auto") == sample_nested_subsets(reads, [100], seed=5)
+    assert reads.touched == 200
+
+
+def test_sample_larger_than_input():
+    assert sorted(sample_nested_subsets([1, 2, 3], [10], seed=1)[10]) == [1, 2, 3]
+
+
+def test_read_store_sampling(tmp_path):
+    pytest.importorskip("numpy")
+    from Utility_Functions.read_store import convert_fastq_to_read_store, ReadStore
+    fastq = tmp_path / "reads.fq.gz"
+    with gzip.open(fastq, "wt") as f:
+        for index in range(500):
+            f.write("@r%d\n%s\n+\n%s\n" % (index, "ACGT"[index % 4] * 20, "I" * 20))
+    store_path = str(tmp_path / "reads.readstore")
+    convert_fastq_to_read_store(str(fastq), store_path)
+    sample = sample_nested_subsets(ReadStore(store_path), [25], seed=2)[25]
+    assert len({read.id for read in sample}) == 25
+    for read in sample:
+        index = int(read.id[1:])
+        assert read.sequence == "ACGT"[index % 4] * 20 and read.quality == "I" * 20
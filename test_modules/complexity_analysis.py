@@ -10,6 +10,8 @@
 import time
 import os
 
+from complexity_fitting import fit_all, fit_tracker, export_fits_csv, describe_fit
+
 # ========================================================================================
 # Runtime Measurement Functions
 # ========================================================================================
@@ -40,14 +42,15 @@ def create_complexity_tracker():
     }
 
 
-def add_measurement(tracker, input_size, runtime, memory_mb, operations=0, label=""):
-    """Add a measurement to the tracker. O(1)."""
+def add_measurement(tracker, input_size, runtime, memory_mb, operations=0, label="", extra=None):
+    """Add a measurement to the tracker; extra is a dict of additional CSV columns. O(1)."""
     measurement = {
         'input_size': input_size,
         'runtime': runtime,
         'memory_mb': memory_mb,
         'operations': operations,
-        'label': label
+        'label': label,
+        'extra': extra or {}
     }
     tracker['measurements'].append(measurement)
     tracker['input_sizes'].append(input_size)
@@ -61,9 +64,15 @@ def add_measurement(tracker, input_size, runtime, memory_mb, operations=0, label
 # =============================================================================
 
 def export_to_csv(tracker, output_file):
-    """Export measurements to CSV file for external graphing."""
+    """Export measurements to CSV file for external graphing (extra columns after the standard ones)."""
+    extra_columns = []
+    for m in tracker['measurements']:
+        for key in m.get('extra', {}):
+            if key not in extra_columns:
+                extra_columns.append(key)
+    
     lines = []
-    lines.append("input_size,runtime_sec,memory_mb,operations,label")
+    lines.append(",".join(["input_size", "runtime_sec", "memory_mb", "operations", "label"] + extra_columns))
     
     for m in tracker['measurements']:
         line = ",".join([
@@ -72,6 +81,29 @@ def export_to_csv(tracker, output_file):
             str(m['memory_mb']),
             str(m['operations']),
             '"' + m['label'] + '"'
+        ] + [str(m.get('extra', {}).get(key, "")) for key in extra_columns])
+        lines.append(line)
+    
+    with open(output_file, 'w') as f:
+        f.write('\n'.join(lines))
+
+
+def export_worker_stats(worker_stats, output_file):
+    """Export per-worker runtime and peak RSS (from run_alignment_test with workers > 1)."""
+    lines = []
+    lines.append("input_size,workers,pid,chunks,reads,runtime_sec,user_time_sec,system_time_sec,max_rss_kb")
+    
+    for w in worker_stats:
+        line = ",".join([
+            str(w.get('input_size', 0)),
+            str(w.get('workers', 1)),
+            str(w['pid']),
+            str(w['chunks']),
+            str(w['reads']),
+            str(w['runtime']),
+            str(w['user_time']),
+            str(w['system_time']),
+            str(w['max_rss_kb'])
         ])
         lines.append(line)
     
@@ -94,8 +126,17 @@ def generate_full_report(tracker, output_dir):
     csv_file = os.path.join(output_dir, 'complexity_data.csv')
     export_to_csv(tracker, csv_file)
     
+    # Fitted exponents and complexity classes (needs at least two sizes)
+    fits = fit_all(tracker)
+    if fits:
+        export_fits_csv(fits, os.path.join(output_dir, 'complexity_fit.csv'))
+    
     print("Report generated in:", output_dir)
     print("  - complexity_data.csv")
+    if fits:
+        print("  - complexity_fit.csv")
+        for fit in fits:
+            print("      " + fit['metric'] + " vs " + fit['variable'] + ": " + describe_fit(fit))
     
     return ""
 
@@ -183,29 +224,9 @@ def generate_combined_comparison(trackers, output_dir):
             ax1.plot(sizes, times, '-o', label=tracker['algorithm'], 
                     color=colors[i % len(colors)], linewidth=2, markersize=6)
     
-    # Add O(n) and O(n^2) reference lines
-    all_sizes = []
-    all_times = []
-    for tracker in trackers:
-        if len(tracker['measurements']) > 0:
-            for m in tracker['measurements']:
-                all_sizes.append(m['input_size'])
-                all_times.append(m['runtime'])
-    
-    if all_sizes and all_times:
-        x_min, x_max = min(all_sizes), max(all_sizes)
-        x_range = [x_min, x_max]
-        max_time = max(all_times)
-        
-        # Scale O(n) to end at max_time
-        scale = max_time / x_max if x_max > 0 else 0.001
-        y_on = [scale * x for x in x_range]
-        ax1.plot(x_range, y_on, '--', color='green', alpha=0.6, linewidth=2, label='O(n)')
-        
-        # Scale O(n^2) to end at 2x max_time (steeper curve)
-        scale_n2 = (max_time * 2) / (x_max * x_max) if x_max > 0 else 0.00001
-        y_on2 = [scale_n2 * x * x for x in x_range]
-        ax1.plot(x_range, y_on2, '--', color='red', alpha=0.6, linewidth=2, label='O(n²)')
+    # Fitted power laws instead of hand-scaled O(n) / O(n^2) guides
+    for i, tracker in enumerate(trackers):
+        plot_fitted_curve(ax1, tracker, 'runtime', colors[i % len(colors)])
     
     ax1.set_xlabel('Input Size (reads)')
     ax1.set_ylabel('Runtime (seconds)')
@@ -219,6 +240,7 @@ def generate_combined_comparison(trackers, output_dir):
             mems = [m['memory_mb'] for m in tracker['measurements']]
             ax2.plot(sizes, mems, '-o', label=tracker['algorithm'],
                     color=colors[i % len(colors)], linewidth=2, markersize=6)
+            plot_fitted_curve(ax2, tracker, 'memory_mb', colors[i % len(colors)])
     
     ax2.set_xlabel('Input Size (reads)')
     ax2.set_ylabel('Memory Usage (MB)')
@@ -231,4 +253,69 @@ def generate_combined_comparison(trackers, output_dir):
     plt.savefig(os.path.join(output_dir, 'combined_algorithms_comparison.png'), dpi=150)
     plt.close()
     
+    # =====================================================================
+    # GRAPH 3: Stage breakdown of the final test (stage_<name>_self_sec columns)
+    # =====================================================================
+    breakdowns = []
+    for tracker in trackers:
+        if len(tracker['measurements']) > 0:
+            final = tracker['measurements'][-1]
+            stages = get_stage_breakdown(final)
+            if stages:
+                breakdowns.append((tracker['algorithm'], final['runtime'], stages))
+    
+    if breakdowns:
+        stage_names = []
+        for _, _, stages in breakdowns:
+            for name in stages:
+                if name not in stage_names:
+                    stage_names.append(name)
+        stage_colors = plt.get_cmap('tab20')
+        
+        fig, ax = plt.subplots(figsize=(10, 6))
+        names = [algorithm for algorithm, _, _ in breakdowns]
+        bottoms = [0.0] * len(breakdowns)
+        for stage_index, stage_name in enumerate(stage_names + ['other']):
+            heights = []
+            for algorithm, runtime, stages in breakdowns:
+                if stage_name == 'other':                               # untimed remainder of the wall time
+                    heights.append(max(0.0, runtime - sum(stages.values())))
+                else:
+                    heights.append(stages.get(stage_name, 0.0))
+            color = '#BBBBBB' if stage_name == 'other' else stage_colors(stage_index % 20)
+            ax.bar(names, heights, bottom=bottoms, label=stage_name, color=color, edgecolor='black', linewidth=0.8)
+            bottoms = [bottom + height for bottom, height in zip(bottoms, heights)]
+        
+        ax.set_ylabel('Self time (seconds)', fontsize=12)
+        ax.set_title(f'Stage Breakdown of the Final Test ({final_test_size} reads)', fontsize=13, fontweight='bold')
+        ax.legend(bbox_to_anchor=(1.02, 1), loc='upper left', fontsize=9)
+        ax.grid(True, axis='y', alpha=0.3)
+        plt.tight_layout()
+        plt.savefig(os.path.join(output_dir, 'stage_breakdown.png'), dpi=150)
+        plt.close()
+    
     return ""
+
+
+def plot_fitted_curve(ax, tracker, metric, color):
+    """Dashed power-law fit of a tracker metric against input size, labelled with its exponent."""
+    fit = fit_tracker(tracker, metric, 'input_size')
+    if fit is None:
+        return
+    power_law = fit['power_law']
+    low, high = power_law['min_size'], power_law['max_size']
+    xs = [low + (high - low) * step / 50 for step in range(51)]
+    ys = [power_law['coefficient'] * x ** power_law['exponent'] for x in xs]
+    label = f"{tracker['algorithm']} fit ∝ n^{power_law['exponent']:.2f}"
+    if fit['best_class'] is not None:
+        label += f" ({fit['best_class']['class']})"
+    ax.plot(xs, ys, '--', color=color, alpha=0.7, linewidth=1.5, label=label)
+
+
+def get_stage_breakdown(measurement):
+    """Self time per stage from a measurement's stage_<name>_self_sec extra columns."""
+    stages = {}
+    for key, value in measurement.get('extra', {}).items():
+        if key.startswith('stage_') and key.endswith('_self_sec'):
+            stages[key[len('stage_'):-len('_self_sec')]] = value
+    return stages
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Empirical Complexity Fitting
+#       Estimates how runtime and memory actually scale instead of drawing hand-scaled guide lines:
+#           - power law:  log y = log a + b log n by least squares, with a 95% CI on the exponent b
+#           - classes:    y = a + c f(n) for O(1), O(log n), O(n), O(n log n), O(n^2), O(n^3),
+#                         the best one picked by AIC
+#           - extrapolation of the power law to full-library sizes, with a 95% prediction interval
+#       Fits run against input size (reads) and against any other column that varies, such as
+#       reference_length. Pure Python: a handful of points needs no numpy.
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import math
+
+FIT_CONFIDENCE = 0.95
+EXTRAPOLATION_SIZES = [10 ** 5, 10 ** 6, 10 ** 7]      # reads in a full library
+FIT_VARIABLES = ['input_size', 'reference_length']
+FIT_METRICS = {'runtime': 'runtime_sec', 'memory_mb': 'memory_mb'}
+
+# Two-sided 95% Student t quantiles by degrees of freedom (normal beyond 30)
+_T_QUANTILES_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+                   10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 30: 2.042}
+
+COMPLEXITY_CLASSES = [
+    ('O(1)',       None),
+    ('O(log n)',   lambda n: math.log(n)),
+    ('O(n)',       lambda n: n),
+    ('O(n log n)', lambda n: n * math.log(n)),
+    ('O(n^2)',     lambda n: n * n),
+    ('O(n^3)',     lambda n: n ** 3),
+]
+
+# ========================================================================================
+# Least Squares
+# ========================================================================================
+
+def t_quantile(degrees_of_freedom):
+    """95% two-sided t quantile (largest tabulated df not above the given one)."""
+    if degrees_of_freedom < 1:
+        return float('inf')
+    if degrees_of_freedom > 30:
+        return 1.96
+    return _T_QUANTILES_95[max(df for df in _T_QUANTILES_95 if df <= degrees_of_freedom)]
+
+
+def linear_regression(xs, ys):
+    """
+    Ordinary least squares y = intercept + slope * x. O(n).
+    Returns slope, intercept, slope standard error, residual standard deviation, R^2, x mean, Sxx.
+    """
+    n = len(xs)
+    x_mean = sum(xs) / n
+    y_mean = sum(ys) / n
+    sxx = sum((x - x_mean) ** 2 for x in xs)
+    sxy = sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys))
+    syy = sum((y - y_mean) ** 2 for y in ys)
+    slope = sxy / sxx if sxx > 0 else 0.0
+    intercept = y_mean - slope * x_mean
+    rss = sum((y - intercept - slope * x) ** 2 for x, y in zip(xs, ys))
+    residual_sd = math.sqrt(rss / (n - 2)) if n > 2 else 0.0
+    return {
+        'slope': slope,
+        'intercept': intercept,
+        'slope_se': residual_sd / math.sqrt(sxx) if sxx > 0 and n > 2 else float('inf'),
+        'residual_sd': residual_sd,
+        'r_squared': 1 - rss / syy if syy > 0 else 1.0,
+        'rss': rss,
+        'x_mean': x_mean,
+        'sxx': sxx,
+        'n': n
+    }
+
+
+def _usable_points(sizes, values):
+    """Pairs with positive size and value (logs must exist), one per distinct size (mean)."""
+    grouped = {}
+    for size, value in zip(sizes, values):
+        if size is not None and value is not None and size > 0 and value > 0:
+            grouped.setdefault(size, []).append(value)
+    return sorted((size, sum(vals) / len(vals)) for size, vals in grouped.items())
+
+# ========================================================================================
+# Power Law and Complexity Classes
+# ========================================================================================
+
+def fit_power_law(sizes, values):
+    """
+    Fit y = a * n^b on log-log axes. Returns None with fewer than 2 distinct positive points;
+    the exponent CI needs at least 3.
+    """
+    points = _usable_points(sizes, values)
+    if len(points) < 2:
+        return None
+    log_x = [math.log(size) for size, _ in points]
+    log_y = [math.log(value) for _, value in points]
+    regression = linear_regression(log_x, log_y)
+    half_width = t_quantile(len(points) - 2) * regression['slope_se']
+    return {
+        'exponent': regression['slope'],
+        'exponent_ci_low': regression['slope'] - half_width,
+        'exponent_ci_high': regression['slope'] + half_width,
+        'coefficient': math.exp(regression['intercept']),
+        'r_squared': regression['r_squared'],
+        'points': len(points),
+        'min_size': points[0][0],
+        'max_size': points[-1][0],
+        'regression': regression
+    }
+
+
+def predict_power_law(fit, size):
+    """Prediction at size with its 95% prediction interval (multiplicative in log space)."""
+    regression = fit['regression']
+    log_size = math.log(size)
+    predicted = fit['coefficient'] * size ** fit['exponent']
+    if regression['n'] <= 2 or regression['sxx'] <= 0:
+        return predicted, float('nan'), float('nan')
+    spread = regression['residual_sd'] * math.sqrt(
+        1 + 1 / regression['n'] + (log_size - regression['x_mean']) ** 2 / regression['sxx'])
+    factor = math.exp(t_quantile(regression['n'] - 2) * spread)
+    return predicted, predicted / factor, predicted * factor
+
+
+def fit_complexity_classes(sizes, values):
+    """
+    Fit y = a + c f(n) for every class (y = a for O(1)) and rank by AIC. Classes with c <= 0
+    are not candidates. Returns the list of candidates, best first.
+    """
+    points = _usable_points(sizes, values)
+    if len(points) < 3:
+        return []
+    ys = [value for _, value in points]
+    candidates = []
+    for name, transform in COMPLEXITY_CLASSES:
+        if transform is None:
+            mean = sum(ys) / len(ys)
+            rss = sum((y - mean) ** 2 for y in ys)
+            parameters, coefficient, intercept = 1, 0.0, mean
+        else:
+            regression = linear_regression([transform(size) for size, _ in points], ys)
+            if regression['slope'] <= 0:
+                continue
+            rss, parameters = regression['rss'], 2
+            coefficient, intercept = regression['slope'], regression['intercept']
+        n = len(points)
+        aic = n * math.log(max(rss, 1e-300) / n) + 2 * parameters
+        syy = sum((y - sum(ys) / n) ** 2 for y in ys)
+        candidates.append({
+            'class': name,
+            'coefficient': coefficient,
+            'intercept': intercept,
+            'r_squared': 1 - rss / syy if syy > 0 else 1.0,
+            'aic': aic,
+            'transform': transform
+        })
+    candidates.sort(key=lambda candidate: candidate['aic'])
+    return candidates
+
+
+def class_curve(candidate, size):
+    """Value of a fitted complexity class at size."""
+    if candidate['transform'] is None:
+        return candidate['intercept']
+    return candidate['intercept'] + candidate['coefficient'] * candidate['transform'](size)
+
+# ========================================================================================
+# Trackers
+# ========================================================================================
+
+def measurement_column(measurement, column):
+    """A measurement field, or one of its extra columns."""
+    if column in measurement:
+        return measurement[column]
+    return measurement.get('extra', {}).get(column)
+
+
+def fit_tracker(tracker, metric='runtime', variable='input_size'):
+    """Power-law and class fits of one tracker metric against one variable; None if it does not vary."""
+    measurements = tracker['measurements']
+    sizes = [measurement_column(m, variable) for m in measurements]
+    values = [measurement_column(m, metric) for m in measurements]
+    if len(set(size for size in sizes if size is not None)) < 2:
+        return None
+    power_law = fit_power_law(sizes, values)
+    if power_law is None:
+        return None
+    classes = fit_complexity_classes(sizes, values)
+    return {
+        'algorithm': tracker.get('algorithm', ''),
+        'metric': metric,
+        'variable': variable,
+        'power_law': power_law,
+        'best_class': classes[0] if classes else None,
+        'classes': classes
+    }
+
+
+def fit_all(tracker, metrics=None, variables=None):
+    """Every fit of a tracker that the data supports."""
+    fits = []
+    for metric in metrics or FIT_METRICS:
+        for variable in variables or FIT_VARIABLES:
+            fit = fit_tracker(tracker, metric, variable)
+            if fit is not None:
+                fits.append(fit)
+    return fits
+
+
+def export_fits_csv(fits, output_file, extrapolation_sizes=None):
+    """One row per fit and extrapolation size (extrapolation only against input_size)."""
+    if extrapolation_sizes is None:
+        extrapolation_sizes = EXTRAPOLATION_SIZES
+    lines = []
+    lines.append("algorithm,metric,variable,points,min_size,max_size,exponent,exponent_ci_low,exponent_ci_high,"
+                 "coefficient,r_squared,best_class,best_class_r_squared,extrapolated_size,predicted,"
+                 "predicted_ci_low,predicted_ci_high")
+    
+    for fit in fits:
+        power_law = fit['power_law']
+        best = fit['best_class']
+        targets = extrapolation_sizes if fit['variable'] == 'input_size' else [None]
+        for target in targets:
+            if target is None:
+                prediction = ("", "", "")
+            else:
+                prediction = predict_power_law(power_law, target)
+            lines.append(",".join(str(field) for field in [
+                '"' + fit['algorithm'] + '"', FIT_METRICS.get(fit['metric'], fit['metric']), fit['variable'],
+                power_law['points'], power_law['min_size'], power_law['max_size'],
+                power_law['exponent'], power_law['exponent_ci_low'], power_law['exponent_ci_high'],
+                power_law['coefficient'], power_law['r_squared'],
+                best['class'] if best else "", best['r_squared'] if best else "",
+                "" if target is None else target
+            ] + list(prediction)))
+    
+    with open(output_file, 'w') as f:
+        f.write('\n'.join(lines))
+
+
+def describe_fit(fit):
+    """One-line summary, e.g. 'n^1.02 [0.95, 1.09], R^2 0.998, best O(n)'."""
+    power_law = fit['power_law']
+    text = "n^%.2f [%.2f, %.2f], R^2 %.3f" % (power_law['exponent'], power_law['exponent_ci_low'],
+                                               power_law['exponent_ci_high'], power_law['r_squared'])
+    if fit['best_class'] is not None:
+        text += ", best " + fit['best_class']['class']
+    return text
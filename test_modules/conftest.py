@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# pytest Configuration
+#       Test files sit next to the modules they cover (Utility_Functions/test_*.py,
+#       Aln_Algorithm_Functions/test_*.py) and import them the way the runners do, as
+#       Utility_Functions.* and Aln_Algorithm_Functions.*, so test_modules goes on sys.path.
+#
+#       Usage:
+#           python -m pytest -q test_modules
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
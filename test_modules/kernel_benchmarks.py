@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Kernel Micro-Benchmarks
+#       Times the individual kernels on synthetic inputs (fixed seeds, so every run measures the
+#       same work) across a range of sizes. Each case reports the median and IQR of the repeats and
+#       the throughput in its work unit. Results are written as JSON; compared against a stored
+#       baseline, the run fails (exit status 1) when a median regresses beyond the threshold.
+#
+#       Usage:
+#           python kernel_benchmarks.py --save-baseline          # record the baseline
+#           python kernel_benchmarks.py                          # compare, fail on > 10% regressions
+#           python kernel_benchmarks.py --kernels smith_waterman quasi_map --threshold 5
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import gzip
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from Utility_Functions.fastq_utils import read_fastq
+from Utility_Functions.shared_utils import (
+    build_suffix_array, build_BWT, build_occurrence_table, FM_backward_search, build_fm_index,
+    get_minimizers, KMER_TABLE_K
+)
+from Aln_Algorithm_Functions.hisat_alignment import count_mismatches
+from Aln_Algorithm_Functions.bowtie_alignment import smith_waterman
+from Aln_Algorithm_Functions.salmon_saf_alignment import create_salmon_index, quasi_map, em_quantify
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+BENCH_SEED = 244
+BENCH_REPEATS = 7
+BENCH_WARMUP = 1
+BENCH_MIN_TIME = 0.05           # seconds per repeat; fast kernels are looped until a repeat takes this long
+REGRESSION_THRESHOLD_PCT = 10.0
+BENCH_BASELINE = "Outputs/benchmarks/kernel_baseline.json"
+BENCH_RESULTS = "Outputs/benchmarks/kernel_results.json"
+
+# =============================================================================
+# Synthetic Inputs
+# =============================================================================
+
+def random_dna(rng, length):
+    """Uniform random A/C/G/T string."""
+    return "".join(rng.choice("ACGT") for _ in range(length))
+
+
+def mutate(rng, sequence, rate):
+    """Substitute each base with probability rate."""
+    bases = list(sequence)
+    for position in range(len(bases)):
+        if rng.random() < rate:
+            bases[position] = rng.choice("ACGT".replace(bases[position], ""))
+    return "".join(bases)
+
+
+def sample_reads(rng, sequences, count, read_length, error_rate=0.01):
+    """Reads drawn uniformly from the given sequences, with substitutions."""
+    reads = []
+    for _ in range(count):
+        sequence = rng.choice(sequences)
+        start = rng.randrange(0, max(1, len(sequence) - read_length))
+        reads.append(mutate(rng, sequence[start:start + read_length], error_rate))
+    return reads
+
+# =============================================================================
+# Kernel Cases
+#       Each setup builds the inputs for one size and returns (run, work_units, unit);
+#       only run() is timed.
+# =============================================================================
+
+def setup_build_suffix_array(rng, size):
+    text = random_dna(rng, size) + "$"
+    return (lambda: build_suffix_array(text)), len(text), "bases"
+
+
+def setup_build_occurrence_table(rng, size):
+    text = random_dna(rng, size) + "$"
+    bwt = build_BWT(text, build_suffix_array(text))
+    return (lambda: build_occurrence_table(bwt)), len(bwt), "bases"
+
+
+def setup_fm_backward_search(rng, size):
+    reference = random_dna(rng, 5000)
+    fm_index = build_fm_index(reference, kmer_table_k=0)
+    patterns = sample_reads(rng, [reference], 200, size, error_rate=0.0)
+    count_table, occurrence, bwt_len = fm_index["count_table"], fm_index["occurrence"], len(fm_index["bwt"])
+    
+    def run():
+        for pattern in patterns:                                    # O(P * m)
+            FM_backward_search(pattern, count_table, occurrence, bwt_len)
+    return run, len(patterns) * size, "pattern bases"
+
+
+def setup_fm_backward_search_kmer_table(rng, size):
+    reference = random_dna(rng, 5000)
+    fm_index = build_fm_index(reference, kmer_table_k=KMER_TABLE_K)
+    patterns = sample_reads(rng, [reference], 200, size, error_rate=0.0)
+    count_table, occurrence, bwt_len = fm_index["count_table"], fm_index["occurrence"], len(fm_index["bwt"])
+    kmer_table = fm_index["kmer_table"]
+    
+    def run():
+        for pattern in patterns:                                    # O(P * (m - k))
+            FM_backward_search(pattern, count_table, occurrence, bwt_len, kmer_table)
+    return run, len(patterns) * size, "pattern bases"
+
+
+def setup_smith_waterman(rng, size):
+    query = random_dna(rng, size)
+    target = mutate(rng, query, 0.05) + random_dna(rng, 20)
+    return (lambda: smith_waterman(query, target)), len(query) * len(target), "DP cells"
+
+
+def setup_count_mismatches(rng, size):
+    first = random_dna(rng, size)
+    second = mutate(rng, first, 0.05)
+    return (lambda: count_mismatches(first, second)), size, "bases"
+
+
+def setup_get_minimizers(rng, size):
+    sequence = random_dna(rng, size)
+    return (lambda: get_minimizers(sequence, 15, 10)), size, "bases"
+
+
+def setup_quasi_map(rng, size):
+    transcripts = {"T" + str(i): random_dna(rng, 1000) for i in range(20)}
+    salmon_index = create_salmon_index(transcripts, kmer_size=15)
+    reads = sample_reads(rng, list(transcripts.values()), size, 100)
+    
+    def run():
+        for read in reads:                                          # O(R * m * h)
+            quasi_map(read, salmon_index["index"], salmon_index["transcript_lengths"], salmon_index["kmer_size"],
+                      masked_index=salmon_index["masked_index"], rescue_max_postings=salmon_index["rescue_max_postings"])
+    return run, size, "reads"
+
+
+def setup_em_quantify(rng, size):
+    transcript_lengths = {"T" + str(i): rng.randint(500, 3000) for i in range(50)}
+    transcript_ids = list(transcript_lengths)
+    alignments_per_read = []
+    for _ in range(size):                                           # 1-4 compatible transcripts per read
+        hits = rng.sample(transcript_ids, rng.randint(1, 4))
+        alignments_per_read.append([{"transcript_id": tid, "score": 100} for tid in hits])
+    return (lambda: em_quantify(alignments_per_read, transcript_lengths)), size, "reads"
+
+
+def setup_read_fastq(rng, size):
+    handle, path = tempfile.mkstemp(suffix=".fq.gz")
+    os.close(handle)
+    with gzip.open(path, "wt") as f:
+        for read_index in range(size):
+            sequence = random_dna(rng, 100)
+            f.write("@read" + str(read_index) + "\n" + sequence + "\n+\n" + "I" * 100 + "\n")
+    return (lambda: read_fastq(path)), size, "reads", path
+
+
+KERNEL_CASES = {
+    'build_suffix_array':     (setup_build_suffix_array, [500, 1000, 2000, 4000]),
+    'build_occurrence_table': (setup_build_occurrence_table, [1000, 4000, 16000]),
+    'FM_backward_search':     (setup_fm_backward_search, [10, 25, 50, 100]),
+    'FM_backward_search_kmer_table': (setup_fm_backward_search_kmer_table, [10, 25, 50, 100]),
+    'smith_waterman':         (setup_smith_waterman, [25, 50, 100, 150]),
+    'count_mismatches':       (setup_count_mismatches, [100, 1000, 10000]),
+    'get_minimizers':         (setup_get_minimizers, [100, 1000, 10000]),
+    'quasi_map':              (setup_quasi_map, [10, 50, 200]),
+    'em_quantify':            (setup_em_quantify, [100, 1000, 10000]),
+    'read_fastq':             (setup_read_fastq, [1000, 10000, 50000]),
+}
+
+# =============================================================================
+# Timing
+# =============================================================================
+
+def calibrate_loops(run, min_time=BENCH_MIN_TIME):
+    """Smallest power of two of calls taking at least min_time (timer resolution and noise)."""
+    loops = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            run()
+        if (time.perf_counter_ns() - start) / 1e9 >= min_time or loops >= 1 << 20:
+            return loops
+        loops *= 2
+
+
+def time_case(run, repeats=BENCH_REPEATS, warmup=BENCH_WARMUP, min_time=BENCH_MIN_TIME):
+    """Run warmup + repeats timed repeats; returns the seconds per call of every repeat."""
+    for _ in range(warmup):
+        run()
+    loops = calibrate_loops(run, min_time)
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        for _ in range(loops):
+            run()
+        durations.append((time.perf_counter_ns() - start) / 1e9 / loops)
+    return durations
+
+
+def summarize(durations, work_units, unit):
+    """Median, IQR and throughput (work units per second at the median)."""
+    median = statistics.median(durations)
+    if len(durations) >= 2:
+        quartiles = statistics.quantiles(durations, n=4)
+        iqr = quartiles[2] - quartiles[0]
+    else:
+        iqr = 0.0
+    return {
+        'median_sec': median,
+        'iqr_sec': iqr,
+        'min_sec': min(durations),
+        'repeats': len(durations),
+        'work_units': work_units,
+        'unit': unit,
+        'throughput': work_units / median if median > 0 else 0.0
+    }
+
+
+def run_benchmarks(kernels=None, repeats=BENCH_REPEATS, seed=BENCH_SEED, max_sizes=None, min_time=BENCH_MIN_TIME):
+    """Benchmark the selected kernels; returns {"kernel/size": summary}."""
+    results = {}
+    for kernel in kernels or KERNEL_CASES:
+        setup, sizes = KERNEL_CASES[kernel]
+        for size in sizes[:max_sizes]:
+            rng = random.Random(seed + size)                        # same inputs on every run
+            case = setup(rng, size)
+            run, work_units, unit = case[:3]
+            try:
+                summary = summarize(time_case(run, repeats, min_time=min_time), work_units, unit)
+            finally:
+                if len(case) > 3:                                   # temporary input file
+                    os.remove(case[3])
+            results[kernel + "/" + str(size)] = summary
+            print("  %-30s median %10.6f s  IQR %10.6f s  %14.1f %s/s" % (
+                kernel + "/" + str(size), summary['median_sec'], summary['iqr_sec'], summary['throughput'], unit))
+    return results
+
+# =============================================================================
+# Baselines
+# =============================================================================
+
+def save_results(results, path, seed=BENCH_SEED):
+    """Write results with the environment they were measured in."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    document = {
+        'meta': {
+            'timestamp': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': seed
+        },
+        'results': results
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    """Read the results of save_results."""
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def compare_to_baseline(results, baseline, threshold_pct=REGRESSION_THRESHOLD_PCT):
+    """
+    Compare medians with the baseline. Returns the list of regressions as
+    (case, baseline_median, median, change_pct) where change_pct > threshold_pct.
+    """
+    regressions = []
+    for case, summary in results.items():
+        if case not in baseline:
+            print("  %-30s new case (no baseline)" % case)
+            continue
+        base_median = baseline[case]['median_sec']
+        change_pct = (summary['median_sec'] - base_median) / base_median * 100 if base_median > 0 else 0.0
+        status = "REGRESSION" if change_pct > threshold_pct else "ok"
+        print("  %-30s %10.6f -> %10.6f s  %+7.1f%%  %s" % (case, base_median, summary['median_sec'], change_pct, status))
+        if change_pct > threshold_pct:
+            regressions.append((case, base_median, summary['median_sec'], change_pct))
+    return regressions
+
+# =============================================================================
+# COMMAND-LINE ENTRY POINT
+# =============================================================================
+
+def main(argv=None):
+    """Run the benchmarks; returns 1 if any case regressed beyond the threshold."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Kernel micro-benchmarks with regression thresholds")
+    parser.add_argument('--kernels', nargs='+', choices=sorted(KERNEL_CASES), default=None,
+                        help="Kernels to run (default: all)")
+    parser.add_argument('--repeats', type=int, default=BENCH_REPEATS, help="Timed repeats per case (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=BENCH_SEED, help="Seed of the synthetic inputs (default: %(default)s)")
+    parser.add_argument('--min-time', type=float, default=BENCH_MIN_TIME,
+                        help="Minimum seconds per repeat; fast kernels are looped (default: %(default)s)")
+    parser.add_argument('--max-sizes', type=int, default=None, help="Only the first N sizes of each kernel (quick runs)")
+    parser.add_argument('--baseline', default=BENCH_BASELINE, help="Baseline JSON (default: %(default)s)")
+    parser.add_argument('--output', default=BENCH_RESULTS, help="Results JSON (default: %(default)s)")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD_PCT,
+                        help="Allowed median slowdown in percent (default: %(default)s)")
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the baseline")
+    args = parser.parse_args(argv)
+    
+    print("KERNEL BENCHMARKS (seed " + str(args.seed) + ", " + str(args.repeats) + " repeats)")
+    results = run_benchmarks(args.kernels, args.repeats, args.seed, args.max_sizes, args.min_time)
+    save_results(results, args.output, args.seed)
+    print("Results written to", args.output)
+    
+    if args.save_baseline:
+        save_results(results, args.baseline, args.seed)
+        print("Baseline written to", args.baseline)
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline at", args.baseline, "- run with --save-baseline first")
+        return 0
+    
+    print("Comparison with", args.baseline, "(threshold " + str(args.threshold) + "%)")
+    regressions = compare_to_baseline(results, load_results(args.baseline), args.threshold)
+    if regressions:
+        print(len(regressions), "case(s) regressed beyond", str(args.threshold) + "%")
+        return 1
+    print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,7 +7,9 @@ Runs test mode: Small subset of reads for algorithm analysis
 
 """
 
+import logging
 import os
+import resource
 import sys
 import time
 
@@ -15,15 +17,32 @@ import time
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Importing Functions
-from Utility_Functions.fastq_utils import read_fastq, read_fasta, write_alignments_to_sam
+from Utility_Functions.fastq_utils import iter_fastq, FASTQ_BATCH_SIZE
+from Utility_Functions.subsample_utils import sample_nested_subsets
+from Utility_Functions.read_store import ReadStore, is_read_store
+from Utility_Functions.alignment_writer import AlignmentWriter
+from Utility_Functions.parallel_utils import (
+    get_shared_state, fork_available, create_shared_pool, close_shared_pool, chunk_items
+)
+from Utility_Functions.pipeline_utils import run_pipeline
+from Utility_Functions.fasta_index import open_fasta, fetch_sequence, sequence_length
+from Utility_Functions.memory_profiler import MemoryProfiler, enable_memory_tracing
+from Utility_Functions.instrumentation import (
+    stage, take_stage_timings, merge_stage_timings, stage_columns, log_stage_timings, enable_profiling, profile_block,
+    take_operation_counts, add_operation_counts, operation_columns
+)
 from complexity_analysis import (
-    create_complexity_tracker, add_measurement, measure_memory_usage,
-    generate_full_report, generate_combined_comparison
+    create_complexity_tracker, add_measurement, generate_full_report, generate_combined_comparison, export_worker_stats
 )
 from Utility_Functions.shared_utils import reverse_complement
+from Utility_Functions.index_budget import set_index_memory_budget, salmon_posting_compression, IndexBudgetError
+from Utility_Functions.seed_index import set_seed_index, get_seed_index, build_seed_index, SEED_BACKENDS, SEED_KMER, MAX_KMER
 from Aln_Algorithm_Functions.hisat_alignment import hisat_align
 from Aln_Algorithm_Functions.bowtie_alignment import bowtie2_align
-from Aln_Algorithm_Functions.salmon_saf_alignment import salmon_quantify
+from Aln_Algorithm_Functions.salmon_saf_alignment import (
+    run_salmon_index, run_salmon_quant, run_salmon_map, load_salmon_index, map_reads_parallel,
+    merge_equivalence_classes, em_quantify_equivalence_classes
+)
 
 # =============================================================================
 # CONFIGURATION
@@ -32,6 +51,7 @@ from Aln_Algorithm_Functions.salmon_saf_alignment import salmon_quantify
 # Input files
 FASTQ_R1 = "test_inputs/SRR3884686_1_val_1.fq.gz"
 FASTQ_R2 = "test_inputs/SRR3884686_2_val_2.fq.gz"
+READ_STORE_R1 = "test_inputs/SRR3884686_1_val_1.readstore"  # packed copy of FASTQ_R1 (read_store.py), used if present
 
 # Reference options (change as needed)
 REFERENCE_FASTA = "test_inputs/All_Smel_Genes.fasta"
@@ -40,6 +60,22 @@ REFERENCE_FASTA = "test_inputs/All_Smel_Genes.fasta"
 TEST_SIZES = [10, 50, 100, 200, 500]
 TEST_REF_LIMIT = 10000
 TEST_TRANSCRIPT_LIMIT = 10  # Number of transcripts for Salmon test
+TEST_SAMPLING = "auto"      # "auto" (a read store uniformly by index, a FASTQ by head), "reservoir" (uniform; a FASTQ is read in full) or "head" (first N reads)
+TEST_SEED = 42              # Fixed seed so every run measures the same reads
+TEST_OUTPUT_FORMAT = "sam"  # "sam" or "bam" (BGZF-compressed, no samtools conversion needed)
+TEST_WORKERS = 1            # Aligner worker processes (fork; the FM-index is inherited, not pickled)
+TRACE_MEMORY = False        # Also run tracemalloc: per-stage Python peaks and top allocation sites (slower)
+PROFILE_DIR = None          # Directory for cProfile .prof files of every run (None: no cProfile)
+LOG_LEVEL = "INFO"          # DEBUG also logs every per-read aligner step
+INDEX_MEMORY_MB = None      # Index memory budget: SA sampling, occ checkpoints and posting width chosen to fit
+SEED_INDEX = "fm"           # HISAT/Bowtie2 seeding backend: "fm" (backward search) or "hash" (k-mer table)
+
+# Operations column of each tracker: the kernel counter (ops_<name>) that dominates the aligner's cost
+PRIMARY_OPERATIONS = {
+    'HISAT': 'backward_search_steps',   # seed lookups (seed_hash_probes with the hash seed index)
+    'Bowtie2': 'dp_cells',              # Smith-Waterman cells
+    'Salmon': 'postings_scanned',       # minimizer postings read while mapping (EM iterations: ops_em_iterations)
+}
 
 # =============================================================================
 # HELPER FUNCTIONS
@@ -51,16 +87,114 @@ def ensure_dir(directory):
         os.makedirs(directory)
 
 
+def sampling_source(reads_path):
+    """
+    Reads to subsample: a read store is opened for random access (known count, only the sampled
+    reads are decoded); a FASTQ is streamed, so only "reservoir" sampling reads the whole file.
+    """
+    if is_read_store(reads_path):
+        return ReadStore(reads_path)
+    return iter_fastq(reads_path)
+
+
+def primary_operations(algorithm, profile_stats):
+    """
+    Operations of a run in the one work unit that dominates its aligner (PRIMARY_OPERATIONS).
+    The ops_<name> columns count different units (LF steps, DP cells, postings), so they are
+    kept as separate columns and never summed.
+    """
+    name = PRIMARY_OPERATIONS[algorithm]
+    if name == 'backward_search_steps' and get_seed_index()[0] == 'hash':
+        name = 'seed_hash_probes'
+    return profile_stats.get('ops_' + name, 0)
+
+
 # =============================================================================
 # A Single Implementation of Alignment Test Runner
 # =============================================================================
 
-def run_alignment_test(reads, reference, ref_name, output_dir, aligner_name, align_func, align_kwargs=None, try_reverse=False, progress_interval=50):
+def align_read_record(read, reference, align_func, align_kwargs, try_reverse):
+    """Align one FastqRecord and build its output record (best hit or unmapped)."""
+    seq = read.sequence
+    
+    # Run alignment
+    alns = align_func(seq, reference, **align_kwargs)
+    
+    # Try reverse complement if requested and no alignment found
+    if len(alns) == 0 and try_reverse:
+        rc_seq = reverse_complement(seq)
+        alns = align_func(rc_seq, reference, **align_kwargs)
+    
+    if len(alns) > 0:
+        best = alns[0]
+        return {
+            'read_id': read.id,
+            'position': best['position'],
+            'cigar': best['cigar'],
+            'mapq': best.get('mapq', min(60, best.get('score', 60))),
+            'sequence': seq,
+            'quality': read.quality,
+            'unmapped': False
+        }
+    return {
+        'read_id': read.id,
+        'sequence': seq,
+        'quality': read.quality,
+        'unmapped': True
+    }
+
+
+def _align_read_chunk(chunk):
+    """
+    Pool worker: align a chunk of reads against the inherited reference/index.
+    Returns the records plus this chunk's wall time, CPU time, stage timings and the worker's peak RSS.
+    """
+    state = get_shared_state()
+    take_stage_timings()                                                # drop anything inherited or left over
+    take_operation_counts()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start_time = time.time()
+    records = []
+    for read in chunk:
+        records.append(align_read_record(read, state['reference'], state['align_func'],
+                                         state['align_kwargs'], state['try_reverse']))
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    stats = {
+        'pid': os.getpid(),
+        'reads': len(chunk),
+        'runtime': time.time() - start_time,
+        'user_time': usage_after.ru_utime - usage_before.ru_utime,
+        'system_time': usage_after.ru_stime - usage_before.ru_stime,
+        'max_rss_kb': usage_after.ru_maxrss,
+        'stage_timings': take_stage_timings(),
+        'operation_counts': take_operation_counts()
+    }
+    return records, stats
+
+
+def merge_worker_stats(chunk_stats):
+    """Combine per-chunk stats into one entry per worker process."""
+    workers = {}
+    for stats in chunk_stats:
+        entry = workers.setdefault(stats['pid'], {'pid': stats['pid'], 'chunks': 0, 'reads': 0, 'runtime': 0.0,
+                                                  'user_time': 0.0, 'system_time': 0.0, 'max_rss_kb': 0})
+        entry['chunks'] += 1
+        entry['reads'] += stats['reads']
+        entry['runtime'] += stats['runtime']
+        entry['user_time'] += stats['user_time']
+        entry['system_time'] += stats['system_time']
+        entry['max_rss_kb'] = max(entry['max_rss_kb'], stats['max_rss_kb'])
+    return sorted(workers.values(), key=lambda entry: entry['pid'])
+
+
+def run_alignment_test(reads, reference, ref_name, output_dir, aligner_name, align_func, align_kwargs=None, try_reverse=False, progress_interval=50,
+                       writer=None, write_interval=1000, keep_alignments=True, index_builder=None, workers=1, chunk_size=None, worker_stats=None,
+                       shared_index=None, profile_stats=None):
     """
     Generic alignment test runner.
     
     Args:
-        reads:              List of read dictionaries with 'id', 'sequence', 'quality' keys
+        reads:              Iterable of FastqRecord objects (list or stream from iter_fastq)
         reference:          Reference sequence string
         ref_name:           Reference name for output
         output_dir:         Output directory path
@@ -69,65 +203,140 @@ def run_alignment_test(reads, reference, ref_name, output_dir, aligner_name, ali
         align_kwargs:       Additional keyword arguments for align_func (default: None)
         try_reverse:        Whether to try reverse complement if no alignment found (default: False)
         progress_interval:  Print progress every N reads (default: 50)
+        writer:             AlignmentWriter receiving records incrementally (default: None)
+        write_interval:     Hand records to the writer every N reads (default: 1000)
+        keep_alignments:    Also return the alignment list; False keeps memory constant for streamed input (default: True)
+        index_builder:      Builds the shared index once, passed to align_func as fm_index (default: None)
+        workers:            Number of forked worker processes; 1 aligns in this process (default: 1)
+        chunk_size:         Reads per worker task (default: progress_interval)
+        worker_stats:       List that receives one runtime/RSS entry per worker process (default: None)
+        shared_index:       Prebuilt index used instead of index_builder, e.g. across incremental steps (default: None)
+        profile_stats:      Dict that receives the profile columns: stage timings, memory peaks, top sites (default: None)
     
     Returns:
-        Tuple of (alignments, runtime, memory_mb)
+        Tuple of (alignments, runtime, memory_mb); memory_mb is the peak RSS above the RSS at the start.
+        With workers > 1 the memory is the parent's, worker peaks are in worker_stats.
+        runtime is the wall time without the final flush, which runs after alignment has finished.
+        Batches written on the writer thread overlap alignment and stay in the runtime; their time
+        plus the final flush (SAM formatting, BAM encoding, handing BGZF blocks over) is reported
+        on its own as write_sec in profile_stats, and the final flush as flush_sec
     """
     if align_kwargs is None:
         align_kwargs = {}
-    
-    
-    # Measure initial memory
-    mem_before = measure_memory_usage()
-    start_time = time.time()
+    if chunk_size is None:
+        chunk_size = progress_interval
+    if workers > 1 and not fork_available():
+        print("  fork is not available; aligning with 1 worker")
+        workers = 1
     
     alignments = []
-    aligned_count = 0
-    
-    for i, read in enumerate(reads):
-        seq = read['sequence']
+    chunk_stats = []
+    totals = {'reads': 0, 'aligned': 0, 'unwritten': [], 'write_sec': 0.0, 'flush_sec': 0.0}
+    total_reads = len(reads) if hasattr(reads, '__len__') else '?'
+    
+    def align_chunk_here(chunk):
+        return [align_read_record(read, reference, align_func, align_kwargs, try_reverse) for read in chunk], None
+    
+    def write_unwritten(flush=False):
+        """Write stage: hand the pending records to the writer; returns the seconds it took."""
+        write_start = time.perf_counter()
+        with stage("write"):
+            writer.write_batch(totals['unwritten'], ref_name)
+            if flush:
+                writer.flush()
+        write_sec = time.perf_counter() - write_start
+        totals['write_sec'] += write_sec
+        totals['unwritten'] = []
+        return write_sec
+    
+    def consume_chunk(result):
+        """Writer stage: count, keep and write one aligned chunk (runs on the writer thread)."""
+        records, stats = result
+        if stats is not None:
+            chunk_stats.append(stats)
+        reads_before = totals['reads']
+        totals['reads'] += len(records)
+        totals['aligned'] += sum(1 for record in records if not record['unmapped'])
+        if keep_alignments:
+            alignments.extend(records)
+        if writer is not None:
+            totals['unwritten'].extend(records)
+            if len(totals['unwritten']) >= write_interval:
+                write_unwritten()
         
-        # Run alignment
-        alns = align_func(seq, reference, **align_kwargs)
-        
-        # Try reverse complement if requested and no alignment found
-        if len(alns) == 0 and try_reverse:
-            rc_seq = reverse_complement(seq)
-            alns = align_func(rc_seq, reference, **align_kwargs)
+        # Progress indicator
+        if totals['reads'] // progress_interval > reads_before // progress_interval:
+            print("    Processed", totals['reads'], "/", total_reads, "reads...")
+    
+    # Peak memory is sampled, stages are timed and kernel operations counted for the whole run
+    take_stage_timings()
+    take_operation_counts()
+    profiler = MemoryProfiler().start()
+    start_time = time.time()
+    pool = None
+    completed = False
+    try:
+        # Index is built once and shared by every read (workers inherit it through fork)
+        if shared_index is not None:
+            align_kwargs = dict(align_kwargs, fm_index=shared_index)
+        elif index_builder is not None:
+            align_kwargs = dict(align_kwargs, fm_index=index_builder(reference))
         
-        if len(alns) > 0:
-            best = alns[0]
-            aligned_count += 1
-            alignments.append({
-                'read_id': read['id'],
-                'position': best['position'],
-                'cigar': best['cigar'],
-                'mapq': best.get('mapq', min(60, best.get('score', 60))),
-                'sequence': seq,
-                'quality': read.get('quality', '*'),
-                'unmapped': False
-            })
-        else:
-            alignments.append({
-                'read_id': read['id'],
-                'sequence': seq,
-                'quality': read.get('quality', '*'),
-                'unmapped': True
-            })
+        # Reader thread -> aligner (this process or the pool) -> writer thread, over bounded queues
+        if workers > 1:
+            pool = create_shared_pool(workers, {'reference': reference, 'align_func': align_func,
+                                                'align_kwargs': align_kwargs, 'try_reverse': try_reverse})
+        with profile_block(aligner_name.lower() + "_" + str(total_reads)):
+            run_pipeline(chunk_items(reads, chunk_size), _align_read_chunk if pool is not None else align_chunk_here,
+                         consume_chunk, pool, max_in_flight=2 * workers)
         
-        # Progress indicator
-        if (i + 1) % progress_interval == 0:
-            print("    Processed", i + 1, "/", len(reads), "reads...")
+        if writer is not None:
+            totals['flush_sec'] = write_unwritten(flush=True)              # serial: alignment has finished
+        completed = True
+    finally:
+        if pool is not None:
+            close_shared_pool(pool, terminate=not completed)
+        profiler.stop()
+    read_count = totals['reads']
+    aligned_count = totals['aligned']
     
     end_time = time.time()
-    runtime = end_time - start_time
-    
-    # Measure memory
-    mem_after = measure_memory_usage()
-    memory_used = max(0, mem_after - mem_before)
-    
-    print("  Aligned:", aligned_count, "/", len(reads), "reads")
+    runtime = end_time - start_time - totals['flush_sec']                  # overlapped writes stay in, they share the wall time
+    
+    # Peak RSS rather than an after - before delta (freed memory is reused by the allocator)
+    memory_used = profiler.peak_delta_mb
+    
+    # Stage times of this process plus those returned by the workers (summed over workers)
+    timings = take_stage_timings()
+    for stats in chunk_stats:
+        merge_stage_timings(timings, stats['stage_timings'])
+        add_operation_counts(stats['operation_counts'])
+    operation_counts = take_operation_counts()
+    if profile_stats is not None:
+        profile_stats['reference_length'] = len(reference)                 # second variable for complexity fits
+        profile_stats['write_sec'] = totals['write_sec']
+        profile_stats['flush_sec'] = totals['flush_sec']
+        profile_stats.update(operation_columns(operation_counts))
+        profile_stats.update(stage_columns(timings))
+        profile_stats.update(profiler.summary())
+    
+    print("  Aligned:", aligned_count, "/", read_count, "reads")
     print("  Runtime:", round(runtime, 4), "seconds")
+    if writer is not None:
+        print("  Write:", round(totals['write_sec'], 4), "seconds, final flush",
+              round(totals['flush_sec'], 4), "seconds (not in the runtime)")
+    print("  Peak memory:", round(memory_used, 4), "MB above start")
+    print("  Operations:", sum(operation_counts.values()), operation_counts)
+    log_stage_timings(timings)
+    if pool is not None:
+        per_worker = merge_worker_stats(chunk_stats)
+        for entry in per_worker:
+            entry['input_size'] = read_count
+            entry['workers'] = workers
+            print("    Worker", entry['pid'], ":", entry['reads'], "reads,", round(entry['runtime'], 4), "s,",
+                  entry['max_rss_kb'], "KB peak RSS")
+        if worker_stats is not None:
+            worker_stats.extend(per_worker)
     
     return alignments, runtime, memory_used
 
@@ -136,84 +345,146 @@ def run_alignment_test(reads, reference, ref_name, output_dir, aligner_name, ali
 # Aligner Wrapper per Alignment Algorithm
 # =============================================================================
 
-def run_hisat_test(reads, reference, ref_name, output_dir):
-    """Run HISAT alignment test on a set of reads."""
+def run_hisat_test(reads, reference, ref_name, output_dir, writer=None, **run_options):
+    """Run HISAT alignment test on a set of reads (run_options go to run_alignment_test)."""
     return run_alignment_test(
         reads, reference, ref_name, output_dir,
         aligner_name="HISAT",
         align_func=hisat_align,
         align_kwargs={'max_mismatches': 2},
-        try_reverse=True
+        try_reverse=True,
+        writer=writer,
+        index_builder=build_seed_index,
+        **run_options
     )
 
 
-def run_bowtie2_test(reads, reference, ref_name, output_dir):
-    """Run Bowtie2 alignment test on a set of reads."""
+def run_bowtie2_test(reads, reference, ref_name, output_dir, writer=None, **run_options):
+    """Run Bowtie2 alignment test on a set of reads (run_options go to run_alignment_test)."""
     return run_alignment_test(
         reads, reference, ref_name, output_dir,
         aligner_name="Bowtie2",
         align_func=bowtie2_align,
         align_kwargs={'seed_len': 15},
-        try_reverse=False
+        try_reverse=False,
+        writer=writer,
+        index_builder=build_seed_index,
+        **run_options
     )
 
 
-def run_salmon_test(reads, transcripts, output_dir):
+ALIGNER_TESTS = {'hisat': run_hisat_test, 'bowtie2': run_bowtie2_test}
+
+
+def run_salmon_index_test(transcripts, output_dir, index_file=None, kmer_size=15, profile_stats=None):
     """
-    Run Salmon quantification test on a set of reads.
+    Build and serialize the Salmon index once (the `salmon index` stage).
+    profile_stats (dict) receives the stage timing and memory profile columns.
     
     Returns:
-        Tuple of (tpm_results, runtime, memory_mb)
+        Tuple of (index_file, runtime, memory_mb)
     """
-    print("  Running Salmon quantification on", len(reads), "reads...")
-    
-    mem_before = measure_memory_usage()
-    start_time = time.time()
-    
-    # Extract just sequences for Salmon
-    read_sequences = []
-    for read in reads:
-        read_sequences.append(read['sequence'])
-    
-    # Run quantification
-    tpm = salmon_quantify(read_sequences, transcripts, kmer_size=15)
-    
-    end_time = time.time()
-    runtime = end_time - start_time
+    print("  Building Salmon index for", len(transcripts), "transcripts...")
+    if index_file is None:
+        index_file = os.path.join(output_dir, "salmon_index.bin")
+    
+    take_stage_timings()
+    with MemoryProfiler() as profiler, profile_block("salmon_index"):
+        start_time = time.time()
+        run_salmon_index(transcripts, index_file, kmer_size=kmer_size,
+                         compact_postings=salmon_posting_compression(transcripts))
+        runtime = time.time() - start_time
+    
+    memory_used = profiler.peak_delta_mb
+    if profile_stats is not None:
+        profile_stats.update(stage_columns(take_stage_timings()))
+        profile_stats.update(profiler.summary())
+    print("  Index runtime:", round(runtime, 4), "seconds")
+    
+    return index_file, runtime, memory_used
+
+
+def run_salmon_test(reads, index_file, output_dir, workers=1, chunk_size=1000, online_batch_size=None, profile_stats=None):
+    """
+    Run Salmon quantification test on a set of reads (the `salmon quant` stage).
+    profile_stats (dict) receives the stage timing and memory profile columns (index_load, mapping, em).
     
-    mem_after = measure_memory_usage()
-    memory_used = max(0, mem_after - mem_before)
+    Returns:
+        Tuple of (tpm_results, runtime, memory_mb)
+    """
+    print("  Running Salmon quantification on", len(reads) if hasattr(reads, '__len__') else "all", "reads...")
     
-    # Count transcripts with expression
-    expressed = sum(1 for t in tpm.values() if t > 0)
+    take_stage_timings()
+    take_operation_counts()
+    with MemoryProfiler() as profiler, profile_block("salmon_quant_" + str(len(reads) if hasattr(reads, '__len__') else "stream")):
+        start_time = time.time()
+        
+        # Run quantification against the serialized index (records are streamed, not copied)
+        tpm = run_salmon_quant(reads, index_file, online_batch_size=online_batch_size, workers=workers, chunk_size=chunk_size)
+        
+        end_time = time.time()
+        runtime = end_time - start_time
+    
+    memory_used = profiler.peak_delta_mb
+    timings = take_stage_timings()
+    operation_counts = take_operation_counts()
+    if profile_stats is not None:
+        profile_stats.update(operation_columns(operation_counts))
+        profile_stats.update(stage_columns(timings))
+        profile_stats.update(profiler.summary())
+    print("  Operations:", sum(operation_counts.values()), operation_counts)
+    log_stage_timings(timings)
     
     return tpm, runtime, memory_used
 
 
+def write_quant_tsv(tpm, tpm_file):
+    """Write transcript TPM values, highest first."""
+    with open(tpm_file, 'w') as f:
+        f.write("transcript_id\tTPM\n")
+        for tid, val in sorted(tpm.items(), key=lambda x: x[1], reverse=True):
+            f.write(tid + "\t" + str(round(val, 4)) + "\n")
+
+
+def select_transcripts(transcripts, limit=None, max_length=None):
+    """Fetch the first `limit` transcripts (all if None), each truncated to max_length bp."""
+    selected = {}
+    for tid in transcripts:
+        if limit is not None and len(selected) >= limit:
+            break
+        selected[tid] = fetch_sequence(transcripts, tid, 0, max_length)
+    return selected
+
+
 # =============================================================================
 # MAIN TEST FUNCTION
 # =============================================================================
 
-def get_output_dirs():
-    """Get output directories for test mode."""
+def get_output_dirs(mode="test"):
+    """Get output directories for test or production mode."""
     return {
-        'hisat': "Outputs/HISAT/python_test",
-        'bowtie': "Outputs/Bowtie/python_test",
-        'salmon': "Outputs/Salmon_Saf/python_test",
-        'combined': "Outputs/python_test_comparison"
+        'hisat': "Outputs/HISAT/python_" + mode,
+        'bowtie': "Outputs/Bowtie/python_" + mode,
+        'salmon': "Outputs/Salmon_Saf/python_" + mode,
+        'combined': "Outputs/python_" + mode + "_comparison"
     }
 
 
-def run_test_mode(transcripts, reference, ref_name):
+def run_test_mode(transcripts, ref_name, reads_path=None, sizes=None, sampling=TEST_SAMPLING, seed=TEST_SEED,
+                  workers=TEST_WORKERS, output_format=TEST_OUTPUT_FORMAT):
     """Run test mode: small subset for algorithm analysis."""
-    dirs = get_output_dirs()
+    if sizes is None:
+        sizes = TEST_SIZES
+    if reads_path is None:
+        reads_path = READ_STORE_R1 if os.path.isdir(READ_STORE_R1) else FASTQ_R1
+    dirs = get_output_dirs("test")
     
     for d in dirs.values():
         ensure_dir(d)
     
-    # Truncate reference for test mode
-    if len(reference) > TEST_REF_LIMIT:
-        reference = reference[:TEST_REF_LIMIT]
+    # Truncate reference for test mode (only the needed slice is read from disk)
+    reference = fetch_sequence(transcripts, ref_name, 0, TEST_REF_LIMIT)
+    if sequence_length(transcripts, ref_name) > TEST_REF_LIMIT:
         print("Truncated reference to", TEST_REF_LIMIT, "bp for test mode")
     
     # Create complexity trackers
@@ -223,101 +494,503 @@ def run_test_mode(transcripts, reference, ref_name):
     bowtie2_tracker['algorithm'] = 'Bowtie2'
     salmon_tracker = create_complexity_tracker()
     salmon_tracker['algorithm'] = 'Salmon'
+    salmon_index_tracker = create_complexity_tracker()
+    salmon_index_tracker['algorithm'] = 'Salmon index'
+    hisat_worker_stats = []
+    bowtie2_worker_stats = []
     
     # Prepare test transcripts for Salmon
-    test_transcripts = {}
-    count = 0
-    for tid in transcripts:
-        if count >= TEST_TRANSCRIPT_LIMIT:
-            break
-        test_transcripts[tid] = transcripts[tid][:5000]
-        count += 1
+    test_transcripts = select_transcripts(transcripts, TEST_TRANSCRIPT_LIMIT, 5000)
+    
+    # Salmon index is built once and reloaded for every test size
+    print("Salmon Index")
+    profile_stats = {}
+    salmon_index_file, runtime, memory = run_salmon_index_test(test_transcripts, dirs['salmon'], profile_stats=profile_stats)
+    add_measurement(salmon_index_tracker, len(test_transcripts), runtime, memory,
+                   sum(len(seq) for seq in test_transcripts.values()), str(len(test_transcripts)) + " transcripts",
+                   profile_stats)
+    
+    # Build every test size in one pass over the reads (nested subsets); the packed store skips gzip parsing
+    print("Sampling", sizes, "reads from", reads_path, "(" + sampling + ", seed " + str(seed) + ")")
+    read_subsets = sample_nested_subsets(sampling_source(reads_path), sizes, seed, sampling)
     
     # Run tests for each size
-    for num_reads in TEST_SIZES:
+    for num_reads in sizes:
         print("Testing with", num_reads, "reads")
         
-        reads = read_fastq(FASTQ_R1, max_reads=num_reads)
+        reads = read_subsets[num_reads]
         print("Loaded", len(reads), "reads")
         
         if len(reads) == 0:
             continue
         
-        # HISAT
+        # HISAT (records are streamed to the writer as batches finish)
         print("HISAT Test")
-        alns, runtime, memory = run_hisat_test(reads, reference, ref_name, dirs['hisat'])
-        add_measurement(hisat_tracker, len(reads), runtime, memory, 
-                       len(reads) * len(reference), str(len(reads)) + " reads")
-        sam_file = os.path.join(dirs['hisat'], "alignments_" + str(num_reads) + ".sam")
-        write_alignments_to_sam(sam_file, alns, ref_name, len(reference))
+        sam_file = os.path.join(dirs['hisat'], "alignments_" + str(num_reads) + "." + output_format)
+        with AlignmentWriter(sam_file, [(ref_name, len(reference))], output_format) as writer:
+            profile_stats = {}
+            alns, runtime, memory = run_hisat_test(reads, reference, ref_name, dirs['hisat'], writer, workers=workers,
+                                                   worker_stats=hisat_worker_stats, keep_alignments=False,
+                                                   profile_stats=profile_stats)
+        add_measurement(hisat_tracker, len(reads), runtime, memory,
+                       primary_operations(hisat_tracker['algorithm'], profile_stats), str(len(reads)) + " reads",
+                       profile_stats)
         
         # Bowtie2
         print("Bowtie2 Test")
-        alns, runtime, memory = run_bowtie2_test(reads, reference, ref_name, dirs['bowtie'])
+        sam_file = os.path.join(dirs['bowtie'], "alignments_" + str(num_reads) + "." + output_format)
+        with AlignmentWriter(sam_file, [(ref_name, len(reference))], output_format) as writer:
+            profile_stats = {}
+            alns, runtime, memory = run_bowtie2_test(reads, reference, ref_name, dirs['bowtie'], writer, workers=workers,
+                                                     worker_stats=bowtie2_worker_stats, keep_alignments=False,
+                                                     profile_stats=profile_stats)
         add_measurement(bowtie2_tracker, len(reads), runtime, memory,
-                       len(reads) * len(reference), str(len(reads)) + " reads")
-        sam_file = os.path.join(dirs['bowtie'], "alignments_" + str(num_reads) + ".sam")
-        write_alignments_to_sam(sam_file, alns, ref_name, len(reference))
+                       primary_operations(bowtie2_tracker['algorithm'], profile_stats), str(len(reads)) + " reads",
+                       profile_stats)
         
         # Salmon
         print("Salmon Test")
-        tpm, runtime, memory = run_salmon_test(reads, test_transcripts, dirs['salmon'])
+        profile_stats = {}
+        tpm, runtime, memory = run_salmon_test(reads, salmon_index_file, dirs['salmon'], workers=workers,
+                                               profile_stats=profile_stats)
         add_measurement(salmon_tracker, len(reads), runtime, memory,
-                       len(reads) * len(test_transcripts), str(len(reads)) + " reads")
-        tpm_file = os.path.join(dirs['salmon'], "quant_" + str(num_reads) + ".tsv")
-        with open(tpm_file, 'w') as f:
-            f.write("transcript_id\tTPM\n")
-            for tid, val in sorted(tpm.items(), key=lambda x: x[1], reverse=True):
-                f.write(tid + "\t" + str(round(val, 4)) + "\n")
+                       primary_operations(salmon_tracker['algorithm'], profile_stats), str(len(reads)) + " reads",
+                       profile_stats)
+        write_quant_tsv(tpm, os.path.join(dirs['salmon'], "quant_" + str(num_reads) + ".tsv"))
     
     # Generate reports
     print("GENERATING COMPLEXITY REPORTS")
     generate_full_report(hisat_tracker, dirs['hisat'])
     generate_full_report(bowtie2_tracker, dirs['bowtie'])
     generate_full_report(salmon_tracker, dirs['salmon'])
+    generate_full_report(salmon_index_tracker, os.path.join(dirs['salmon'], 'index'))
+    if workers > 1:
+        export_worker_stats(hisat_worker_stats, os.path.join(dirs['hisat'], 'worker_stats.csv'))
+        export_worker_stats(bowtie2_worker_stats, os.path.join(dirs['bowtie'], 'worker_stats.csv'))
     generate_combined_comparison([hisat_tracker, bowtie2_tracker, salmon_tracker], dirs['combined'])
     
     return dirs
 
 
-def run_all_tests():
-    """Run alignment tests in test mode."""
+# =============================================================================
+# INCREMENTAL TEST MODE
+#       The test sizes are nested prefixes, so each step aligns only the reads
+#       added since the previous size. Tracker runtime/memory are cumulative
+#       (comparable to test mode); the marginal step cost goes in extra columns.
+# =============================================================================
+
+def incremental_extra(step_reads, step_runtime, step_memory, cumulative_runtime, cumulative_memory):
+    """Extra CSV columns of one incremental step."""
+    return {
+        'mode': 'incremental',
+        'marginal_reads': step_reads,
+        'marginal_runtime_sec': step_runtime,
+        'marginal_memory_mb': step_memory,
+        'cumulative_runtime_sec': cumulative_runtime,
+        'cumulative_memory_mb': cumulative_memory
+    }
+
+
+def run_incremental_mode(transcripts, ref_name, reads_path=None, sizes=None, sampling=TEST_SAMPLING, seed=TEST_SEED,
+                         workers=TEST_WORKERS, output_format=TEST_OUTPUT_FORMAT):
+    """Run incremental test mode: align only the delta reads at every size."""
+    sizes = sorted(sizes if sizes is not None else TEST_SIZES)
+    if reads_path is None:
+        reads_path = READ_STORE_R1 if os.path.isdir(READ_STORE_R1) else FASTQ_R1
+    dirs = get_output_dirs("incremental")
+    
+    for d in dirs.values():
+        ensure_dir(d)
+    
+    reference = fetch_sequence(transcripts, ref_name, 0, TEST_REF_LIMIT)
+    references = [(ref_name, len(reference))]
+    test_transcripts = select_transcripts(transcripts, TEST_TRANSCRIPT_LIMIT, 5000)
+    
+    print("Sampling", sizes, "reads from", reads_path, "(" + sampling + ", seed " + str(seed) + ")")
+    read_subsets = sample_nested_subsets(sampling_source(reads_path), sizes, seed, sampling)
+    all_reads = read_subsets[sizes[-1]]
+    
+    trackers = []
+    for aligner, output_dir in (('hisat', dirs['hisat']), ('bowtie2', dirs['bowtie'])):
+        print(aligner.upper(), "Incremental Test")
+        tracker = create_complexity_tracker()
+        tracker['algorithm'] = 'HISAT' if aligner == 'hisat' else 'Bowtie2'
+        
+        # Index once; its cost counts towards every cumulative value. Cumulative memory is the
+        # highest profiled peak RSS so far (index build and every step) above the RSS before the build
+        with MemoryProfiler() as profiler:
+            start_time = time.time()
+            fm_index = build_seed_index(reference)
+            cumulative_runtime = time.time() - start_time
+        mem_baseline = profiler.baseline_mb
+        cumulative_memory = profiler.peak_delta_mb
+        
+        sam_file = os.path.join(output_dir, "alignments_incremental." + output_format)
+        done = 0
+        cumulative_operations = 0
+        with AlignmentWriter(sam_file, references, output_format) as writer:
+            for num_reads in sizes:                                         # each read is aligned exactly once
+                delta = all_reads[done:min(num_reads, len(all_reads))]
+                if not delta:
+                    continue
+                print("Step to", done + len(delta), "reads (+" + str(len(delta)) + ")")
+                profile_stats = {}
+                alns, step_runtime, step_memory = ALIGNER_TESTS[aligner](delta, reference, ref_name, output_dir, writer,
+                                                                         workers=workers, keep_alignments=False,
+                                                                         shared_index=fm_index, profile_stats=profile_stats)
+                done += len(delta)
+                cumulative_runtime += step_runtime
+                cumulative_memory = max(cumulative_memory, profile_stats['peak_rss_mb'] - mem_baseline)
+                cumulative_operations += primary_operations(tracker['algorithm'], profile_stats)
+                add_measurement(tracker, done, cumulative_runtime, cumulative_memory, cumulative_operations,
+                               str(done) + " reads",
+                               dict(incremental_extra(len(delta), step_runtime, step_memory, cumulative_runtime,
+                                                      cumulative_memory), **profile_stats))
+        generate_full_report(tracker, output_dir)
+        trackers.append(tracker)
+    
+    # Salmon: mapping is additive over reads; the EM is rerun over the accumulated classes at each step
+    print("Salmon Incremental Test")
+    salmon_tracker = create_complexity_tracker()
+    salmon_tracker['algorithm'] = 'Salmon'
+    salmon_index_file, _, _ = run_salmon_index_test(test_transcripts, dirs['salmon'])
+    with MemoryProfiler() as profiler:
+        start_time = time.time()
+        salmon_index = load_salmon_index(salmon_index_file)
+        mapping_runtime = time.time() - start_time
+    mem_baseline = profiler.baseline_mb
+    cumulative_memory = profiler.peak_delta_mb
+    eq_counts = {}
+    done = 0
+    mapping_operations = 0
+    for num_reads in sizes:
+        delta = all_reads[done:min(num_reads, len(all_reads))]
+        if not delta:
+            continue
+        take_stage_timings()
+        take_operation_counts()
+        with MemoryProfiler() as profiler:
+            start_time = time.time()
+            for _, partial_counts in map_reads_parallel(delta, salmon_index, workers):
+                merge_equivalence_classes(eq_counts, partial_counts)
+            map_runtime = time.time() - start_time
+            tpm = em_quantify_equivalence_classes(eq_counts, salmon_index["transcript_lengths"],
+                                                  salmon_index["effective_lengths"])
+            step_runtime = time.time() - start_time
+        step_memory = profiler.peak_delta_mb
+        done += len(delta)
+        mapping_runtime += map_runtime
+        cumulative_runtime = mapping_runtime + (step_runtime - map_runtime)  # all mapping so far + one EM
+        cumulative_memory = max(cumulative_memory, profiler.peak_mb - mem_baseline)
+        operation_counts = take_operation_counts()
+        mapping_operations += operation_counts.get(PRIMARY_OPERATIONS['Salmon'], 0)  # every read is mapped once
+        add_measurement(salmon_tracker, done, cumulative_runtime, cumulative_memory, mapping_operations,
+                       str(done) + " reads",
+                       dict(incremental_extra(len(delta), step_runtime, step_memory, cumulative_runtime, cumulative_memory),
+                            **operation_columns(operation_counts), **stage_columns(take_stage_timings()),
+                            **profiler.summary()))
+        write_quant_tsv(tpm, os.path.join(dirs['salmon'], "quant_" + str(done) + ".tsv"))
+    generate_full_report(salmon_tracker, dirs['salmon'])
+    trackers.append(salmon_tracker)
+    
+    generate_combined_comparison(trackers, dirs['combined'])
+    return dirs
+
+
+# =============================================================================
+# PRODUCTION MODE
+#       Streams the whole FASTQ (or read store) through each aligner once;
+#       nothing proportional to the number of reads is kept in memory.
+# =============================================================================
+
+def run_production_mode(transcripts, ref_name, reads_path=None, workers=1, batch_size=FASTQ_BATCH_SIZE,
+                        output_format=TEST_OUTPUT_FORMAT, ref_limit=None, transcript_limit=None, max_reads=None):
+    """Run production mode: every read, streamed, one measurement per aligner."""
+    if reads_path is None:
+        reads_path = FASTQ_R1
+    dirs = get_output_dirs("production")
     
-    print("ALIGNMENT ALGORITHM TESTING")
-    print("Input FASTQ:", FASTQ_R1)
-    print("Reference:", REFERENCE_FASTA)
+    for d in dirs.values():
+        ensure_dir(d)
     
-    ensure_dir("logs")
+    reference = fetch_sequence(transcripts, ref_name, 0, ref_limit)
+    references = [(ref_name, len(reference))]
+    trackers = []
+    
+    for aligner, output_dir in (('hisat', dirs['hisat']), ('bowtie2', dirs['bowtie'])):
+        print(aligner.upper(), "Production Run")
+        tracker = create_complexity_tracker()
+        tracker['algorithm'] = 'HISAT' if aligner == 'hisat' else 'Bowtie2'
+        worker_stats = []
+        profile_stats = {}
+        sam_file = os.path.join(output_dir, "alignments_all." + output_format)
+        with AlignmentWriter(sam_file, references, output_format) as writer:
+            alns, runtime, memory = ALIGNER_TESTS[aligner](
+                iter_fastq(reads_path, max_reads, batch_size), reference, ref_name, output_dir, writer,
+                workers=workers, worker_stats=worker_stats, keep_alignments=False,
+                chunk_size=batch_size, progress_interval=batch_size, profile_stats=profile_stats)
+        num_reads = writer.records_written                                  # one record per read
+        add_measurement(tracker, num_reads, runtime, memory, primary_operations(tracker['algorithm'], profile_stats),
+                       str(num_reads) + " reads",
+                       profile_stats)
+        generate_full_report(tracker, output_dir)
+        if workers > 1:
+            export_worker_stats(worker_stats, os.path.join(output_dir, 'worker_stats.csv'))
+        trackers.append(tracker)
+    
+    print("Salmon Production Run")
+    salmon_transcripts = select_transcripts(transcripts, transcript_limit)
+    salmon_index_file, _, _ = run_salmon_index_test(salmon_transcripts, dirs['salmon'])
+    profile_stats = {}
+    tpm, runtime, memory = run_salmon_test(iter_fastq(reads_path, max_reads, batch_size), salmon_index_file,
+                                           dirs['salmon'], workers=workers, chunk_size=batch_size, profile_stats=profile_stats)
+    write_quant_tsv(tpm, os.path.join(dirs['salmon'], "quant_all.tsv"))
+    salmon_tracker = create_complexity_tracker()
+    salmon_tracker['algorithm'] = 'Salmon'
+    add_measurement(salmon_tracker, trackers[0]['measurements'][0]['input_size'], runtime, memory,
+                   primary_operations(salmon_tracker['algorithm'], profile_stats), "all reads", profile_stats)
+    generate_full_report(salmon_tracker, dirs['salmon'])
+    trackers.append(salmon_tracker)
     
-    # Check input files
-    if not os.path.exists(FASTQ_R1):
-        print("ERROR: FASTQ file not found:", FASTQ_R1)
-        return
-    if not os.path.exists(REFERENCE_FASTA):
-        print("ERROR: Reference FASTA not found:", REFERENCE_FASTA)
+    generate_combined_comparison(trackers, dirs['combined'])
+    return dirs
+
+
+# =============================================================================
+# COMMAND-LINE ENTRY POINT
+# =============================================================================
+
+def apply_memory_limit(limit_mb):
+    """Cap the address space of this process (and forked workers) at limit_mb via RLIMIT_AS."""
+    if not limit_mb:
         return
-    
-    # Load reference
+    limit_bytes = int(limit_mb * 1024 * 1024)
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+    if hard_limit != resource.RLIM_INFINITY:
+        limit_bytes = min(limit_bytes, hard_limit)
+    resource.setrlimit(resource.RLIMIT_AS, (limit_bytes, hard_limit))
+    print("Memory limit:", limit_mb, "MB")
+
+
+def load_reference(reference_path):
+    """Open the reference lazily (.fai index) and pick the first sequence; None if missing."""
+    if not os.path.exists(reference_path):
+        print("ERROR: Reference FASTA not found:", reference_path)
+        return None, None
     print("Loading Reference")
-    transcripts = read_fasta(REFERENCE_FASTA)
-    print("Loaded", len(transcripts), "sequences")
+    transcripts = open_fasta(reference_path)
+    print("Indexed", len(transcripts), "sequences")
+    
+    ref_name = next(iter(transcripts))
+    print("Using reference:", ref_name, "length:", sequence_length(transcripts, ref_name))
+    return transcripts, ref_name
+
+
+def run_all_tests(mode="test", reads_path=None, reference_path=REFERENCE_FASTA, **mode_options):
+    """Run alignment tests in test, incremental or production mode."""
+    
+    print("ALIGNMENT ALGORITHM TESTING (" + mode + " mode)")
+    print("Input FASTQ:", reads_path or FASTQ_R1)
+    print("Reference:", reference_path)
     
-    ref_name = list(transcripts.keys())[0]
-    reference = transcripts[ref_name]
-    print("Using reference:", ref_name, "length:", len(reference))
+    ensure_dir("logs")
     
-    # Run test mode
-    dirs = run_test_mode(transcripts, reference, ref_name)
+    # Check input files
+    if not os.path.exists(reads_path or FASTQ_R1):
+        print("ERROR: FASTQ file not found:", reads_path or FASTQ_R1)
+        return None
+    transcripts, ref_name = load_reference(reference_path)
+    if transcripts is None:
+        return None
+    
+    if mode == "production":
+        dirs = run_production_mode(transcripts, ref_name, reads_path, **mode_options)
+    elif mode == "incremental":
+        dirs = run_incremental_mode(transcripts, ref_name, reads_path, **mode_options)
+    else:
+        dirs = run_test_mode(transcripts, ref_name, reads_path, **mode_options)
     
     # Summary
     print("TEST COMPLETE")
     print("Output directories:")
     for k, v in dirs.items():
         print(" ", k + ":", v)
+    return dirs
+
+
+def command_index(args):
+    """`index`: build and serialize the Salmon index for the selected transcripts."""
+    transcripts, _ = load_reference(args.reference)
+    if transcripts is None:
+        return 1
+    selected = select_transcripts(transcripts, args.transcript_limit, args.transcript_length)
+    ensure_dir(os.path.dirname(os.path.abspath(args.output)))
+    run_salmon_index_test(selected, os.path.dirname(args.output), args.output, args.kmer_size)
+    print("Index written to", args.output)
+    return 0
+
+
+def command_align(args):
+    """`align`: stream reads through one aligner into a SAM/BAM file."""
+    transcripts, ref_name = load_reference(args.reference)
+    if transcripts is None:
+        return 1
+    if args.ref_name:
+        ref_name = args.ref_name
+    reference = fetch_sequence(transcripts, ref_name, 0, args.ref_limit)
+    ensure_dir(os.path.dirname(os.path.abspath(args.output)))
+    with AlignmentWriter(args.output, [(ref_name, len(reference))], args.format) as writer:
+        ALIGNER_TESTS[args.aligner](iter_fastq(args.reads or FASTQ_R1, args.max_reads, args.batch_size), reference, ref_name,
+                                    os.path.dirname(args.output), writer, workers=args.threads, keep_alignments=False,
+                                    chunk_size=args.batch_size, progress_interval=args.batch_size)
+    print("Wrote", writer.records_written, "records to", args.output)
+    return 0
+
+
+def command_quant(args):
+    """`quant`: stream reads against a serialized Salmon index and write TPM values (or shard eq. classes)."""
+    if args.eq_classes:
+        num_reads = run_salmon_map(iter_fastq(args.reads or FASTQ_R1, args.max_reads, args.batch_size), args.index,
+                                   args.eq_classes, workers=args.threads, chunk_size=args.batch_size)
+        print("Equivalence classes of", num_reads, "reads written to", args.eq_classes)
+        if not args.output:
+            return 0
+    tpm, _, _ = run_salmon_test(iter_fastq(args.reads or FASTQ_R1, args.max_reads, args.batch_size), args.index,
+                                os.path.dirname(args.output), workers=args.threads, chunk_size=args.batch_size,
+                                online_batch_size=args.online_batch_size)
+    ensure_dir(os.path.dirname(os.path.abspath(args.output)))
+    write_quant_tsv(tpm, args.output)
+    print("Quantification written to", args.output)
+    return 0
+
+
+def command_bench(args):
+    """`bench`: test mode (or incremental mode) over nested read subsets with the given sizes."""
+    dirs = run_all_tests("incremental" if args.incremental else "test", args.reads, args.reference, sizes=args.sizes, sampling=args.sampling,
+                         seed=args.seed, workers=args.threads, output_format=args.format or TEST_OUTPUT_FORMAT)
+    return 0 if dirs is not None else 1
+
+
+def build_arg_parser():
+    """Build the command-line parser: --mode for full runs, or one of the subcommands."""
+    import argparse
+    
+    def add_common_arguments(target, subcommand):
+        """
+        Options accepted before and after the subcommand. The subcommand copies default to
+        SUPPRESS, so they do not overwrite a value given before the subcommand.
+        """
+        def default(value):
+            return argparse.SUPPRESS if subcommand else value
+        target.add_argument('--reads', default=default(None), help="FASTQ(.gz) file or read store directory (default: " + FASTQ_R1 + ")")
+        target.add_argument('--reference', default=default(REFERENCE_FASTA), help="Reference FASTA (default: " + REFERENCE_FASTA + ")")
+        target.add_argument('-p', '--threads', type=int, default=default(TEST_WORKERS),
+                            help="Worker processes (default: " + str(TEST_WORKERS) + ")")
+        target.add_argument('--batch-size', type=int, default=default(FASTQ_BATCH_SIZE),
+                            help="Reads per batch (default: " + str(FASTQ_BATCH_SIZE) + ")")
+        target.add_argument('--format', choices=['sam', 'bam'], default=default(None),
+                            help="Alignment output format (default: from the output extension, else " + TEST_OUTPUT_FORMAT + ")")
+        target.add_argument('--memory-limit', type=float, default=default(None), help="Address-space limit in MB (RLIMIT_AS)")
+        target.add_argument('--max-index-memory', type=float, default=default(INDEX_MEMORY_MB),
+                            help="Index memory budget in MB: picks SA sampling, occ checkpoints and posting width to fit, "
+                                 "and fails before building if nothing fits")
+        target.add_argument('--seed-index', choices=SEED_BACKENDS, default=default(SEED_INDEX),
+                            help="HISAT/Bowtie2 seed lookups: FM backward search or a k-mer hash table (default: " + SEED_INDEX + ")")
+        target.add_argument('--seed-kmer', type=int, default=default(SEED_KMER),
+                            help="k of the hash seed index (default: " + str(SEED_KMER) + ")")
+        target.add_argument('--trace-memory', action='store_true', default=default(TRACE_MEMORY),
+                            help="Profile allocations with tracemalloc (per-stage peaks, top sites; slower)")
+        target.add_argument('--profile-dir', default=default(PROFILE_DIR), help="Write a cProfile .prof file per run to this directory")
+        target.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default=default(LOG_LEVEL),
+                            help="Logging level; DEBUG logs every per-read aligner step (default: " + LOG_LEVEL + ")")
+    
+    parser = argparse.ArgumentParser(description="Alignment algorithm test runner (HISAT, Bowtie2, Salmon)")
+    add_common_arguments(parser, subcommand=False)
+    parser.add_argument('--mode', choices=['test', 'production'], default='test',
+                        help="test: nested read subsets; production: stream every read (default: %(default)s)")
+    parser.add_argument('--ref-limit', type=int, default=None, help="Production mode: reference bases to use")
+    parser.add_argument('--transcript-limit', type=int, default=None, help="Production mode: transcripts for Salmon")
+    parser.add_argument('--max-reads', type=int, default=None, help="Production mode: stop after N reads")
+    subparsers = parser.add_subparsers(dest='command')
+    
+    index_parser = subparsers.add_parser('index', help="Build the Salmon index")
+    add_common_arguments(index_parser, subcommand=True)
+    index_parser.add_argument('--output', required=True, help="Index file to write")
+    index_parser.add_argument('--kmer-size', type=int, default=15)
+    index_parser.add_argument('--transcript-limit', type=int, default=argparse.SUPPRESS)
+    index_parser.add_argument('--transcript-length', type=int, default=None, help="Truncate transcripts to N bp")
+    index_parser.set_defaults(handler=command_index)
+    
+    align_parser = subparsers.add_parser('align', help="Align reads with HISAT or Bowtie2")
+    add_common_arguments(align_parser, subcommand=True)
+    align_parser.add_argument('--aligner', choices=sorted(ALIGNER_TESTS), required=True)
+    align_parser.add_argument('--output', required=True, help="SAM/BAM file to write")
+    align_parser.add_argument('--ref-name', default=None, help="Reference sequence (default: first in the FASTA)")
+    align_parser.add_argument('--ref-limit', type=int, default=argparse.SUPPRESS, help="Use only the first N bases")
+    align_parser.add_argument('--max-reads', type=int, default=argparse.SUPPRESS)
+    align_parser.set_defaults(handler=command_align)
+    
+    quant_parser = subparsers.add_parser('quant', help="Quantify reads with Salmon")
+    add_common_arguments(quant_parser, subcommand=True)
+    quant_parser.add_argument('--index', required=True, help="Index file from `index`")
+    quant_parser.add_argument('--output', default=None, help="TPM table to write")
+    quant_parser.add_argument('--eq-classes', default=None, help="Write equivalence-class counts (for shard_utils merge-quant)")
+    quant_parser.add_argument('--max-reads', type=int, default=argparse.SUPPRESS)
+    quant_parser.add_argument('--online-batch-size', type=int, default=None, help="Online EM mini-batch size")
+    quant_parser.set_defaults(handler=command_quant)
+    
+    bench_parser = subparsers.add_parser('bench', help="Benchmark nested read subsets")
+    add_common_arguments(bench_parser, subcommand=True)
+    bench_parser.add_argument('--sizes', type=int, nargs='+', default=TEST_SIZES)
+    bench_parser.add_argument('--sampling', choices=['auto', 'reservoir', 'head'], default=TEST_SAMPLING,
+                              help="auto: a read store uniformly by index, a FASTQ by head; "
+                                   "reservoir: uniform, but reads all of a FASTQ (a read store is sampled by index); "
+                                   "head: first N reads only (default: %(default)s)")
+    bench_parser.add_argument('--seed', type=int, default=TEST_SEED)
+    bench_parser.add_argument('--incremental', action='store_true',
+                              help="Align only the reads added at each size (cumulative + marginal cost)")
+    bench_parser.set_defaults(handler=command_bench)
+    return parser
+
+
+def main(argv=None):
+    """Command-line entry point; returns the exit status."""
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'quant' and not args.output and not args.eq_classes:
+        parser.error("quant needs --output and/or --eq-classes")
+    if not 1 <= args.seed_kmer <= MAX_KMER:
+        parser.error("--seed-kmer must be between 1 and " + str(MAX_KMER))
+    logging.basicConfig(level=args.log_level, format="%(message)s")
+    apply_memory_limit(args.memory_limit)
+    enable_memory_tracing(args.trace_memory)
+    enable_profiling(args.profile_dir)
+    set_index_memory_budget(args.max_index_memory)
+    set_seed_index(args.seed_index, args.seed_kmer)
+    try:
+        return run_command(args)
+    except IndexBudgetError as error:                                       # raised before the index is built
+        print("ERROR:", error)
+        return 1
+
+
+def run_command(args):
+    """Run the parsed command (or --mode run); returns the exit status."""
+    if args.command is None:
+        if args.mode == "production":
+            dirs = run_all_tests("production", args.reads, args.reference, workers=args.threads,
+                                 batch_size=args.batch_size, output_format=args.format or TEST_OUTPUT_FORMAT, ref_limit=args.ref_limit,
+                                 transcript_limit=args.transcript_limit, max_reads=args.max_reads)
+        else:
+            dirs = run_all_tests("test", args.reads, args.reference, workers=args.threads,
+                                 output_format=args.format or TEST_OUTPUT_FORMAT)
+        return 0 if dirs is not None else 1
+    return args.handler(args)
 
 
 # =============================================================================
 # ENTRY POINT
 # =============================================================================
 
-run_all_tests()
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Worker-Count Scaling Benchmark
+#       Runs each reimplemented aligner as a child process at several worker counts and input sizes
+#       and records it the way the space-time logs of the real tools were recorded (GNU time fields:
+#       elapsed, CPU percent, max RSS, user and system time; wait4 reports them for the child and
+#       its forked workers). Rows use the exact schema of z_Figures/.../per_command_from_space_time_logs,
+#       one directory per tool with <tool>.csv and <tool>_cpu<N>.csv, and the Command column carries
+#       "-p N", so the R plotting modules read them unchanged.
+#
+#       scaling_summary.csv adds what the schema has no room for, per tool, size and worker count:
+#           throughput          reads per second
+#           speedup             T(1) / T(p); if 1 worker was not run, p_min * T(p_min) / T(p)
+#           efficiency          speedup / p
+#           karp_flatt          experimentally determined serial fraction (1/S - 1/p) / (1 - 1/p)
+#           amdahl_serial       serial fraction fitted over all p of the tool and size (least squares
+#                               of 1/S - 1/p = f (1 - 1/p))
+#
+#       Usage:
+#           python scaling_benchmark.py --workers 1 2 4 8 --sizes 200 1000
+#           python scaling_benchmark.py --tools python-salmon-quant --repeats 3
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from Utility_Functions.fastq_utils import iter_fastq
+from run_alignment_tests import FASTQ_R1, REFERENCE_FASTA, TEST_REF_LIMIT, TEST_TRANSCRIPT_LIMIT
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+SCALING_WORKERS = [1, 2, 4]
+SCALING_SIZES = [200, 1000]
+SCALING_REPEATS = 1
+SCALING_OUTPUT = "Outputs/scaling"
+RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_alignment_tests.py")
+
+SPACE_TIME_COLUMNS = ["Timestamp", "Command", "Elapsed_Time_sec", "CPU_Percent", "Max_RSS_KB", "User_Time_sec",
+                      "System_Time_sec", "Input_Size_MB", "Output_Size_MB", "Exit_Status"]
+SUMMARY_COLUMNS = ["tool", "input_reads", "workers", "repeats", "elapsed_sec", "throughput_reads_per_sec", "speedup",
+                   "parallel_efficiency", "karp_flatt_serial_fraction", "amdahl_serial_fraction", "cpu_percent",
+                   "max_rss_kb", "failed_runs"]
+
+# Tool name -> subcommand arguments of run_alignment_tests.py ({workers}, {size}, {reads}, ... filled in per run)
+SCALING_TOOLS = {
+    'python-hisat': ["align", "--aligner", "hisat", "-p", "{workers}", "--max-reads", "{size}", "--reads", "{reads}",
+                     "--reference", "{reference}", "--ref-limit", "{ref_limit}", "--output", "{output}"],
+    'python-bowtie2': ["align", "--aligner", "bowtie2", "-p", "{workers}", "--max-reads", "{size}", "--reads", "{reads}",
+                       "--reference", "{reference}", "--ref-limit", "{ref_limit}", "--output", "{output}"],
+    'python-salmon-quant': ["quant", "-p", "{workers}", "--max-reads", "{size}", "--reads", "{reads}",
+                            "--index", "{index}", "--output", "{output}"],
+}
+OUTPUT_EXTENSIONS = {'python-hisat': ".sam", 'python-bowtie2': ".sam", 'python-salmon-quant': ".tsv"}
+SALMON_INDEX_TOOL = 'python-salmon-index'
+SALMON_INDEX_ARGS = ["index", "-p", "1", "--reference", "{reference}", "--transcript-limit", "{transcript_limit}",
+                     "--output", "{output}"]
+
+# =============================================================================
+# Measured Child Runs
+# =============================================================================
+
+def run_measured(tool, args, log_path):
+    """
+    Run run_alignment_tests.py with args as a child process and return its space-time row.
+    wait4 gives the rusage of the child including its reaped workers, like GNU time.
+    """
+    argv = [sys.executable, RUNNER] + args
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    with open(log_path, 'w') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(argv, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    cpu_sec = usage.ru_utime + usage.ru_stime
+    return {
+        'Timestamp': timestamp,
+        'Command': tool + " " + " ".join(args),
+        'Elapsed_Time_sec': round(elapsed, 2),
+        'CPU_Percent': int(round(cpu_sec / elapsed * 100)) if elapsed > 0 else 0,
+        'Max_RSS_KB': usage.ru_maxrss,                          # kilobytes on Linux
+        'User_Time_sec': round(usage.ru_utime, 2),
+        'System_Time_sec': round(usage.ru_stime, 2),
+        'Input_Size_MB': 0.0,
+        'Output_Size_MB': 0.0,
+        'Exit_Status': process.returncode
+    }
+
+
+def fill_args(template, **values):
+    """Substitute {name} placeholders of an argument template."""
+    return [arg.format(**values) for arg in template]
+
+
+def fastq_subset_mb(reads_path, size):
+    """Size in MB of the first size reads as uncompressed FASTQ text. O(size)."""
+    total = 0
+    for record in iter_fastq(reads_path, size):
+        total += len(record.id) + 2 * len(record.sequence) + 6   # '@', '+' and four newlines
+    return total / (1024 * 1024)
+
+
+def file_mb(path):
+    """Size of a file in MB (0 if it was not written)."""
+    return os.path.getsize(path) / (1024 * 1024) if os.path.exists(path) else 0.0
+
+# =============================================================================
+# Space-Time Log Files
+# =============================================================================
+
+def csv_field(value):
+    """Quote the Command column like the real logs; numbers as they are."""
+    if isinstance(value, str) and not value[:1].isdigit():
+        return '"' + value.replace('"', '""') + '"'
+    return str(value)
+
+
+def append_rows(path, rows, columns):
+    """Append rows to a CSV, writing the header if the file is new."""
+    is_new = not os.path.exists(path)
+    with open(path, 'a') as f:
+        if is_new:
+            f.write(",".join(columns) + "\n")
+        for row in rows:
+            f.write(",".join(csv_field(row[column]) for column in columns) + "\n")
+
+
+def write_space_time_logs(rows_by_tool, output_dir):
+    """<output_dir>/per_command_from_space_time_logs/<tool>/<tool>.csv and <tool>_cpu<N>.csv."""
+    log_root = os.path.join(output_dir, "per_command_from_space_time_logs")
+    for tool, rows in rows_by_tool.items():
+        tool_dir = os.path.join(log_root, tool)
+        os.makedirs(tool_dir, exist_ok=True)
+        append_rows(os.path.join(tool_dir, tool + ".csv"), [row for row, _, _ in rows], SPACE_TIME_COLUMNS)
+        for workers in sorted(set(workers for _, workers, _ in rows)):
+            append_rows(os.path.join(tool_dir, tool + "_cpu" + str(workers) + ".csv"),
+                        [row for row, row_workers, _ in rows if row_workers == workers], SPACE_TIME_COLUMNS)
+    return log_root
+
+# =============================================================================
+# Scaling Metrics
+# =============================================================================
+
+def karp_flatt(speedup, workers):
+    """Experimentally determined serial fraction; None for one worker."""
+    if workers <= 1 or speedup <= 0:
+        return None
+    return (1 / speedup - 1 / workers) / (1 - 1 / workers)
+
+
+def amdahl_serial_fraction(speedups):
+    """
+    Least-squares serial fraction f of Amdahl's law S = 1 / (f + (1 - f) / p) over {p: S}.
+    Linear in f: 1/S - 1/p = f (1 - 1/p). None without a point above one worker.
+    """
+    points = [(1 - 1 / workers, 1 / speedup - 1 / workers) for workers, speedup in speedups.items()
+              if workers > 1 and speedup > 0]
+    if not points:
+        return None
+    return sum(x * y for x, y in points) / sum(x * x for x, _ in points)
+
+
+def blank_if_none(value):
+    """Empty CSV field for metrics that do not apply."""
+    return "" if value is None else value
+
+
+def summarize_scaling(rows_by_tool):
+    """One summary row per tool, size and worker count (mean over successful repeats)."""
+    summary = []
+    for tool, rows in rows_by_tool.items():
+        for size in sorted(set(size for _, _, size in rows)):
+            runs = {}
+            for row, workers, row_size in rows:
+                if row_size == size:
+                    runs.setdefault(workers, []).append(row)
+            means = {}
+            for workers, worker_rows in runs.items():
+                ok = [row for row in worker_rows if row['Exit_Status'] == 0]
+                if ok:
+                    means[workers] = statistics.mean(row['Elapsed_Time_sec'] for row in ok)
+            base_workers = min(means) if means else None
+            speedups = {}
+            for workers, elapsed in means.items():
+                # Speedup against p_min, rescaled so p_min counts as p_min-fold (exact when p_min = 1)
+                speedups[workers] = means[base_workers] / elapsed * base_workers if elapsed > 0 else 0.0
+            serial_fraction = amdahl_serial_fraction(speedups)
+            
+            for workers in sorted(runs):
+                worker_rows = runs[workers]
+                ok = [row for row in worker_rows if row['Exit_Status'] == 0]
+                elapsed = means.get(workers)
+                speedup = speedups.get(workers)
+                summary.append({
+                    'tool': tool,
+                    'input_reads': size,
+                    'workers': workers,
+                    'repeats': len(worker_rows),
+                    'elapsed_sec': blank_if_none(elapsed),
+                    'throughput_reads_per_sec': size / elapsed if elapsed and size else "",
+                    'speedup': blank_if_none(speedup),
+                    'parallel_efficiency': speedup / workers if speedup is not None else "",
+                    'karp_flatt_serial_fraction': blank_if_none(karp_flatt(speedup, workers) if speedup is not None else None),
+                    'amdahl_serial_fraction': blank_if_none(serial_fraction),
+                    'cpu_percent': statistics.mean(row['CPU_Percent'] for row in ok) if ok else "",
+                    'max_rss_kb': max(row['Max_RSS_KB'] for row in ok) if ok else "",
+                    'failed_runs': len(worker_rows) - len(ok)
+                })
+    return summary
+
+
+def write_summary(summary, output_file):
+    """scaling_summary.csv (overwritten each run)."""
+    lines = [",".join(SUMMARY_COLUMNS)]
+    for row in summary:
+        lines.append(",".join(str(row[column]) for column in SUMMARY_COLUMNS))
+    with open(output_file, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+# =============================================================================
+# Scaling Study
+# =============================================================================
+
+def run_scaling_study(tools, workers_list, sizes, repeats=SCALING_REPEATS, reads_path=FASTQ_R1,
+                      reference_path=REFERENCE_FASTA, ref_limit=TEST_REF_LIMIT, transcript_limit=TEST_TRANSCRIPT_LIMIT,
+                      output_dir=SCALING_OUTPUT):
+    """
+    Run every tool at every worker count and size. Returns {tool: [(row, workers, size)]}.
+    The Salmon index is built once (single-threaded) and logged as its own tool.
+    """
+    work_dir = os.path.join(output_dir, "runs")
+    os.makedirs(work_dir, exist_ok=True)
+    rows_by_tool = {}
+    values = {'reads': reads_path, 'reference': reference_path, 'ref_limit': ref_limit,
+              'transcript_limit': transcript_limit}
+    
+    if any(tool.startswith("python-salmon") for tool in tools):
+        index_file = os.path.join(work_dir, "salmon_index.pkl")
+        print("Building Salmon index")
+        row = run_measured(SALMON_INDEX_TOOL, fill_args(SALMON_INDEX_ARGS, output=index_file, **values),
+                           os.path.join(work_dir, SALMON_INDEX_TOOL + ".log"))
+        row['Input_Size_MB'] = round(file_mb(reference_path), 2)
+        row['Output_Size_MB'] = round(file_mb(index_file), 2)
+        rows_by_tool[SALMON_INDEX_TOOL] = [(row, 1, 0)]
+        values['index'] = index_file
+    
+    for size in sizes:
+        input_mb = round(fastq_subset_mb(reads_path, size), 2)
+        for tool in tools:
+            for workers in workers_list:
+                for repeat in range(repeats):
+                    run_name = tool + "_n" + str(size) + "_p" + str(workers) + "_r" + str(repeat)
+                    output_file = os.path.join(work_dir, run_name + OUTPUT_EXTENSIONS[tool])
+                    args = fill_args(SCALING_TOOLS[tool], workers=workers, size=size, output=output_file, **values)
+                    row = run_measured(tool, args, os.path.join(work_dir, run_name + ".log"))
+                    row['Input_Size_MB'] = input_mb
+                    row['Output_Size_MB'] = round(file_mb(output_file), 2)
+                    rows_by_tool.setdefault(tool, []).append((row, workers, size))
+                    print("  %-20s %6d reads  -p %-3d  %8.2f s  %5d%% CPU  %8d KB  exit %d" % (
+                        tool, size, workers, row['Elapsed_Time_sec'], row['CPU_Percent'], row['Max_RSS_KB'],
+                        row['Exit_Status']))
+    return rows_by_tool
+
+# =============================================================================
+# COMMAND-LINE ENTRY POINT
+# =============================================================================
+
+def main(argv=None):
+    """Run the scaling study; returns 1 if any child run failed."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Worker-count scaling study in the space-time log schema")
+    parser.add_argument('--tools', nargs='+', choices=sorted(SCALING_TOOLS), default=sorted(SCALING_TOOLS))
+    parser.add_argument('--workers', type=int, nargs='+', default=SCALING_WORKERS,
+                        help="Worker counts (default: %(default)s)")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SCALING_SIZES, help="Reads per run (default: %(default)s)")
+    parser.add_argument('--repeats', type=int, default=SCALING_REPEATS, help="Runs per configuration (default: %(default)s)")
+    parser.add_argument('--reads', default=FASTQ_R1, help="FASTQ(.gz) file or read store (default: %(default)s)")
+    parser.add_argument('--reference', default=REFERENCE_FASTA, help="Reference FASTA (default: %(default)s)")
+    parser.add_argument('--ref-limit', type=int, default=TEST_REF_LIMIT, help="Reference bases for HISAT/Bowtie2")
+    parser.add_argument('--transcript-limit', type=int, default=TEST_TRANSCRIPT_LIMIT, help="Transcripts for Salmon")
+    parser.add_argument('--output', default=SCALING_OUTPUT, help="Output directory (default: %(default)s)")
+    args = parser.parse_args(argv)
+    
+    print("SCALING BENCHMARK (workers " + str(args.workers) + ", sizes " + str(args.sizes) + ")")
+    rows_by_tool = run_scaling_study(args.tools, args.workers, args.sizes, args.repeats, args.reads, args.reference,
+                                     args.ref_limit, args.transcript_limit, args.output)
+    log_root = write_space_time_logs(rows_by_tool, args.output)
+    summary_file = os.path.join(args.output, "scaling_summary.csv")
+    write_summary(summarize_scaling(rows_by_tool), summary_file)
+    print("Space-time logs written to", log_root)
+    print("Summary written to", summary_file)
+    
+    failed = sum(1 for rows in rows_by_tool.values() for row, _, _ in rows if row['Exit_Status'] != 0)
+    if failed:
+        print(failed, "run(s) failed; see the .log files in", os.path.join(args.output, "runs"))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Seed Index Benchmark (FM-Index vs K-mer Table)
+#       Compares the seeding backends of Utility_Functions/seed_index.py on synthetic references
+#       (fixed seeds): build time, resident index bytes (tracemalloc, the reference string itself
+#       excluded) and seed lookup latency, the median and IQR per locate() call over seeds drawn from
+#       the reference (hits) and random seeds (mostly misses):
+#           fm          backward search on the full FM-index tables
+#           hash-dense  4^k offsets + positions (only where 4^k is at most --max-dense-mb)
+#           hash-open   open addressing on the packed k-mer
+#
+#       Usage:
+#           python seed_index_benchmark.py
+#           python seed_index_benchmark.py --lengths 2000 8000 --kmers 12 15 22 --repeats 7
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from Utility_Functions.shared_utils import build_fm_index
+from Utility_Functions.seed_index import FMSeedLocator, KmerSeedLocator
+from Utility_Functions.index_budget import ARRAY_ITEM
+from kernel_benchmarks import random_dna, time_case, summarize, BENCH_SEED, BENCH_REPEATS, BENCH_MIN_TIME
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+SEED_BENCH_LENGTHS = [1000, 4000, 16000]       # the FM suffix sort holds ~n^2 / 2 bytes while building
+SEED_BENCH_KMERS = [10, 15, 22]
+SEED_BENCH_LOOKUPS = 500                       # seeds per timed call, half from the reference
+SEED_BENCH_MAX_DENSE_MB = 64.0
+SEED_BENCH_OUTPUT = "Outputs/benchmarks/seed_index.csv"
+
+RESULT_COLUMNS = ["reference_length", "kmer_size", "backend", "build_sec", "index_bytes", "bytes_per_base",
+                  "lookup_median_us", "lookup_iqr_us", "hits_per_lookup"]
+
+# =============================================================================
+# Backends
+# =============================================================================
+
+def build_fm_locator(reference, k):
+    return FMSeedLocator(build_fm_index(reference))
+
+
+def build_dense_locator(reference, k):
+    return KmerSeedLocator(reference, k, "dense")
+
+
+def build_open_locator(reference, k):
+    return KmerSeedLocator(reference, k, "hash")
+
+
+SEED_BACKEND_CASES = {
+    'fm':         build_fm_locator,
+    'hash-dense': build_dense_locator,
+    'hash-open':  build_open_locator,
+}
+
+# =============================================================================
+# Measurements
+# =============================================================================
+
+def seed_patterns(rng, reference, k, count):
+    """count seeds of length k: half substrings of the reference, half uniform random."""
+    patterns = []
+    for index in range(count):
+        if index % 2 == 0:
+            start = rng.randrange(0, len(reference) - k + 1)
+            patterns.append(reference[start:start + k])
+        else:
+            patterns.append(random_dna(rng, k))
+    return patterns
+
+
+def measure_build(builder, reference, k):
+    """Build once for the time, once under tracemalloc for the retained bytes; returns (locator, sec, bytes)."""
+    start = time.perf_counter()
+    locator = builder(reference, k)
+    build_sec = time.perf_counter() - start
+    del locator
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    locator = builder(reference, k)
+    index_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return locator, build_sec, index_bytes
+
+
+def benchmark_case(backend, reference, k, patterns, repeats=BENCH_REPEATS, min_time=BENCH_MIN_TIME):
+    """One result row: build time, index bytes and per-lookup latency of a backend."""
+    locator, build_sec, index_bytes = measure_build(SEED_BACKEND_CASES[backend], reference, k)
+    locate = locator.locate
+    
+    def run():
+        for pattern in patterns:                                    # O(P) lookups
+            locate(pattern)
+    summary = summarize(time_case(run, repeats, min_time=min_time), len(patterns), "lookups")
+    hits = sum(len(locate(pattern)) for pattern in patterns)
+    return {
+        'reference_length': len(reference),
+        'kmer_size': k,
+        'backend': backend,
+        'build_sec': build_sec,
+        'index_bytes': index_bytes,
+        'bytes_per_base': index_bytes / len(reference),
+        'lookup_median_us': summary['median_sec'] / len(patterns) * 1e6,
+        'lookup_iqr_us': summary['iqr_sec'] / len(patterns) * 1e6,
+        'hits_per_lookup': hits / len(patterns)
+    }
+
+
+def run_seed_benchmarks(lengths=None, kmers=None, lookups=SEED_BENCH_LOOKUPS, repeats=BENCH_REPEATS, seed=BENCH_SEED,
+                        max_dense_mb=SEED_BENCH_MAX_DENSE_MB, min_time=BENCH_MIN_TIME):
+    """Every backend at every reference length and k; the FM-index is independent of k but timed per k."""
+    rows = []
+    for length in lengths or SEED_BENCH_LENGTHS:
+        reference = random_dna(random.Random(seed + length), length)
+        for k in kmers or SEED_BENCH_KMERS:
+            patterns = seed_patterns(random.Random(seed + length + k), reference, k, lookups)
+            for backend in SEED_BACKEND_CASES:
+                if backend == 'hash-dense' and ARRAY_ITEM * 4 ** k > max_dense_mb * 1024 * 1024:
+                    print("  %-6d k=%-3d %-10s skipped (%.0f MB of offsets)" % (
+                        length, k, backend, ARRAY_ITEM * 4 ** k / (1024 * 1024)))
+                    continue
+                row = benchmark_case(backend, reference, k, patterns, repeats, min_time)
+                rows.append(row)
+                print("  %-6d k=%-3d %-10s build %8.4f s  %10d bytes (%6.1f/base)  lookup %8.2f us (IQR %.2f)" % (
+                    length, k, backend, row['build_sec'], row['index_bytes'], row['bytes_per_base'],
+                    row['lookup_median_us'], row['lookup_iqr_us']))
+    return rows
+
+
+def write_results(rows, output_file):
+    """seed_index.csv: one row per reference length, k and backend."""
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    lines = [",".join(RESULT_COLUMNS)]
+    for row in rows:
+        lines.append(",".join(str(row[column]) for column in RESULT_COLUMNS))
+    with open(output_file, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+# =============================================================================
+# COMMAND-LINE ENTRY POINT
+# =============================================================================
+
+def main(argv=None):
+    """Run the comparison and write the CSV; returns the exit status."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Seed lookup latency and memory: FM-index vs k-mer table")
+    parser.add_argument('--lengths', type=int, nargs='+', default=SEED_BENCH_LENGTHS, help="Reference lengths")
+    parser.add_argument('--kmers', type=int, nargs='+', default=SEED_BENCH_KMERS, help="Seed lengths (k)")
+    parser.add_argument('--lookups', type=int, default=SEED_BENCH_LOOKUPS, help="Seeds per timed call")
+    parser.add_argument('--repeats', type=int, default=BENCH_REPEATS, help="Timed repeats (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=BENCH_SEED, help="Seed of the synthetic inputs (default: %(default)s)")
+    parser.add_argument('--min-time', type=float, default=BENCH_MIN_TIME, help="Minimum seconds per repeat")
+    parser.add_argument('--max-dense-mb', type=float, default=SEED_BENCH_MAX_DENSE_MB,
+                        help="Skip the dense layout when its offsets exceed this (default: %(default)s)")
+    parser.add_argument('--output', default=SEED_BENCH_OUTPUT, help="Results CSV (default: %(default)s)")
+    args = parser.parse_args(argv)
+    
+    print("SEED INDEX BENCHMARK (seed " + str(args.seed) + ", " + str(args.repeats) + " repeats)")
+    rows = run_seed_benchmarks(args.lengths, args.kmers, args.lookups, args.repeats, args.seed, args.max_dense_mb,
+                               args.min_time)
+    write_results(rows, args.output)
+    print("Results written to", args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Speed and Accuracy on Simulated Reads
+#       Simulates reads with a known origin (Utility_Functions/read_simulator.py), runs the aligners
+#       on them and reports reads per second next to the accuracy, so an optimisation can be
+#       checked for speed without losing correctness:
+#           HISAT / Bowtie2   sensitivity = correct / reads, precision = correct / aligned, where an
+#                             alignment is correct if it starts within --tolerance bp of the truth
+#           Salmon            Pearson (of log TPM) and Spearman correlation with the true TPM
+#
+#       HISAT and Bowtie2 align against one reference sequence (the first transcript cut to
+#       --ref-limit, as in test mode, or a genome chromosome with --genome/--annotation for spliced
+#       reads); Salmon quantifies reads simulated from the first --transcript-limit transcripts.
+#
+#       Usage:
+#           python simulation_benchmark.py --num-reads 500
+#           python simulation_benchmark.py --tools salmon --num-reads 5000 --abundance zipf
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from Utility_Functions.fastq_utils import read_fastq, read_fasta
+from Utility_Functions.fasta_index import open_fasta, fetch_sequence
+from Utility_Functions.read_simulator import (
+    transcript_sources, spliced_sources, read_gtf_exons, run_simulation, read_truth, read_abundance,
+    SIM_READ_LENGTH, SIM_SUBSTITUTION_RATE, SIM_INSERTION_RATE, SIM_DELETION_RATE, SIM_SEED
+)
+from run_alignment_tests import (
+    ALIGNER_TESTS, REFERENCE_FASTA, TEST_REF_LIMIT, TEST_TRANSCRIPT_LIMIT, select_transcripts,
+    run_salmon_index_test, run_salmon_test, write_quant_tsv
+)
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+SIMULATION_READS = 500
+SIMULATION_OUTPUT = "Outputs/simulation"
+POSITION_TOLERANCE = 10         # bp between the reported and the true start (soft clips, indels)
+
+EVALUATION_COLUMNS = ["tool", "reads", "runtime_sec", "reads_per_sec", "aligned", "correct", "sensitivity",
+                      "precision", "tpm_pearson_log", "tpm_spearman"]
+
+# =============================================================================
+# Accuracy Metrics
+# =============================================================================
+
+def score_alignments(alignments, truth, tolerance=POSITION_TOLERANCE):
+    """Aligned and correctly placed reads among alignment records (run_alignment_test output)."""
+    aligned = correct = 0
+    for record in alignments:
+        if record['unmapped']:
+            continue
+        aligned += 1
+        expected = truth.get(record['read_id'])
+        if expected is not None and abs(record['position'] - expected['position']) <= tolerance:
+            correct += 1
+    return aligned, correct
+
+
+def pearson(xs, ys):
+    """Pearson correlation; None if either side is constant. O(n)."""
+    n = len(xs)
+    if n < 2:
+        return None
+    x_mean, y_mean = sum(xs) / n, sum(ys) / n
+    sxx = sum((x - x_mean) ** 2 for x in xs)
+    syy = sum((y - y_mean) ** 2 for y in ys)
+    if sxx == 0 or syy == 0:
+        return None
+    return sum((x - x_mean) * (y - y_mean) for x, y in zip(xs, ys)) / math.sqrt(sxx * syy)
+
+
+def ranks(values):
+    """Ranks starting at 1, ties sharing their average rank. O(n log n)."""
+    order = sorted(range(len(values)), key=lambda index: values[index])
+    result = [0.0] * len(values)
+    start = 0
+    while start < len(order):
+        end = start
+        while end + 1 < len(order) and values[order[end + 1]] == values[order[start]]:
+            end += 1
+        for position in range(start, end + 1):
+            result[order[position]] = (start + end) / 2 + 1
+        start = end + 1
+    return result
+
+
+def spearman(xs, ys):
+    """Spearman rank correlation (Pearson of the ranks)."""
+    return pearson(ranks(xs), ranks(ys))
+
+
+def score_quantification(estimated, truth):
+    """Pearson of log(TPM + 1) and Spearman of TPM over the transcripts in the truth."""
+    names = sorted(truth)
+    true_values = [truth[name] for name in names]
+    estimated_values = [estimated.get(name, 0.0) for name in names]
+    return (pearson([math.log1p(value) for value in true_values], [math.log1p(value) for value in estimated_values]),
+            spearman(true_values, estimated_values))
+
+# =============================================================================
+# Benchmarks
+# =============================================================================
+
+def evaluation_row(tool, reads, runtime, aligned="", correct="", tpm_pearson=None, tpm_spearman=None):
+    """One evaluation.csv row (blank fields for metrics that do not apply)."""
+    return {
+        'tool': tool,
+        'reads': reads,
+        'runtime_sec': runtime,
+        'reads_per_sec': reads / runtime if runtime > 0 else "",
+        'aligned': aligned,
+        'correct': correct,
+        'sensitivity': correct / reads if correct != "" and reads else "",
+        'precision': correct / aligned if correct != "" and aligned else "",
+        'tpm_pearson_log': "" if tpm_pearson is None else tpm_pearson,
+        'tpm_spearman': "" if tpm_spearman is None else tpm_spearman
+    }
+
+
+def benchmark_aligners(tools, reference, ref_name, sources, output_dir, num_reads, workers=1,
+                       tolerance=POSITION_TOLERANCE, **simulation_options):
+    """Simulate single-end reads on the aligner reference, align them with every tool and score."""
+    prefix = os.path.join(output_dir, "aligner_reads")
+    fastq_paths, truth_path, _ = run_simulation(sources, prefix, num_reads, abundance="uniform", **simulation_options)
+    reads = read_fastq(fastq_paths[0])
+    truth = read_truth(truth_path)
+    rows = []
+    for tool in tools:
+        print("Aligning", len(reads), "simulated reads with", tool)
+        alignments, runtime, _ = ALIGNER_TESTS[tool](reads, reference, ref_name, output_dir, workers=workers)
+        aligned, correct = score_alignments(alignments, truth, tolerance)
+        rows.append(evaluation_row(tool, len(reads), runtime, aligned, correct))
+    return rows
+
+
+def benchmark_salmon(transcripts, output_dir, num_reads, workers=1, abundance="lognormal", **simulation_options):
+    """Simulate reads from the transcripts with the given abundances, quantify and correlate with the truth."""
+    prefix = os.path.join(output_dir, "salmon_reads")
+    fastq_paths, _, abundance_path = run_simulation(transcript_sources(transcripts), prefix, num_reads,
+                                                    abundance=abundance, **simulation_options)
+    reads = read_fastq(fastq_paths[0])
+    print("Quantifying", len(reads), "simulated reads with salmon")
+    index_file, _, _ = run_salmon_index_test(transcripts, output_dir)
+    tpm, runtime, _ = run_salmon_test(reads, index_file, output_dir, workers=workers)
+    write_quant_tsv(tpm, os.path.join(output_dir, "salmon_quant.tsv"))
+    tpm_pearson, tpm_spearman = score_quantification(tpm, read_abundance(abundance_path))
+    return [evaluation_row("salmon", len(reads), runtime, tpm_pearson=tpm_pearson, tpm_spearman=tpm_spearman)]
+
+
+def write_evaluation(rows, output_file):
+    """evaluation.csv: one row per tool."""
+    lines = [",".join(EVALUATION_COLUMNS)]
+    for row in rows:
+        lines.append(",".join(str(row[column]) for column in EVALUATION_COLUMNS))
+    with open(output_file, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+# =============================================================================
+# COMMAND-LINE ENTRY POINT
+# =============================================================================
+
+def main(argv=None):
+    """Simulate, run and score the selected tools; returns the exit status."""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Reads/sec and accuracy on simulated reads")
+    parser.add_argument('--tools', nargs='+', choices=sorted(ALIGNER_TESTS) + ['salmon'],
+                        default=sorted(ALIGNER_TESTS) + ['salmon'])
+    parser.add_argument('--reference', default=REFERENCE_FASTA, help="Transcript FASTA (default: %(default)s)")
+    parser.add_argument('--genome', default=None, help="Genome FASTA for spliced aligner reads (with --annotation)")
+    parser.add_argument('--annotation', default=None, help="GTF of the genome")
+    parser.add_argument('--ref-name', default=None, help="Aligner reference sequence (default: the first)")
+    parser.add_argument('--ref-limit', type=int, default=TEST_REF_LIMIT, help="Aligner reference bases (transcript mode)")
+    parser.add_argument('--transcript-limit', type=int, default=TEST_TRANSCRIPT_LIMIT, help="Transcripts for Salmon")
+    parser.add_argument('--num-reads', type=int, default=SIMULATION_READS)
+    parser.add_argument('--read-length', type=int, default=SIM_READ_LENGTH)
+    parser.add_argument('--abundance', choices=["uniform", "lognormal", "zipf"], default="lognormal",
+                        help="Salmon abundance distribution (default: %(default)s)")
+    parser.add_argument('--substitution-rate', type=float, default=SIM_SUBSTITUTION_RATE)
+    parser.add_argument('--insertion-rate', type=float, default=SIM_INSERTION_RATE)
+    parser.add_argument('--deletion-rate', type=float, default=SIM_DELETION_RATE)
+    parser.add_argument('--strandedness', choices=["unstranded", "forward", "reverse"], default="unstranded")
+    parser.add_argument('--tolerance', type=int, default=POSITION_TOLERANCE, help="Position tolerance in bp")
+    parser.add_argument('--seed', type=int, default=SIM_SEED)
+    parser.add_argument('-p', '--threads', type=int, default=1, help="Worker processes")
+    parser.add_argument('--output', default=SIMULATION_OUTPUT, help="Output directory (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if bool(args.genome) != bool(args.annotation):
+        parser.error("--genome and --annotation go together")
+    
+    os.makedirs(args.output, exist_ok=True)
+    simulation_options = {'read_length': args.read_length, 'substitution_rate': args.substitution_rate,
+                          'insertion_rate': args.insertion_rate, 'deletion_rate': args.deletion_rate,
+                          'strandedness': args.strandedness, 'seed': args.seed}
+    transcripts = open_fasta(args.reference)
+    rows = []
+    
+    aligners = [tool for tool in args.tools if tool in ALIGNER_TESTS]
+    if aligners:
+        if args.genome:
+            genome = read_fasta(args.genome)
+            ref_name = args.ref_name or next(iter(genome))
+            reference = genome[ref_name]
+            sources = spliced_sources({ref_name: reference}, read_gtf_exons(args.annotation))
+        else:
+            ref_name = args.ref_name or next(iter(transcripts))
+            reference = fetch_sequence(transcripts, ref_name, 0, args.ref_limit)
+            sources = transcript_sources({ref_name: reference})
+        rows.extend(benchmark_aligners(aligners, reference, ref_name, sources, args.output, args.num_reads,
+                                       args.threads, args.tolerance, **simulation_options))
+    if 'salmon' in args.tools:
+        rows.extend(benchmark_salmon(select_transcripts(transcripts, args.transcript_limit), args.output,
+                                     args.num_reads, args.threads, args.abundance, **simulation_options))
+    
+    evaluation_file = os.path.join(args.output, "evaluation.csv")
+    write_evaluation(rows, evaluation_file)
+    print("EVALUATION")
+    for row in rows:
+        print("  %-8s %8.1f reads/s  sensitivity %-8s precision %-8s TPM r(log) %-8s rho %s" % (
+            row['tool'], row['reads_per_sec'] or 0.0, format_metric(row['sensitivity']), format_metric(row['precision']),
+            format_metric(row['tpm_pearson_log']), format_metric(row['tpm_spearman'])))
+    print("Written to", evaluation_file)
+    return 0
+
+
+def format_metric(value):
+    """Three decimals, or '-' for metrics that do not apply."""
+    return "-" if value == "" else "%.3f" % value
+
+
+if __name__ == "__main__":
+    sys.exit(main())
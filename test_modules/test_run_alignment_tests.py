@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# ====================================================================================================
+# Tests: Alignment Test Runner
+#
+#       In partial fulfillment of CMSC244.
+#       Submitted by: Mark Cyril R. Mercado
+#
+# ====================================================================================================
+
+import time
+
+import pytest
+
+from run_alignment_tests import (
+    run_alignment_test, build_arg_parser, primary_operations, PRIMARY_OPERATIONS, TEST_WORKERS, LOG_LEVEL
+)
+from Utility_Functions.alignment_writer import AlignmentWriter
+from Utility_Functions.seed_index import set_seed_index
+from Utility_Functions.fastq_utils import FastqRecord
+
+WRITE_DELAY = 0.05
+
+
+def exact_align(sequence, reference):
+    position = reference.find(sequence)
+    if position < 0:
+        return []
+    return [{'position': position, 'cigar': str(len(sequence)) + "M", 'score': 60}]
+
+
+class SlowWriter:
+    """Writer whose every call takes WRITE_DELAY seconds."""
+    
+    def __init__(self):
+        self.records = []
+        self.flushes = 0
+    
+    def write_batch(self, alignments, ref_name=None):
+        time.sleep(WRITE_DELAY)
+        self.records.extend(alignments)
+    
+    def flush(self):
+        time.sleep(WRITE_DELAY)
+        self.flushes += 1
+
+
+def test_only_the_final_flush_is_kept_out_of_the_runtime(tmp_path):
+    reference = "ACGTTGCA" * 50
+    reads = [FastqRecord("r" + str(i), reference[i:i + 20], "I" * 20) for i in range(0, 200, 10)]
+    writer = SlowWriter()
+    profile_stats = {}
+    start = time.time()
+    alignments, runtime, _ = run_alignment_test(reads, reference, "ref", str(tmp_path), "Exact", exact_align,
+                                                 writer=writer, write_interval=5, progress_interval=5,
+                                                 profile_stats=profile_stats)
+    wall = time.time() - start
+    assert len(writer.records) == len(reads) == len(alignments)
+    assert writer.flushes == 1
+    assert profile_stats['write_sec'] >= 6 * WRITE_DELAY                     # 4 batches, then an empty batch and the flush
+    assert profile_stats['flush_sec'] >= 2 * WRITE_DELAY
+    assert runtime == pytest.approx(wall - profile_stats['flush_sec'], abs=0.04)
+    assert runtime >= 4 * WRITE_DELAY                                       # the writer thread held up the pipeline
+
+
+def test_operations_use_one_unit_per_aligner():
+    profile_stats = {'ops_backward_search_steps': 900, 'ops_candidates_verified': 40, 'ops_dp_cells': 70000,
+                     'ops_postings_scanned': 300, 'ops_em_iterations': 12, 'stage_write_sec': 1.0}
+    assert primary_operations('HISAT', profile_stats) == 900
+    assert primary_operations('Bowtie2', profile_stats) == 70000
+    assert primary_operations('Salmon', profile_stats) == 300
+    assert primary_operations('Salmon', {}) == 0
+    assert set(PRIMARY_OPERATIONS) == {'HISAT', 'Bowtie2', 'Salmon'}
+
+
+def test_hash_seed_index_counts_probes():
+    set_seed_index("hash")
+    try:
+        assert primary_operations('HISAT', {'ops_backward_search_steps': 0, 'ops_seed_hash_probes': 75}) == 75
+    finally:
+        set_seed_index("fm")
+
+# ========================================================================================
+# Command Line
+# ========================================================================================
+
+def parse(argv):
+    return build_arg_parser().parse_args(argv)
+
+
+@pytest.mark.parametrize("argv", [
+    ["--threads", "4", "--trace-memory", "--log-level", "DEBUG", "--max-index-memory", "100",
+     "align", "--aligner", "hisat", "--output", "out.sam"],
+    ["align", "--aligner", "hisat", "--output", "out.sam",
+     "--threads", "4", "--trace-memory", "--log-level", "DEBUG", "--max-index-memory", "100"],
+])
+def test_shared_options_before_or_after_the_subcommand(argv):
+    args = parse(argv)
+    assert args.command == "align"
+    assert args.threads == 4 and args.trace_memory and args.log_level == "DEBUG" and args.max_index_memory == 100
+
+
+def test_subcommand_defaults():
+    args = parse(["--max-reads", "10", "quant", "--index", "i.bin", "--output", "q.tsv"])
+    assert args.threads == TEST_WORKERS and args.log_level == LOG_LEVEL and args.format is None
+    assert args.max_reads == 10 and args.online_batch_size is None
+    assert parse(["--mode", "production"]).command is None
+
+
+def test_default_format_follows_the_output_extension(tmp_path):
+    args = parse(["align", "--aligner", "bowtie2", "--output", str(tmp_path / "out.bam")])
+    with AlignmentWriter(args.output, [("ref", 10)], args.format) as writer:
+        assert writer.output_format == "bam"
+    assert open(args.output, 'rb').read(2) == b"\x1f\x8b"